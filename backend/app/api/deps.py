@@ -1,34 +1,76 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jwt import PyJWTError
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from backend.app.core.security import decode_token
+from backend.app.core.shards import shard_of_department, shard_of_request, sharded
 from backend.app.db.models import User
-from backend.app.db.session import SessionLocal
+from backend.app.db.replica import replica_covers, replica_enabled, replica_ready
+from backend.app.db.session import MAIN_SHARD, AuditSessionLocal, ReadSessionLocal, SessionLocal, shard_session
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+LAST_WRITE_COOKIE = "oa_lw"
+LAST_WRITE_HEADER = "X-OA-Last-Write"
 
-def get_db():
-    db = SessionLocal()
+
+def _shard_for(request: Request) -> str:
+    # A request's own routes go to the shard its id belongs to; everything else
+    # to the main database. Listings that span requests fan out across shards.
+    request_id = request.path_params.get("request_id")
+    if request_id is not None and str(request_id).isdigit():
+        return shard_of_request(int(request_id))
+    return MAIN_SHARD
+
+
+def get_db(request: Request):
+    db = shard_session(_shard_for(request)) if sharded() else SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    creds: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
-) -> User:
-    if creds is None:
+def get_audit_db():
+    db = AuditSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _reads_from_replica(request: Request) -> bool:
+    if not replica_enabled():
+        return False
+    # Clients that just wrote carry the write time; they stay on the primary
+    # until the replica is known to include it (read-your-writes).
+    raw = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    if raw and raw.isdigit():
+        return replica_covers(int(raw))
+    return replica_ready()
+
+
+def get_read_db(request: Request):
+    if sharded():
+        # The replica copies the main database only.
+        db = shard_session(_shard_for(request))
+    else:
+        db = ReadSessionLocal() if _reads_from_replica(request) else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _user_from_token(db: Session, token: str | None) -> User:
+    if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="未登录"
         )
     try:
-        payload = decode_token(creds.credentials)
+        payload = decode_token(token)
         username = payload.get("sub")
     except PyJWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="登录已过期，请重新登录")
@@ -44,6 +86,48 @@ def get_current_user(
     return user
 
 
+def get_current_user(
+    db: Session = Depends(get_db),
+    creds: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+) -> User:
+    return _user_from_token(db, creds.credentials if creds else None)
+
+
+def _detached_user(token: str | None) -> User:
+    # The session is closed right away: a long-lived stream must not pin a connection.
+    with SessionLocal() as db:
+        user = _user_from_token(db, token)
+        db.expunge(user)
+    return user
+
+
+def get_stream_user(
+    token: str | None = Query(default=None),
+    creds: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+) -> User:
+    # EventSource cannot send headers, so streams also accept ?token=.
+    return _detached_user(creds.credentials if creds else token)
+
+
+def get_upload_user(creds: HTTPAuthorizationCredentials | None = Depends(bearer_scheme)) -> User:
+    # Like get_current_user (bearer header only), without holding a connection
+    # for as long as the request body takes to arrive.
+    return _detached_user(creds.credentials if creds else None)
+
+
+def get_home_db(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    # Where the caller's new requests go: the shard of their department as it is
+    # now, so a department move takes effect without logging in again.
+    if not sharded():
+        yield db
+        return
+    home = shard_session(shard_of_department(user.department_id))
+    try:
+        yield home
+    finally:
+        home.close()
+
+
 def require_roles(*roles: str):
     def _checker(user: User = Depends(get_current_user)) -> User:
         if user.role not in roles:
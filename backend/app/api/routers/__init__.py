@@ -7,5 +7,9 @@ __all__ = [
     "workflows",
     "announcements",
     "requests",
+    "attachments",
     "approvals",
+    "events",
+    "admin",
+    "bootstrap",
 ]
@@ -0,0 +1,177 @@
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.app.api.deps import get_audit_db, get_db, require_roles
+from backend.app.core.archive import run_archiver
+from backend.app.core.audit import audit_log
+from backend.app.core.config import settings
+from backend.app.core.profiler import ProfiledRoute, list_profiles, profile_path
+from backend.app.core.shards import each_shard
+from backend.app.core.sla import backlog, metrics, run_escalations
+from backend.app.core.slowlog import slow_queries
+from backend.app.db.models import AuditEntry, User, utcnow
+from backend.app.schemas.admin import (
+    ArchiveResult,
+    AuditEntryOut,
+    AuditPage,
+    ProfileOut,
+    SlaStatusOut,
+    SlowQueryOut,
+)
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], route_class=ProfiledRoute)
+
+
+@router.post("/archive", response_model=ArchiveResult)
+def archive_now(
+    older_than_days: int | None = Query(default=None, ge=1),
+    _: User = Depends(require_roles("admin")),
+) -> ArchiveResult:
+    days = older_than_days or settings.archive_after_days
+    return ArchiveResult(older_than_days=days, archived=run_archiver(older_than_days=days))
+
+
+def _load(raw: str | None) -> dict | None:
+    return json.loads(raw) if raw else None
+
+
+@router.get("/audit", response_model=AuditPage)
+def list_audit(
+    entity_type: str | None = Query(default=None),
+    entity_id: int | None = Query(default=None),
+    actor_user_id: int | None = Query(default=None),
+    action: str | None = Query(default=None),
+    before_id: int | None = Query(default=None, ge=1),
+    page_size: int = Query(default=50, ge=1, le=500),
+    db: Session = Depends(get_audit_db),
+    _: User = Depends(require_roles("admin")),
+) -> AuditPage:
+    # Newest first, keyset-paged on id; each filter has an index ending in id.
+    audit_log.flush_all()
+    q = select(AuditEntry).order_by(AuditEntry.id.desc()).limit(page_size + 1)
+    if entity_type:
+        q = q.where(AuditEntry.entity_type == entity_type)
+    if entity_id is not None:
+        q = q.where(AuditEntry.entity_id == entity_id)
+    if actor_user_id is not None:
+        q = q.where(AuditEntry.actor_user_id == actor_user_id)
+    if action:
+        q = q.where(AuditEntry.action == action)
+    if before_id is not None:
+        q = q.where(AuditEntry.id < before_id)
+    rows = db.scalars(q).all()
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    return AuditPage(
+        items=[
+            AuditEntryOut(
+                id=e.id,
+                at=e.at,
+                actor_user_id=e.actor_user_id,
+                actor_username=e.actor_username,
+                action=e.action,
+                entity_type=e.entity_type,
+                entity_id=e.entity_id,
+                before=_load(e.before_json),
+                after=_load(e.after_json),
+            )
+            for e in rows
+        ],
+        next_before_id=rows[-1].id if more else None,
+    )
+
+
+@router.get("/profiles", response_model=list[ProfileOut])
+def list_request_profiles(
+    min_duration_ms: float = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=500),
+    _: User = Depends(require_roles("admin")),
+) -> list[ProfileOut]:
+    # Newest first. The directory keeps at most OA_PROFILE_KEEP profiles.
+    return [
+        ProfileOut(**p)
+        for p in list_profiles(settings.profile_keep)
+        if p.get("duration_ms", 0) >= min_duration_ms
+    ][:limit]
+
+
+@router.get("/profiles/{profile_id}")
+def get_request_profile(
+    profile_id: str,
+    _: User = Depends(require_roles("admin")),
+) -> FileResponse:
+    path = profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="剖析记录不存在")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=path.name)
+
+
+@router.get("/slow-queries", response_model=list[SlowQueryOut])
+def list_slow_queries(
+    order: str = Query(default="total", pattern="^(total|max|count)$"),
+    limit: int = Query(default=20, ge=1, le=500),
+    _: User = Depends(require_roles("admin")),
+) -> list[SlowQueryOut]:
+    return [
+        SlowQueryOut(
+            fingerprint=s.fingerprint,
+            sql=s.sql,
+            count=s.count,
+            total_ms=round(s.total_ms, 1),
+            avg_ms=round(s.total_ms / s.count, 1),
+            max_ms=round(s.max_ms, 1),
+            last_ms=round(s.last_ms, 1),
+            last_at=s.last_at,
+            param_shape=s.param_shape,
+            plan=s.plan,
+            routes=dict(s.routes.most_common(10)),
+        )
+        for s in slow_queries.top(limit, order)
+    ]
+
+
+@router.delete("/slow-queries", status_code=204)
+def reset_slow_queries(_: User = Depends(require_roles("admin"))) -> None:
+    slow_queries.reset()
+
+
+def _sla_status(db: Session) -> SlaStatusOut:
+    stats = metrics.snapshot()
+    parts = each_shard(db, backlog)
+    waiting = sum(n for n, _, _ in parts)
+    oldest_due = min((o for _, o, _ in parts if o is not None), default=None)
+    watermark_at = min((w for _, _, w in parts if w is not None), default=None)
+    return SlaStatusOut(
+        enabled=settings.sla_scan_seconds > 0,
+        runs=stats.runs,
+        scanned=stats.scanned,
+        escalated=dict(stats.escalated),
+        skipped=stats.skipped,
+        last_run_at=stats.last_run_at,
+        last_run_ms=round(stats.last_run_ms, 1),
+        last_run_rate=round(stats.last_run_scanned / stats.last_run_ms * 1000, 1) if stats.last_run_ms else 0.0,
+        watermark_at=watermark_at,
+        backlog=waiting,
+        lag_seconds=round((utcnow() - oldest_due).total_seconds(), 1) if oldest_due else 0.0,
+    )
+
+
+@router.get("/sla", response_model=SlaStatusOut)
+def sla_status(
+    db: Session = Depends(get_db),
+    _: User = Depends(require_roles("admin")),
+) -> SlaStatusOut:
+    return _sla_status(db)
+
+
+@router.post("/sla/run", response_model=SlaStatusOut)
+def run_sla_now(
+    db: Session = Depends(get_db),
+    _: User = Depends(require_roles("admin")),
+) -> SlaStatusOut:
+    run_escalations()
+    return _sla_status(db)
@@ -1,29 +1,92 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from backend.app.api.deps import get_current_user, get_db, require_roles
+from backend.app.core.cache import LocalCache
+from backend.app.core.profiler import ProfiledRoute
 from backend.app.db.models import Announcement, User
-from backend.app.schemas.announcements import AnnouncementCreate, AnnouncementOut
+from backend.app.schemas.announcements import (
+    AnnouncementCreate,
+    AnnouncementOut,
+    AnnouncementPage,
+    AnnouncementSummary,
+)
 
-router = APIRouter(prefix="/api/announcements", tags=["announcements"])
+router = APIRouter(prefix="/api/announcements", tags=["announcements"], route_class=ProfiledRoute)
 
+EXCERPT_CHARS = 120
 
-@router.get("", response_model=list[AnnouncementOut])
-def list_announcements(
-    db: Session = Depends(get_db), _: User = Depends(get_current_user)
-) -> list[AnnouncementOut]:
-    items = db.scalars(select(Announcement).order_by(Announcement.id.desc())).all()
-    return [
-        AnnouncementOut(
-            id=a.id,
-            title=a.title,
-            content=a.content,
-            created_by_user_id=a.created_by_user_id,
-            created_at=a.created_at,
+# Pages are shared by every user and only change on create_announcement.
+_pages = LocalCache(max_entries=64)
+
+
+def _out(a: Announcement) -> AnnouncementOut:
+    return AnnouncementOut(
+        id=a.id,
+        title=a.title,
+        content=a.content,
+        created_by_user_id=a.created_by_user_id,
+        created_at=a.created_at,
+    )
+
+
+def announcement_page(db: Session, *, page: int, page_size: int) -> AnnouncementPage:
+    def load() -> AnnouncementPage:
+        total = db.scalar(select(func.count()).select_from(Announcement)) or 0
+        # Only the excerpt (plus one char to detect truncation) leaves the database.
+        rows = db.execute(
+            select(
+                Announcement.id,
+                Announcement.title,
+                func.substr(Announcement.content, 1, EXCERPT_CHARS + 1),
+                Announcement.created_by_user_id,
+                Announcement.created_at,
+            )
+            .order_by(Announcement.id.desc())
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+        ).all()
+        return AnnouncementPage(
+            items=[
+                AnnouncementSummary(
+                    id=a_id,
+                    title=title,
+                    excerpt=(head or "")[:EXCERPT_CHARS],
+                    truncated=len(head or "") > EXCERPT_CHARS,
+                    created_by_user_id=created_by_user_id,
+                    created_at=created_at,
+                )
+                for a_id, title, head, created_by_user_id, created_at in rows
+            ],
+            total=total,
+            page=page,
+            page_size=page_size,
         )
-        for a in items
-    ]
+
+    return _pages.get_or_set((page, page_size), load)
+
+
+@router.get("", response_model=AnnouncementPage)
+def list_announcements(
+    page: int = Query(default=1, ge=1),
+    page_size: int = Query(default=10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    _: User = Depends(get_current_user),
+) -> AnnouncementPage:
+    return announcement_page(db, page=page, page_size=page_size)
+
+
+@router.get("/{announcement_id}", response_model=AnnouncementOut)
+def get_announcement(
+    announcement_id: int,
+    db: Session = Depends(get_db),
+    _: User = Depends(get_current_user),
+) -> AnnouncementOut:
+    a = db.get(Announcement, announcement_id)
+    if a is None:
+        raise HTTPException(status_code=404, detail="公告不存在")
+    return _out(a)
 
 
 @router.post("", response_model=AnnouncementOut, status_code=201)
@@ -36,10 +99,5 @@ def create_announcement(
     db.add(a)
     db.commit()
     db.refresh(a)
-    return AnnouncementOut(
-        id=a.id,
-        title=a.title,
-        content=a.content,
-        created_by_user_id=a.created_by_user_id,
-        created_at=a.created_at,
-    )
+    _pages.clear()
+    return _out(a)
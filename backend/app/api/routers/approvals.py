@@ -1,29 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Header, HTTPException
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from backend.app.api.deps import get_current_user, get_db
-from backend.app.db.models import Approval, OARequest, User, WorkflowNode
-from backend.app.schemas.requests import ApprovalDecision, RequestOut
+from backend.app.api.deps import get_current_user, get_db, get_read_db
+from backend.app.api.routers.requests import count_summary
+from backend.app.core.assignment import assignees
+from backend.app.core.audit import audit_log, snapshot
+from backend.app.core.events import bus
+from backend.app.core.idempotency import Idempotency
+from backend.app.core.notifications import enqueue_notification
+from backend.app.core.notifications import worker as notification_worker
+from backend.app.core.payloads import load_payload
+from backend.app.core.profiler import ProfiledRoute
+from backend.app.core.routing import assign, close_inbox, open_inbox, pinned_route
+from backend.app.core.shards import each_shard
+from backend.app.core.sla import due_for
+from backend.app.core.writer import run_write
+from backend.app.db.models import Approval, OARequest, RequestInbox, User, utcnow
+from backend.app.schemas.requests import ApprovalDecision, CountSummary, RequestOut
 
-router = APIRouter(prefix="/api/approvals", tags=["approvals"])
+router = APIRouter(prefix="/api/approvals", tags=["approvals"], route_class=ProfiledRoute)
 
 
-@router.get("/pending", response_model=list[RequestOut])
-def list_pending(
-    db: Session = Depends(get_db), user: User = Depends(get_current_user)
-) -> list[RequestOut]:
-    q = (
-        select(OARequest)
-        .join(WorkflowNode, OARequest.current_node_id == WorkflowNode.id)
-        .where(OARequest.status == "pending")
-        .order_by(OARequest.id.desc())
+def _publish_update(r: RequestOut, *, position_ids: list[int]) -> None:
+    # Old and new node positions both get the event so every inbox involved refreshes.
+    bus.publish(
+        "request.updated",
+        {"request_id": r.id, "status": r.status, "current_node_id": r.current_node_id},
+        creator_user_id=r.created_by_user_id,
+        position_ids=position_ids,
     )
+
+
+def _pending_query(q, user: User):
+    q = q.where(OARequest.status == "pending")
     if user.role != "admin":
-        if user.position_id is None:
-            return []
-        q = q.where(WorkflowNode.position_id == user.position_id)
-    items = db.scalars(q).all()
+        q = q.join(RequestInbox, RequestInbox.request_id == OARequest.id).where(
+            RequestInbox.position_id == user.position_id
+        )
+    return q
+
+
+def _pending_counts(db: Session, user: User) -> list:
+    if user.role == "admin":
+        # Covered by ix_oa_requests_status_type_created.
+        q = select(OARequest.status, OARequest.type, func.count()).where(OARequest.status == "pending")
+        return db.execute(q.group_by(OARequest.status, OARequest.type)).all()
+    # Inbox rows exist only while their request is pending, so the position's
+    # slice of ix_request_inbox_position drives this, one primary-key probe each.
+    q = (
+        select(literal("pending"), OARequest.type, func.count())
+        .select_from(RequestInbox)
+        .join(OARequest, OARequest.id == RequestInbox.request_id)
+        .where(RequestInbox.position_id == user.position_id)
+        .group_by(OARequest.type)
+    )
+    return db.execute(q).all()
+
+
+def pending_summary(db: Session, user: User) -> CountSummary:
+    if user.role != "admin" and user.position_id is None:
+        return count_summary([])
+    # Approvers sign for requests from every department, so every shard is asked.
+    return count_summary([row for rows in each_shard(db, lambda s: _pending_counts(s, user)) for row in rows])
+
+
+@router.get("/pending/count", response_model=CountSummary)
+def pending_approvals_count(
+    db: Session = Depends(get_read_db), user: User = Depends(get_current_user)
+) -> CountSummary:
+    return pending_summary(db, user)
+
+
+def _pending_items(db: Session, user: User) -> list[RequestOut]:
+    items = db.scalars(_pending_query(select(OARequest), user).order_by(OARequest.id.desc())).all()
     return [
         RequestOut(
             id=r.id,
@@ -43,46 +94,149 @@ def list_pending(
     ]
 
 
+@router.get("/pending", response_model=list[RequestOut])
+def list_pending(
+    db: Session = Depends(get_read_db), user: User = Depends(get_current_user)
+) -> list[RequestOut]:
+    if user.role != "admin" and user.position_id is None:
+        return []
+    parts = each_shard(db, lambda s: _pending_items(s, user))
+    if len(parts) == 1:
+        return parts[0]
+    # Ids only order requests within one shard; merge on creation time.
+    return sorted((r for part in parts for r in part), key=lambda r: (r.created_at, r.id), reverse=True)
+
+
 @router.post("/{request_id}/decide", response_model=RequestOut)
 def decide(
     request_id: int,
     body: ApprovalDecision,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
+    idempotency_key: str | None = Header(default=None, max_length=100),
 ) -> RequestOut:
-    r = db.get(OARequest, request_id)
-    if r is None:
-        raise HTTPException(status_code=404, detail="申请不存在")
-    if r.status != "pending":
-        raise HTTPException(status_code=400, detail="该申请已处理")
-    if r.current_node_id is None:
-        raise HTTPException(status_code=400, detail="该申请未进入审批节点")
-
-    node = db.get(WorkflowNode, r.current_node_id)
-    if node is None:
-        raise HTTPException(status_code=400, detail="审批流节点异常")
-    if user.role != "admin":
-        if user.position_id is None or user.position_id != node.position_id:
-            raise HTTPException(status_code=403, detail="无权限")
+    idem = Idempotency(user.id, idempotency_key, f"decide:{request_id}", body)
+    if (replay := idem.replay(db)) is not None:
+        return replay
+
+    def unit(db: Session) -> tuple[RequestOut, list[int], list[int], list[int]]:
+        r = db.get(OARequest, request_id)
+        if r is None:
+            raise HTTPException(status_code=404, detail="申请不存在")
+        if r.status != "pending":
+            # Like losing the swap below: someone decided first.
+            raise HTTPException(status_code=409, detail="该申请已处理")
+        if r.current_node_id is None:
+            raise HTTPException(status_code=400, detail="该申请未进入审批节点")
 
-    db.add(
-        Approval(
-            request_id=r.id,
-            workflow_node_id=node.id,
-            approver_user_id=user.id,
-            decision=body.decision,
-            comment=body.comment,
+        route = pinned_route(db, r.workflow_snapshot_id)
+        node = route.node(r.current_node_id) if route is not None else None
+        if node is None:
+            raise HTTPException(status_code=400, detail="审批流节点异常")
+        waiting = set(
+            db.scalars(select(RequestInbox.position_id).where(RequestInbox.request_id == r.id)).all()
         )
-    )
+        if user.position_id in waiting:
+            signing_position = user.position_id
+        elif user.role == "admin" and waiting:
+            # Admins act on behalf of a position that has not signed yet.
+            signing_position = min(waiting)
+        elif user.position_id in node.position_ids:
+            # Someone else in this position signed first, possibly a moment ago.
+            raise HTTPException(status_code=409, detail="本岗位已会签，等待其他岗位")
+        else:
+            raise HTTPException(status_code=403, detail="无权限")
 
-    if body.decision == "rejected":
-        r.status = "rejected"
-        r.current_node_id = None
-        r.approver_user_id = None
-        db.add(r)
-        db.commit()
+        next_node = None
+        new_approver_ids: list[int] = []
+        signed = len(node.position_ids) - len(waiting) + 1
+        new_due_at = None
+        if body.decision == "rejected":
+            new_status, new_node_id, new_approver_id = "rejected", None, None
+        elif signed < node.required:
+            # Countersign still open: stay on this node until enough positions approve.
+            new_status, new_node_id, new_approver_id = "pending", node.id, r.approver_user_id
+            new_due_at = r.due_at
+        else:
+            data = load_payload(db, r) if route.needs_data else {}
+            next_node = route.after(node.id, r.amount, data)
+            if next_node is None:
+                new_status, new_node_id, new_approver_id = "approved", None, None
+            else:
+                # For convenience only; actual permission is by position.
+                new_status, new_node_id = "pending", next_node.id
+                picked = assign(db, next_node, requester_id=r.created_by_user_id)
+                new_approver_ids = list(picked.values())
+                new_approver_id = new_approver_ids[0] if new_approver_ids else None
+                new_due_at = due_for(next_node)
+
+        before = snapshot(r)
+        # Compare-and-swap on (version, current node): of two concurrent deciders on
+        # the same node exactly one matches; the other gets a 409 and nothing is written.
+        swapped = db.execute(
+            update(OARequest)
+            .where(OARequest.id == r.id)
+            .where(OARequest.version == r.version)
+            .where(OARequest.status == "pending")
+            .where(OARequest.current_node_id == node.id)
+            .values(
+                status=new_status,
+                current_node_id=new_node_id,
+                approver_user_id=new_approver_id,
+                due_at=new_due_at,
+                version=OARequest.version + 1,
+                updated_at=utcnow(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if swapped.rowcount != 1:
+            raise HTTPException(status_code=409, detail="该申请已被他人处理，请刷新后重试")
         db.refresh(r)
-        return RequestOut(
+        if new_node_id == node.id:
+            released = close_inbox(db, r.id, signing_position)
+        else:
+            released = close_inbox(db, r.id)
+            if next_node is not None:
+                open_inbox(db, r.id, next_node, picked)
+
+        db.add(
+            Approval(
+                request_id=r.id,
+                workflow_node_id=node.id,
+                approver_user_id=user.id,
+                position_id=signing_position,
+                decision=body.decision,
+                comment=body.comment,
+            )
+        )
+        if new_status == "rejected":
+            enqueue_notification(
+                db, kind="request.rejected", recipient_user_id=r.created_by_user_id, req=r
+            )
+        elif new_status == "approved":
+            enqueue_notification(
+                db, kind="request.approved", recipient_user_id=r.created_by_user_id, req=r
+            )
+        elif next_node is not None:
+            enqueue_notification(
+                db,
+                kind="request.advanced",
+                recipient_user_id=r.created_by_user_id,
+                req=r,
+                dedupe=str(next_node.id),
+            )
+            for uid in new_approver_ids:
+                enqueue_notification(
+                    db,
+                    kind="approval.assigned",
+                    recipient_user_id=uid,
+                    req=r,
+                    dedupe=str(next_node.id),
+                )
+        audit_log.record(
+            db, user, f"request.{body.decision}", "request", r.id, before=before, after=snapshot(r)
+        )
+        out = RequestOut(
             id=r.id,
             type=r.type,
             title=r.title,
@@ -96,43 +250,19 @@ def decide(
             created_at=r.created_at,
             updated_at=r.updated_at,
         )
+        position_ids = list(node.position_ids) + (list(next_node.position_ids) if next_node else [])
+        idem.remember(db, out, 200)
+        return out, released, new_approver_ids, position_ids
 
-    next_node = db.scalar(
-        select(WorkflowNode)
-        .where(WorkflowNode.workflow_id == node.workflow_id)
-        .where(WorkflowNode.step_order > node.step_order)
-        .order_by(WorkflowNode.step_order.asc())
-    )
-    if next_node is None:
-        r.status = "approved"
-        r.current_node_id = None
-        r.approver_user_id = None
-    else:
-        r.status = "pending"
-        r.current_node_id = next_node.id
-        # For convenience only; actual permission is by position.
-        r.approver_user_id = db.scalar(
-            select(User.id)
-            .where(User.is_active.is_(True))
-            .where(User.position_id == next_node.position_id)
-            .order_by(User.id.asc())
-        )
-
-    db.add(r)
-    db.commit()
-    db.refresh(r)
-
-    return RequestOut(
-        id=r.id,
-        type=r.type,
-        title=r.title,
-        content=r.content,
-        amount=r.amount,
-        status=r.status,
-        workflow_id=r.workflow_id,
-        current_node_id=r.current_node_id,
-        created_by_user_id=r.created_by_user_id,
-        approver_user_id=r.approver_user_id,
-        created_at=r.created_at,
-        updated_at=r.updated_at,
-    )
+    try:
+        out, released, new_approver_ids, position_ids = run_write(db, unit)
+    except (IntegrityError, HTTPException):
+        # A concurrent retry with the same key may have committed first, so this
+        # one lost the key insert or the version check: answer as the winner did.
+        if (replay := idem.replay(db)) is None:
+            raise
+        return replay
+    assignees.reassigned(old_user_ids=released, new_user_ids=new_approver_ids)
+    notification_worker.wake()
+    _publish_update(out, position_ids=position_ids)
+    return out
@@ -0,0 +1,179 @@
+import posixpath
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.api.deps import get_current_user, get_read_db, get_upload_user
+from backend.app.api.routers.requests import _can_view_request, _load_request, attachment_list
+from backend.app.core.attachments import TooLarge, blob_path, remove_blob, store_stream
+from backend.app.core.audit import audit_log, snapshot
+from backend.app.core.config import settings
+from backend.app.core.profiler import ProfiledRoute
+from backend.app.core.shards import each_shard, request_session
+from backend.app.core.writer import run_write
+from backend.app.db.models import Attachment, User
+from backend.app.db.session import shard_session
+from backend.app.schemas.requests import AttachmentOut
+
+router = APIRouter(prefix="/api/requests", tags=["attachments"], route_class=ProfiledRoute)
+
+
+def _visible_request(db: Session, request_id: int, user: User):
+    r = _load_request(db, request_id)
+    if r is None:
+        raise HTTPException(status_code=404, detail="申请不存在")
+    if not _can_view_request(db, req=r, user=user):
+        raise HTTPException(status_code=403, detail="无权限")
+    return r
+
+
+def _usage(db: Session, request_id: int) -> tuple[int, int]:
+    count, used = db.execute(
+        select(func.count(), func.coalesce(func.sum(Attachment.size), 0)).where(
+            Attachment.request_id == request_id
+        )
+    ).one()
+    return count, used
+
+
+def _upload_allowance(request_id: int, user: User) -> int:
+    with request_session(request_id) as db:
+        _visible_request(db, request_id, user)
+        count, used = _usage(db, request_id)
+    if count >= settings.attachment_max_files:
+        raise HTTPException(status_code=400, detail="附件数量已达上限")
+    return min(settings.attachment_max_bytes, settings.attachment_quota_bytes - used)
+
+
+def _attach(request_id: int, user: User, *, sha256: str, size: int, filename: str, content_type: str) -> AttachmentOut:
+    def unit(db: Session) -> AttachmentOut:
+        a = Attachment(
+            request_id=request_id,
+            sha256=sha256,
+            filename=filename,
+            content_type=content_type,
+            size=size,
+            uploaded_by_user_id=user.id,
+        )
+        db.add(a)
+        db.flush()
+        # Re-check after inserting: concurrent uploads to one request each passed
+        # the early check, and only the ones that still fit may commit.
+        count, used = _usage(db, request_id)
+        if count > settings.attachment_max_files:
+            raise HTTPException(status_code=400, detail="附件数量已达上限")
+        if used > settings.attachment_quota_bytes:
+            raise HTTPException(status_code=413, detail="附件总大小超过限制")
+        audit_log.record(db, user, "attachment.create", "request", request_id, after=snapshot(a))
+        return AttachmentOut(
+            id=a.id,
+            request_id=a.request_id,
+            filename=a.filename,
+            content_type=a.content_type,
+            size=a.size,
+            uploaded_by_user_id=user.id,
+            uploaded_by_username=user.username,
+            created_at=a.created_at,
+        )
+
+    with request_session(request_id) as db:
+        return run_write(db, unit)
+
+
+def _discard(sha256: str) -> None:
+    # A blob this upload created but could not attach. Identical content uploaded
+    # meanwhile may already point at it; then it stays.
+    def referenced(db: Session) -> bool:
+        return db.scalar(select(Attachment.id).where(Attachment.sha256 == sha256).limit(1)) is not None
+
+    with shard_session() as db:
+        if not any(each_shard(db, referenced)):
+            remove_blob(sha256)
+
+
+# The body is the raw file, not multipart, so it can be streamed to disk as it
+# arrives. Database work runs in the threadpool on short-lived sessions; no
+# connection is held while the upload is in flight.
+@router.post("/{request_id}/attachments", response_model=AttachmentOut, status_code=201)
+async def upload_attachment(
+    request_id: int,
+    request: Request,
+    filename: str = Query(min_length=1, max_length=255),
+    user: User = Depends(get_upload_user),
+) -> AttachmentOut:
+    name = posixpath.basename(filename.replace("\\", "/")).strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="文件名不能为空")
+    limit = await run_in_threadpool(_upload_allowance, request_id, user)
+    if limit <= 0:
+        raise HTTPException(status_code=413, detail="附件总大小超过限制")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise HTTPException(status_code=413, detail="附件超过大小限制")
+
+    try:
+        sha256, size, created = await store_stream(request.stream(), limit)
+    except TooLarge:
+        raise HTTPException(status_code=413, detail="附件超过大小限制")
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        if size == 0:
+            raise HTTPException(status_code=400, detail="附件不能为空")
+        return await run_in_threadpool(
+            _attach,
+            request_id,
+            user,
+            sha256=sha256,
+            size=size,
+            filename=name,
+            content_type=(content_type or "application/octet-stream")[:100],
+        )
+    except Exception:
+        if created:
+            await run_in_threadpool(_discard, sha256)
+        raise
+
+
+@router.get("/{request_id}/attachments", response_model=list[AttachmentOut])
+def list_attachments(
+    request_id: int,
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+) -> list[AttachmentOut]:
+    _visible_request(db, request_id, user)
+    return attachment_list(db, request_id)
+
+
+# Bearer header only: the frontend fetches the file and saves it from a blob, so
+# no token ends up in a URL. FileResponse answers Range requests itself and hands
+# the path to the server for zero-copy sending where the server supports it.
+@router.get("/{request_id}/attachments/{attachment_id}")
+def download_attachment(
+    request_id: int,
+    attachment_id: int,
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+) -> FileResponse:
+    _visible_request(db, request_id, user)
+    a = db.get(Attachment, attachment_id)
+    if a is None or a.request_id != request_id:
+        raise HTTPException(status_code=404, detail="附件不存在")
+    path = blob_path(a.sha256)
+    filename, content_type = a.filename, a.content_type
+    # Release the connection before the body streams.
+    db.close()
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="附件文件已丢失")
+    return FileResponse(
+        path,
+        media_type=content_type,
+        filename=filename,
+        headers={
+            "Cache-Control": "private, max-age=86400",
+            "X-Content-Type-Options": "nosniff",
+        },
+    )
@@ -1,22 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from backend.app.api.deps import get_current_user, get_db
+from backend.app.core.config import settings
+from backend.app.core.profiler import ProfiledRoute
 from backend.app.core.security import create_access_token, verify_password
+from backend.app.core.throttle import Throttled, login_throttle
 from backend.app.db.models import User
 from backend.app.schemas.auth import LoginRequest, TokenResponse, UserMe
 
-router = APIRouter(prefix="/api/auth", tags=["auth"])
+router = APIRouter(prefix="/api/auth", tags=["auth"], route_class=ProfiledRoute)
+
+
+def _too_many(e: Throttled) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="登录尝试过于频繁，请稍后再试",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _client_ip(request: Request) -> str:
+    # Behind a reverse proxy every client shares the proxy's address. Only when
+    # the peer is a trusted proxy is X-Forwarded-For read, right to left, up to
+    # the first hop that is not one of ours.
+    peer = request.client.host if request.client else ""
+    trusted = settings.trusted_proxy_list()
+    if peer not in trusted:
+        return peer
+    hops = [h.strip() for h in ",".join(request.headers.getlist("x-forwarded-for")).split(",") if h.strip()]
+    for hop in reversed(hops):
+        if hop not in trusted:
+            return hop
+    return peer
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(body: LoginRequest, db: Session = Depends(get_db)) -> TokenResponse:
+def login(body: LoginRequest, request: Request, db: Session = Depends(get_db)) -> TokenResponse:
+    try:
+        login_throttle.admit(username=body.username, ip=_client_ip(request))
+    except Throttled as e:
+        raise _too_many(e)
+
     user = db.scalar(select(User).where(User.username == body.username))
     if user is None or not user.is_active:
+        login_throttle.failed(username=body.username)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户名或密码错误")
-    if not verify_password(body.password, user.password_hash):
+    try:
+        with login_throttle.verifying():
+            ok = verify_password(body.password, user.password_hash)
+    except Throttled as e:
+        raise _too_many(e)
+    if not ok:
+        login_throttle.failed(username=body.username)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户名或密码错误")
+    login_throttle.succeeded(username=body.username)
 
     token = create_access_token(subject=user.username, extra={"role": user.role})
     return TokenResponse(access_token=token)
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from backend.app.api.deps import get_current_user, get_db
+from backend.app.api.routers.announcements import announcement_page
+from backend.app.api.routers.approvals import pending_summary
+from backend.app.api.routers.auth import me
+from backend.app.api.routers.process_types import active_process_types
+from backend.app.api.routers.requests import my_request_summary
+from backend.app.core.profiler import ProfiledRoute
+from backend.app.db.models import User
+from backend.app.schemas.bootstrap import BootstrapOut
+
+router = APIRouter(prefix="/api/bootstrap", tags=["bootstrap"], route_class=ProfiledRoute)
+
+
+# Everything the first screen needs in one round-trip. get_current_user shares
+# this request's session, so authentication and all reads use one connection.
+@router.get("", response_model=BootstrapOut)
+def bootstrap(db: Session = Depends(get_db), user: User = Depends(get_current_user)) -> BootstrapOut:
+    return BootstrapOut(
+        me=me(user),
+        process_types=active_process_types(db),
+        announcements=announcement_page(db, page=1, page_size=10),
+        pending_count=pending_summary(db, user).total,
+        my_request_counts=my_request_summary(db, user).by_status,
+    )
@@ -2,15 +2,16 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from backend.app.api.deps import get_db, require_roles
+from backend.app.api.deps import get_db, get_read_db, require_roles
+from backend.app.core.profiler import ProfiledRoute
 from backend.app.db.models import Department, User
 from backend.app.schemas.depts import DeptCreate, DeptOut
 
-router = APIRouter(prefix="/api/depts", tags=["depts"])
+router = APIRouter(prefix="/api/depts", tags=["depts"], route_class=ProfiledRoute)
 
 
 @router.get("", response_model=list[DeptOut])
-def list_depts(db: Session = Depends(get_db), _: User = Depends(require_roles("admin"))):
+def list_depts(db: Session = Depends(get_read_db), _: User = Depends(require_roles("admin"))):
     items = db.scalars(select(Department).order_by(Department.id)).all()
     return [DeptOut(id=d.id, name=d.name) for d in items]
 
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from backend.app.api.deps import get_stream_user
+from backend.app.core.config import settings
+from backend.app.core.events import Event, bus
+from backend.app.db.models import User
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+
+def _format(event: Event) -> str:
+    payload = json.dumps(event.data, ensure_ascii=False)
+    return f"id: {event.id}\nevent: {event.type}\ndata: {payload}\n\n"
+
+
+def _resync() -> str:
+    return f"id: {bus.last_id}\nevent: resync\ndata: {{}}\n\n"
+
+
+@router.get("/stream")
+async def stream(
+    request: Request,
+    last_event_id: int | None = Query(default=None),
+    last_event_id_header: str | None = Header(default=None, alias="Last-Event-ID"),
+    user: User = Depends(get_stream_user),
+) -> StreamingResponse:
+    after_id = last_event_id or 0
+    if last_event_id_header and last_event_id_header.isdigit():
+        after_id = int(last_event_id_header)
+
+    sub = bus.subscribe(
+        user_id=user.id, position_id=user.position_id, is_admin=user.role == "admin"
+    )
+
+    async def gen():
+        try:
+            yield "retry: 3000\n\n"
+            sent_id = after_id
+            missed = bus.replay(sub, after_id)
+            if missed is None:
+                sent_id = bus.last_id
+                yield _resync()
+            else:
+                for event in missed:
+                    sent_id = event.id
+                    yield _format(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        sub.queue.get(), timeout=settings.sse_heartbeat_seconds
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if sub.overflowed:
+                    sub.overflowed = False
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    sent_id = bus.last_id
+                    yield _resync()
+                    continue
+                if event.id <= sent_id:
+                    continue
+                sent_id = event.id
+                yield _format(event)
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
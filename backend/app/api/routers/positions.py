@@ -2,16 +2,17 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from backend.app.api.deps import get_db, require_roles
+from backend.app.api.deps import get_db, get_read_db, require_roles
+from backend.app.core.profiler import ProfiledRoute
 from backend.app.db.models import Position, User
 from backend.app.schemas.positions import PositionCreate, PositionOut
 
-router = APIRouter(prefix="/api/positions", tags=["positions"])
+router = APIRouter(prefix="/api/positions", tags=["positions"], route_class=ProfiledRoute)
 
 
 @router.get("", response_model=list[PositionOut])
 def list_positions(
-    db: Session = Depends(get_db), _: User = Depends(require_roles("admin"))
+    db: Session = Depends(get_read_db), _: User = Depends(require_roles("admin"))
 ) -> list[PositionOut]:
     items = db.scalars(select(Position).order_by(Position.id.asc())).all()
     return [PositionOut(id=p.id, name=p.name, description=p.description) for p in items]
@@ -4,7 +4,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from backend.app.api.deps import get_current_user, get_db, require_roles
+from backend.app.api.deps import get_current_user, get_db, get_read_db, require_roles
+from backend.app.core.audit import audit_log, snapshot
+from backend.app.core.profiler import ProfiledRoute
+from backend.app.core.routing import invalidate_routing
 from backend.app.db.models import ProcessType, User
 from backend.app.schemas.process_types import (
     ProcessTypeCreate,
@@ -12,7 +15,7 @@ from backend.app.schemas.process_types import (
     ProcessTypeUpdate,
 )
 
-router = APIRouter(prefix="/api/process-types", tags=["process-types"])
+router = APIRouter(prefix="/api/process-types", tags=["process-types"], route_class=ProfiledRoute)
 
 
 def _out(p: ProcessType) -> ProcessTypeOut:
@@ -28,20 +31,26 @@ def _out(p: ProcessType) -> ProcessTypeOut:
         requires_amount=p.requires_amount,
         is_active=p.is_active,
         fields=fields,
+        sla_hours=p.sla_hours,
+        sla_action=p.sla_action,
     )
 
 
+def active_process_types(db: Session) -> list[ProcessTypeOut]:
+    items = db.scalars(select(ProcessType).where(ProcessType.is_active.is_(True)).order_by(ProcessType.id.asc())).all()
+    return [_out(p) for p in items]
+
+
 @router.get("", response_model=list[ProcessTypeOut])
 def list_process_types(
-    db: Session = Depends(get_db), _: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db), _: User = Depends(get_current_user)
 ) -> list[ProcessTypeOut]:
-    items = db.scalars(select(ProcessType).where(ProcessType.is_active.is_(True)).order_by(ProcessType.id.asc())).all()
-    return [_out(p) for p in items]
+    return active_process_types(db)
 
 
 @router.get("/all", response_model=list[ProcessTypeOut])
 def list_all_process_types(
-    db: Session = Depends(get_db), _: User = Depends(require_roles("admin"))
+    db: Session = Depends(get_read_db), _: User = Depends(require_roles("admin"))
 ) -> list[ProcessTypeOut]:
     items = db.scalars(select(ProcessType).order_by(ProcessType.id.asc())).all()
     return [_out(p) for p in items]
@@ -51,7 +60,7 @@ def list_all_process_types(
 def create_process_type(
     body: ProcessTypeCreate,
     db: Session = Depends(get_db),
-    _: User = Depends(require_roles("admin")),
+    admin: User = Depends(require_roles("admin")),
 ) -> ProcessTypeOut:
     existing = db.scalar(select(ProcessType).where(ProcessType.code == body.code))
     if existing is not None:
@@ -63,10 +72,15 @@ def create_process_type(
         requires_amount=body.requires_amount,
         is_active=body.is_active,
         schema_json=json.dumps([f.model_dump() for f in body.fields], ensure_ascii=False),
+        sla_hours=body.sla_hours,
+        sla_action=body.sla_action,
     )
     db.add(p)
+    db.flush()
+    audit_log.record(db, admin, "process_type.create", "process_type", p.id, after=snapshot(p))
     db.commit()
     db.refresh(p)
+    invalidate_routing()
     return _out(p)
 
 
@@ -75,11 +89,12 @@ def update_process_type(
     process_id: int,
     body: ProcessTypeUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(require_roles("admin")),
+    admin: User = Depends(require_roles("admin")),
 ) -> ProcessTypeOut:
     p = db.get(ProcessType, process_id)
     if p is None:
         raise HTTPException(status_code=404, detail="类型不存在")
+    before = snapshot(p)
     patch = body.model_dump(exclude_unset=True)
     if "name" in patch:
         p.name = patch["name"]
@@ -91,8 +106,15 @@ def update_process_type(
         p.is_active = bool(patch["is_active"])
     if "fields" in patch and patch["fields"] is not None:
         p.schema_json = json.dumps(patch["fields"], ensure_ascii=False)
+    if patch.get("sla_hours") is not None:
+        p.sla_hours = patch["sla_hours"]
+    if patch.get("sla_action") is not None:
+        p.sla_action = patch["sla_action"]
     db.add(p)
+    audit_log.record(db, admin, "process_type.update", "process_type", p.id, before=before, after=snapshot(p))
     db.commit()
     db.refresh(p)
+    # SLA defaults are part of the workflow snapshots new requests are pinned to.
+    invalidate_routing()
     return _out(p)
 
@@ -1,28 +1,48 @@
 import json
+from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from backend.app.api.deps import get_current_user, get_db
+from backend.app.api.deps import get_current_user, get_home_db, get_read_db, require_roles
+from backend.app.core.assignment import assignees
+from backend.app.core.audit import audit_log, snapshot
+from backend.app.core.events import bus
+from backend.app.core.idempotency import Idempotency
+from backend.app.core.notifications import enqueue_notification
+from backend.app.core.notifications import worker as notification_worker
+from backend.app.core.payloads import load_payload, save_payload
+from backend.app.core.profiler import ProfiledRoute
+from backend.app.core.routing import assign, current_route, open_inbox, pinned_route
+from backend.app.core.shards import each_shard, sharded
+from backend.app.core.sla import due_for
+from backend.app.core.writer import run_write
 from backend.app.db.models import (
     Approval,
+    ArchivedApproval,
+    ArchivedRequest,
+    Attachment,
     OARequest,
-    Position,
     ProcessType,
+    RequestInbox,
     User,
     Workflow,
-    WorkflowNode,
 )
 from backend.app.schemas.requests import (
     ApprovalHistoryItem,
+    AttachmentOut,
+    CountSummary,
     RequestCreate,
     RequestDetail,
     RequestNodeStatus,
+    RequestFilters,
     RequestOut,
+    RequestPage,
 )
 
-router = APIRouter(prefix="/api/requests", tags=["requests"])
+router = APIRouter(prefix="/api/requests", tags=["requests"], route_class=ProfiledRoute)
 
 
 def _get_active_workflow(db: Session, request_type: str) -> Workflow | None:
@@ -37,30 +57,7 @@ def _get_active_workflow(db: Session, request_type: str) -> Workflow | None:
     return items[0] if items else None
 
 
-def _get_first_node(db: Session, workflow_id: int) -> WorkflowNode | None:
-    return db.scalar(
-        select(WorkflowNode)
-        .where(WorkflowNode.workflow_id == workflow_id)
-        .order_by(WorkflowNode.step_order.asc())
-    )
-
-
-def _pick_assignee_by_position(
-    db: Session, *, position_id: int, exclude_user_id: int | None = None
-) -> int | None:
-    q = (
-        select(User)
-        .where(User.is_active.is_(True))
-        .where(User.position_id == position_id)
-        .order_by(User.id.asc())
-    )
-    if exclude_user_id is not None:
-        q = q.where(User.id != exclude_user_id)
-    u = db.scalar(q)
-    return u.id if u else None
-
-
-def _request_out(req: OARequest) -> RequestOut:
+def _request_out(req: OARequest | ArchivedRequest) -> RequestOut:
     # Keep list responses lean; form data is returned in /detail.
     return RequestOut(
         id=req.id,
@@ -78,102 +75,285 @@ def _request_out(req: OARequest) -> RequestOut:
     )
 
 
-def _can_view_request(db: Session, *, req: OARequest, user: User) -> bool:
+def _load_request(db: Session, request_id: int) -> OARequest | ArchivedRequest | None:
+    # Closed requests may have been moved to the archive; look there second.
+    r = db.get(OARequest, request_id)
+    if r is None:
+        r = db.get(ArchivedRequest, request_id)
+    return r
+
+
+def _can_view_request(db: Session, *, req: OARequest | ArchivedRequest, user: User) -> bool:
     if user.role == "admin":
         return True
     if req.created_by_user_id == user.id:
         return True
     if req.status != "pending" or req.current_node_id is None or user.position_id is None:
         return False
-    node = db.get(WorkflowNode, req.current_node_id)
-    return node is not None and node.position_id == user.position_id
+    return db.get(RequestInbox, (req.id, user.position_id)) is not None
+
+
+def attachment_list(db: Session, request_id: int) -> list[AttachmentOut]:
+    rows = db.execute(
+        select(Attachment, User.username)
+        .join(User, Attachment.uploaded_by_user_id == User.id)
+        .where(Attachment.request_id == request_id)
+        .order_by(Attachment.id.asc())
+    ).all()
+    return [
+        AttachmentOut(
+            id=a.id,
+            request_id=a.request_id,
+            filename=a.filename,
+            content_type=a.content_type,
+            size=a.size,
+            uploaded_by_user_id=a.uploaded_by_user_id,
+            uploaded_by_username=username,
+            created_at=a.created_at,
+        )
+        for a, username in rows
+    ]
 
 
 @router.post("", response_model=RequestOut, status_code=201)
 def create_request(
     body: RequestCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_home_db),
     user: User = Depends(get_current_user),
+    idempotency_key: str | None = Header(default=None, max_length=100),
 ) -> RequestOut:
-    process = db.scalar(
-        select(ProcessType).where(ProcessType.code == body.type).where(ProcessType.is_active.is_(True))
-    )
-    if process is None:
-        raise HTTPException(status_code=400, detail="申请类型不存在或已停用")
-
-    if process.requires_amount and body.amount is None:
-        raise HTTPException(status_code=400, detail="该申请类型需要填写金额")
+    idem = Idempotency(user.id, idempotency_key, "create_request", body)
+    if (replay := idem.replay(db)) is not None:
+        return replay
+    # Resolved before the write unit: taking a new snapshot commits on its own session.
+    wf = _get_active_workflow(db, body.type)
+    route = current_route(wf.id, db) if wf is not None else None
+
+    def unit(db: Session) -> tuple[RequestOut, list[int], list[int]]:
+        process = db.scalar(
+            select(ProcessType).where(ProcessType.code == body.type).where(ProcessType.is_active.is_(True))
+        )
+        if process is None:
+            raise HTTPException(status_code=400, detail="申请类型不存在或已停用")
+
+        if process.requires_amount and body.amount is None:
+            raise HTTPException(status_code=400, detail="该申请类型需要填写金额")
+
+        try:
+            fields = json.loads(process.schema_json or "[]")
+        except Exception:
+            fields = []
+
+        if fields and isinstance(body.data, dict):
+            for f in fields:
+                if not isinstance(f, dict):
+                    continue
+                if not f.get("required"):
+                    continue
+                key = f.get("key")
+                if not key:
+                    continue
+                v = body.data.get(key)
+                if v is None:
+                    raise HTTPException(status_code=400, detail=f"请填写：{f.get('label') or key}")
+                if isinstance(v, str) and not v.strip():
+                    raise HTTPException(status_code=400, detail=f"请填写：{f.get('label') or key}")
+
+        if route is None:
+            raise HTTPException(status_code=400, detail="该类型暂无启用的审批流")
+        if not route.nodes:
+            raise HTTPException(status_code=400, detail="审批流未配置节点")
+        # No applicable node (every step's condition is false) means nothing to approve.
+        first_node = route.first(body.amount, body.data or {})
+        picked = assign(db, first_node, requester_id=user.id, exclude_user_id=user.id) if first_node else {}
+        approver_ids = list(picked.values())
+        approver_id = approver_ids[0] if approver_ids else None
+        req = OARequest(
+            type=body.type,
+            title=body.title,
+            content=body.content,
+            amount=body.amount,
+            status="pending" if first_node else "approved",
+            workflow_id=route.id,
+            workflow_snapshot_id=route.snapshot_id,
+            current_node_id=first_node.id if first_node else None,
+            created_by_user_id=user.id,
+            approver_user_id=approver_id,
+            due_at=due_for(first_node),
+        )
+        db.add(req)
+        db.flush()
+        save_payload(db, req.id, body.data)
+        if first_node is None:
+            enqueue_notification(db, kind="request.approved", recipient_user_id=user.id, req=req)
+        else:
+            open_inbox(db, req.id, first_node, picked)
+            for uid in approver_ids:
+                enqueue_notification(
+                    db, kind="approval.assigned", recipient_user_id=uid, req=req, dedupe=str(first_node.id)
+                )
+        audit_log.record(
+            db, user, "request.create", "request", req.id, after={**snapshot(req), "data": body.data}
+        )
+        out = _request_out(req)
+        idem.remember(db, out, 201)
+        return out, approver_ids, list(first_node.position_ids) if first_node else []
 
     try:
-        fields = json.loads(process.schema_json or "[]")
-    except Exception:
-        fields = []
-
-    if fields and isinstance(body.data, dict):
-        for f in fields:
-            if not isinstance(f, dict):
-                continue
-            if not f.get("required"):
-                continue
-            key = f.get("key")
-            if not key:
-                continue
-            v = body.data.get(key)
-            if v is None:
-                raise HTTPException(status_code=400, detail=f"请填写：{f.get('label') or key}")
-            if isinstance(v, str) and not v.strip():
-                raise HTTPException(status_code=400, detail=f"请填写：{f.get('label') or key}")
-
-    wf = _get_active_workflow(db, body.type)
-    if wf is None:
-        raise HTTPException(status_code=400, detail="该类型暂无启用的审批流")
-    first_node = _get_first_node(db, wf.id)
-    if first_node is None:
-        raise HTTPException(status_code=400, detail="审批流未配置节点")
-
-    approver_id = _pick_assignee_by_position(
-        db, position_id=first_node.position_id, exclude_user_id=user.id
+        out, approver_ids, position_ids = run_write(db, unit)
+    except (IntegrityError, HTTPException):
+        # A concurrent retry with the same key may have committed first, so this
+        # one lost the key insert or the version check: answer as the winner did.
+        if (replay := idem.replay(db)) is None:
+            raise
+        return replay
+    assignees.reassigned(old_user_ids=[], new_user_ids=approver_ids)
+    notification_worker.wake()
+    bus.publish(
+        "request.created",
+        {"request_id": out.id, "status": out.status, "current_node_id": out.current_node_id},
+        creator_user_id=out.created_by_user_id,
+        position_ids=position_ids,
     )
-    req = OARequest(
-        type=body.type,
-        title=body.title,
-        content=body.content,
-        amount=body.amount,
-        data_json=json.dumps(body.data or {}, ensure_ascii=False),
-        status="pending",
-        workflow_id=wf.id,
-        current_node_id=first_node.id,
-        created_by_user_id=user.id,
-        approver_user_id=approver_id,
+    return out
+
+
+def _filter_conditions(model, f: RequestFilters) -> list:
+    conds = []
+    if f.status:
+        conds.append(model.status == f.status)
+    if f.type:
+        conds.append(model.type == f.type)
+    if f.created_from is not None:
+        conds.append(model.created_at >= f.created_from)
+    if f.created_to is not None:
+        conds.append(model.created_at < f.created_to)
+    if f.amount_min is not None:
+        conds.append(model.amount >= f.amount_min)
+    if f.amount_max is not None:
+        conds.append(model.amount <= f.amount_max)
+    if f.created_by_user_id is not None:
+        conds.append(model.created_by_user_id == f.created_by_user_id)
+    if f.department_id is not None:
+        conds.append(
+            model.created_by_user_id.in_(select(User.id).where(User.department_id == f.department_id))
+        )
+    return conds
+
+
+def _order_by(model, sort: str) -> list:
+    desc = sort.startswith("-")
+    col = getattr(model, sort.lstrip("-"))
+    tie = model.id.desc() if desc else model.id.asc()
+    if col is model.id:
+        return [tie]
+    # NULL amounts sort last either way.
+    return [col.is_(None), col.desc() if desc else col.asc(), tie]
+
+
+def _request_heads(db: Session, f: RequestFilters, *, offset: int, limit: int) -> tuple[int, list[RequestOut]]:
+    total = 0
+    rows: list = []
+    for model in [OARequest] + ([ArchivedRequest] if f.include_archived else []):
+        conds = _filter_conditions(model, f)
+        total += db.scalar(select(func.count()).select_from(model).where(*conds)) or 0
+        q = select(model).where(*conds).order_by(*_order_by(model, f.sort))
+        rows += db.scalars(q.offset(offset).limit(limit)).all()
+    return total, [_request_out(r) for r in rows]
+
+
+def _request_page(db: Session, f: RequestFilters, *, all_shards: bool = False) -> RequestPage:
+    offset = (f.page - 1) * f.page_size
+    if not f.include_archived and not (all_shards and sharded()):
+        total, rows = _request_heads(db, f, offset=offset, limit=f.page_size)
+        return RequestPage(items=rows, total=total, page=f.page, page_size=f.page_size)
+
+    # Merge the heads of every table (and shard); the page is inside the first
+    # offset+limit rows of each.
+    def heads(s: Session) -> tuple[int, list[RequestOut]]:
+        return _request_heads(s, f, offset=0, limit=offset + f.page_size)
+
+    parts = each_shard(db, heads) if all_shards else [heads(db)]
+    total = sum(n for n, _ in parts)
+    rows = [r for _, part in parts for r in part]
+    name, desc = f.sort.lstrip("-"), f.sort.startswith("-")
+    present = sorted(
+        (r for r in rows if getattr(r, name) is not None),
+        key=lambda r: (getattr(r, name), r.id),
+        reverse=desc,
     )
-    db.add(req)
-    db.commit()
-    db.refresh(req)
-    return _request_out(req)
+    missing = sorted((r for r in rows if getattr(r, name) is None), key=lambda r: r.id, reverse=desc)
+    return RequestPage(
+        items=(present + missing)[offset : offset + f.page_size], total=total, page=f.page, page_size=f.page_size
+    )
+
+
+def count_summary(rows) -> CountSummary:
+    by_status: dict[str, int] = {}
+    by_type: dict[str, int] = {}
+    for status, type_, n in rows:
+        by_status[status] = by_status.get(status, 0) + n
+        by_type[type_] = by_type.get(type_, 0) + n
+    return CountSummary(total=sum(by_status.values()), by_status=by_status, by_type=by_type)
 
 
-@router.get("/mine", response_model=list[RequestOut])
+def my_request_summary(db: Session, user: User) -> CountSummary:
+    user_id = user.id
+
+    # Hot rows are answered from ix_oa_requests_creator_status_type alone; archived
+    # ones are the user's own history too and count alike. After a department move
+    # the user's requests sit in more than one shard.
+    def counts(s: Session) -> list:
+        rows = []
+        for model in (OARequest, ArchivedRequest):
+            rows += s.execute(
+                select(model.status, model.type, func.count())
+                .where(model.created_by_user_id == user_id)
+                .group_by(model.status, model.type)
+            ).all()
+        return rows
+
+    return count_summary(row for part in each_shard(db, counts) for row in part)
+
+
+@router.get("", response_model=RequestPage)
+def list_requests(
+    filters: Annotated[RequestFilters, Query()],
+    db: Session = Depends(get_read_db),
+    _: User = Depends(require_roles("admin")),
+) -> RequestPage:
+    return _request_page(db, filters, all_shards=True)
+
+
+@router.get("/mine", response_model=RequestPage)
 def list_my_requests(
-    db: Session = Depends(get_db), user: User = Depends(get_current_user)
-) -> list[RequestOut]:
-    items = db.scalars(
-        select(OARequest)
-        .where(OARequest.created_by_user_id == user.id)
-        .order_by(OARequest.id.desc())
-    ).all()
-    return [
-        _request_out(r)
-        for r in items
-    ]
+    filters: Annotated[RequestFilters, Query()],
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+) -> RequestPage:
+    # Archiving only moves closed requests to cold storage; they stay in the owner's list.
+    return _request_page(
+        db,
+        filters.model_copy(update={"created_by_user_id": user.id, "department_id": None, "include_archived": True}),
+        all_shards=True,
+    )
+
+
+@router.get("/mine/summary", response_model=CountSummary)
+def my_requests_summary(
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+) -> CountSummary:
+    return my_request_summary(db, user)
 
 
 @router.get("/{request_id}", response_model=RequestOut)
 def get_request(
     request_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ) -> RequestOut:
-    r = db.get(OARequest, request_id)
+    r = _load_request(db, request_id)
     if r is None:
         raise HTTPException(status_code=404, detail="申请不存在")
     if not _can_view_request(db, req=r, user=user):
@@ -184,123 +364,94 @@ def get_request(
 @router.get("/{request_id}/detail", response_model=RequestDetail)
 def get_request_detail(
     request_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ) -> RequestDetail:
-    r = db.get(OARequest, request_id)
+    r = _load_request(db, request_id)
     if r is None:
         raise HTTPException(status_code=404, detail="申请不存在")
     if not _can_view_request(db, req=r, user=user):
         raise HTTPException(status_code=403, detail="无权限")
+    approval_model = ArchivedApproval if isinstance(r, ArchivedRequest) else Approval
 
     process_name = None
-    form_data: dict = {}
     p = db.scalar(select(ProcessType).where(ProcessType.code == r.type))
     if p is not None:
         process_name = p.name
-    try:
-        form_data = json.loads(r.data_json or "{}")
-        if not isinstance(form_data, dict):
-            form_data = {}
-    except Exception:
-        form_data = {}
+    form_data = load_payload(db, r)
 
-    wf_name = None
+    # Everything about the route comes from the snapshot the request was pinned
+    # to, so the page shows the workflow as it was when the request was created.
+    route = pinned_route(db, r.workflow_snapshot_id)
     nodes: list[RequestNodeStatus] = []
-    if r.workflow_id is not None:
-        wf = db.get(Workflow, r.workflow_id)
-        wf_name = wf.name if wf else None
-
-        node_rows = db.execute(
-            select(WorkflowNode, Position)
-            .join(Position, WorkflowNode.position_id == Position.id)
-            .where(WorkflowNode.workflow_id == r.workflow_id)
-            .order_by(WorkflowNode.step_order.asc())
-        ).all()
-
+    history: list[ApprovalHistoryItem] = []
+    if route is not None:
         approvals = db.execute(
-            select(Approval, User, WorkflowNode, Position)
-            .join(User, Approval.approver_user_id == User.id)
-            .outerjoin(WorkflowNode, Approval.workflow_node_id == WorkflowNode.id)
-            .outerjoin(Position, WorkflowNode.position_id == Position.id)
-            .where(Approval.request_id == r.id)
-            .order_by(Approval.id.asc())
+            select(approval_model, User)
+            .outerjoin(User, approval_model.approver_user_id == User.id)
+            .where(approval_model.request_id == r.id)
+            .order_by(approval_model.id.asc())
         ).all()
 
         approved_by_node: dict[int, tuple[Approval, User]] = {}
-        for a, u, n, _p in approvals:
-            if n is None:
-                continue
-            approved_by_node[n.id] = (a, u)
+        for a, u in approvals:
+            if route.node(a.workflow_node_id) is not None:
+                approved_by_node[a.workflow_node_id] = (a, u)
 
-        for n, p in node_rows:
+        for n in route.nodes:
+            current = r.status == "pending" and r.current_node_id == n.id
             a_u = approved_by_node.get(n.id)
-            if a_u:
+            # A countersign node stays pending until enough positions have signed.
+            if a_u and not current:
                 a, au = a_u
-                node_status = a.decision  # approved / rejected
-                nodes.append(
-                    RequestNodeStatus(
-                        node_id=n.id,
-                        step_order=n.step_order,
-                        node_name=n.name,
-                        position_id=p.id,
-                        position_name=p.name,
-                        status=node_status,
-                        decided_by_user_id=au.id,
-                        decided_by_username=au.username,
-                        decided_at=a.decided_at,
-                        comment=a.comment,
-                    )
-                )
-                continue
-
-            if r.status == "pending" and r.current_node_id == n.id:
-                nodes.append(
-                    RequestNodeStatus(
-                        node_id=n.id,
-                        step_order=n.step_order,
-                        node_name=n.name,
-                        position_id=p.id,
-                        position_name=p.name,
-                        status="pending",
-                    )
-                )
+                status = a.decision  # approved / rejected
+                decided = {
+                    "decided_by_user_id": au.id if au else None,
+                    "decided_by_username": au.username if au else None,
+                    "decided_at": a.decided_at,
+                    "comment": a.comment,
+                }
+            elif current:
+                status, decided = "pending", {}
             else:
-                nodes.append(
-                    RequestNodeStatus(
-                        node_id=n.id,
-                        step_order=n.step_order,
-                        node_name=n.name,
-                        position_id=p.id,
-                        position_name=p.name,
-                        status="not_started",
-                    )
+                status = "not_started" if n.applies(r.amount, form_data) else "skipped"
+                decided = {}
+            nodes.append(
+                RequestNodeStatus(
+                    node_id=n.id,
+                    step_order=n.step_order,
+                    node_name=n.name,
+                    position_id=n.position_ids[0],
+                    position_name=n.position_name,
+                    status=status,
+                    **decided,
                 )
+            )
 
-        history = [
-            ApprovalHistoryItem(
-                id=a.id,
-                workflow_node_id=(n.id if n else None),
-                step_order=(n.step_order if n else None),
-                node_name=(n.name if n else None),
-                position_id=(p.id if p else None),
-                position_name=(p.name if p else None),
-                approver_user_id=u.id,
-                approver_username=u.username,
-                decision=a.decision,
-                comment=a.comment,
-                decided_at=a.decided_at,
+        for a, u in approvals:
+            n = route.node(a.workflow_node_id)
+            history.append(
+                ApprovalHistoryItem(
+                    id=a.id,
+                    workflow_node_id=(n.id if n else None),
+                    step_order=(n.step_order if n else None),
+                    node_name=(n.name if n else None),
+                    position_id=(n.position_ids[0] if n else None),
+                    position_name=(n.position_name if n else None),
+                    approver_user_id=u.id if u else None,
+                    approver_username=u.username if u else None,
+                    decision=a.decision,
+                    comment=a.comment,
+                    decided_at=a.decided_at,
+                )
             )
-            for a, u, n, p in approvals
-        ]
-    else:
-        history = []
 
     return RequestDetail(
         request=_request_out(r),
         process_name=process_name,
         form_data=form_data,
-        workflow_name=wf_name,
+        workflow_name=route.name if route else None,
         nodes=nodes,
         history=history,
+        attachments=attachment_list(db, r.id),
     )
@@ -3,11 +3,14 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from backend.app.api.deps import get_db, require_roles
+from backend.app.core.assignment import assignees
+from backend.app.core.audit import audit_log, snapshot
+from backend.app.core.profiler import ProfiledRoute
 from backend.app.core.security import hash_password
 from backend.app.db.models import User
 from backend.app.schemas.users import UserCreate, UserOut, UserPasswordUpdate, UserUpdate
 
-router = APIRouter(prefix="/api/users", tags=["users"])
+router = APIRouter(prefix="/api/users", tags=["users"], route_class=ProfiledRoute)
 
 
 @router.get("", response_model=list[UserOut])
@@ -33,7 +36,7 @@ def list_users(
 def create_user(
     body: UserCreate,
     db: Session = Depends(get_db),
-    _: User = Depends(require_roles("admin")),
+    admin: User = Depends(require_roles("admin")),
 ) -> UserOut:
     existing = db.scalar(select(User).where(User.username == body.username))
     if existing is not None:
@@ -49,8 +52,11 @@ def create_user(
         is_active=True,
     )
     db.add(user)
+    db.flush()
+    audit_log.record(db, admin, "user.create", "user", user.id, after=snapshot(user))
     db.commit()
     db.refresh(user)
+    assignees.invalidate()
     return UserOut(
         id=user.id,
         username=user.username,
@@ -67,12 +73,13 @@ def update_user(
     user_id: int,
     body: UserUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(require_roles("admin")),
+    admin: User = Depends(require_roles("admin")),
 ) -> UserOut:
     user = db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
+    before = snapshot(user)
     patch = body.model_dump(exclude_unset=True)
     if "full_name" in patch:
         user.full_name = patch["full_name"] or ""
@@ -86,8 +93,10 @@ def update_user(
         user.is_active = bool(patch["is_active"])
 
     db.add(user)
+    audit_log.record(db, admin, "user.update", "user", user.id, before=before, after=snapshot(user))
     db.commit()
     db.refresh(user)
+    assignees.invalidate()
 
     return UserOut(
         id=user.id,
@@ -105,11 +114,12 @@ def set_password(
     user_id: int,
     body: UserPasswordUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(require_roles("admin")),
+    admin: User = Depends(require_roles("admin")),
 ) -> None:
     user = db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     user.password_hash = hash_password(body.password)
     db.add(user)
+    audit_log.record(db, admin, "user.set_password", "user", user.id)
     db.commit()
@@ -1,18 +1,28 @@
+import json
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, selectinload
 
 from backend.app.api.deps import get_db, require_roles
+from backend.app.core.audit import audit_log, snapshot
+from backend.app.core.cache import LocalCache
+from backend.app.core.profiler import ProfiledRoute
+from backend.app.core.routing import RuleError, compile_condition, invalidate_routing, parse_json_list
 from backend.app.db.models import Position, User, Workflow, WorkflowNode
 from backend.app.schemas.workflows import (
+    NodeCondition,
     WorkflowCreate,
     WorkflowNodeCreate,
     WorkflowNodeOut,
+    WorkflowNodeUpdate,
     WorkflowOut,
     WorkflowUpdate,
 )
 
-router = APIRouter(prefix="/api/workflows", tags=["workflows"])
+router = APIRouter(prefix="/api/workflows", tags=["workflows"], route_class=ProfiledRoute)
+
+_snapshot = LocalCache(max_entries=1)
 
 
 def _node_out(n: WorkflowNode) -> WorkflowNodeOut:
@@ -22,43 +32,104 @@ def _node_out(n: WorkflowNode) -> WorkflowNodeOut:
         step_order=n.step_order,
         position_id=n.position_id,
         name=n.name,
+        condition=parse_json_list(n.condition_json),
+        extra_position_ids=parse_json_list(n.extra_position_ids_json),
+        required_approvals=n.required_approvals,
+        sla_hours=n.sla_hours,
+        sla_action=n.sla_action,
     )
 
 
-def _workflow_out(db: Session, wf: Workflow) -> WorkflowOut:
-    nodes = db.scalars(
-        select(WorkflowNode)
-        .where(WorkflowNode.workflow_id == wf.id)
-        .order_by(WorkflowNode.step_order.asc())
-    ).all()
+def _apply_rules(
+    db: Session,
+    node: WorkflowNode,
+    *,
+    condition: list[NodeCondition] | None,
+    extra_position_ids: list[int] | None,
+    required_approvals: int | None,
+) -> None:
+    if condition is not None:
+        raw = [c.model_dump() for c in condition]
+        try:
+            compile_condition(raw)
+        except RuleError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        node.condition_json = json.dumps(raw, ensure_ascii=False) if raw else ""
+    if extra_position_ids is not None:
+        extra = [p for p in dict.fromkeys(extra_position_ids) if p != node.position_id]
+        if extra:
+            found = db.scalars(select(Position.id).where(Position.id.in_(extra))).all()
+            if len(found) != len(extra):
+                raise HTTPException(status_code=404, detail="岗位不存在")
+        node.extra_position_ids_json = json.dumps(extra)
+    if required_approvals is not None:
+        node.required_approvals = required_approvals
+    if node.required_approvals > 1 + len(parse_json_list(node.extra_position_ids_json)):
+        raise HTTPException(status_code=400, detail="会签人数不能超过岗位数")
+
+
+def _workflow_out(wf: Workflow) -> WorkflowOut:
     return WorkflowOut(
         id=wf.id,
         name=wf.name,
         request_type=wf.request_type,
         is_active=wf.is_active,
         created_at=wf.created_at,
-        nodes=[_node_out(n) for n in nodes],
+        nodes=[_node_out(n) for n in wf.nodes],
+    )
+
+
+def _load_workflow(db: Session, workflow_id: int) -> Workflow | None:
+    return db.scalar(
+        select(Workflow).options(selectinload(Workflow.nodes)).where(Workflow.id == workflow_id)
+    )
+
+
+def _all_workflows(db: Session) -> list[WorkflowOut]:
+    # Two queries regardless of size (workflows + all their nodes), then served
+    # from memory until the next workflow edit.
+    def load() -> list[WorkflowOut]:
+        items = db.scalars(
+            select(Workflow).options(selectinload(Workflow.nodes)).order_by(Workflow.id.asc())
+        ).all()
+        return [_workflow_out(wf) for wf in items]
+
+    return _snapshot.get_or_set("all", load)
+
+
+def _deactivate_siblings(db: Session, wf: Workflow) -> None:
+    db.execute(
+        update(Workflow)
+        .where(Workflow.request_type == wf.request_type)
+        .where(Workflow.id != wf.id)
+        .where(Workflow.is_active.is_(True))
+        .values(is_active=False)
+        .execution_options(synchronize_session=False)
     )
 
 
+def invalidate_workflows() -> None:
+    _snapshot.clear()
+    invalidate_routing()
+
+
 @router.get("", response_model=list[WorkflowOut])
 def list_workflows(
     request_type: str | None = None,
     db: Session = Depends(get_db),
     _: User = Depends(require_roles("admin")),
 ) -> list[WorkflowOut]:
-    q = select(Workflow).order_by(Workflow.id.asc())
+    items = _all_workflows(db)
     if request_type:
-        q = q.where(Workflow.request_type == request_type)
-    items = db.scalars(q).all()
-    return [_workflow_out(db, wf) for wf in items]
+        items = [wf for wf in items if wf.request_type == request_type]
+    return items
 
 
 @router.post("", response_model=WorkflowOut, status_code=201)
 def create_workflow(
     body: WorkflowCreate,
     db: Session = Depends(get_db),
-    _: User = Depends(require_roles("admin")),
+    admin: User = Depends(require_roles("admin")),
 ) -> WorkflowOut:
     existing = db.scalar(select(Workflow).where(Workflow.name == body.name))
     if existing is not None:
@@ -67,18 +138,11 @@ def create_workflow(
     db.add(wf)
     db.flush()
     if wf.is_active:
-        others = db.scalars(
-            select(Workflow)
-            .where(Workflow.request_type == wf.request_type)
-            .where(Workflow.id != wf.id)
-            .where(Workflow.is_active.is_(True))
-        ).all()
-        for o in others:
-            o.is_active = False
-            db.add(o)
+        _deactivate_siblings(db, wf)
+    audit_log.record(db, admin, "workflow.create", "workflow", wf.id, after=snapshot(wf))
     db.commit()
-    db.refresh(wf)
-    return _workflow_out(db, wf)
+    invalidate_workflows()
+    return _workflow_out(_load_workflow(db, wf.id))
 
 
 @router.get("/{workflow_id}", response_model=WorkflowOut)
@@ -87,10 +151,10 @@ def get_workflow(
     db: Session = Depends(get_db),
     _: User = Depends(require_roles("admin")),
 ) -> WorkflowOut:
-    wf = db.get(Workflow, workflow_id)
-    if wf is None:
-        raise HTTPException(status_code=404, detail="审批流不存在")
-    return _workflow_out(db, wf)
+    for wf in _all_workflows(db):
+        if wf.id == workflow_id:
+            return wf
+    raise HTTPException(status_code=404, detail="审批流不存在")
 
 
 @router.patch("/{workflow_id}", response_model=WorkflowOut)
@@ -98,29 +162,23 @@ def update_workflow(
     workflow_id: int,
     body: WorkflowUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(require_roles("admin")),
+    admin: User = Depends(require_roles("admin")),
 ) -> WorkflowOut:
     wf = db.get(Workflow, workflow_id)
     if wf is None:
         raise HTTPException(status_code=404, detail="审批流不存在")
+    before = snapshot(wf)
     if body.name is not None:
         wf.name = body.name
     if body.is_active is not None:
         wf.is_active = body.is_active
         if wf.is_active:
-            others = db.scalars(
-                select(Workflow)
-                .where(Workflow.request_type == wf.request_type)
-                .where(Workflow.id != wf.id)
-                .where(Workflow.is_active.is_(True))
-            ).all()
-            for o in others:
-                o.is_active = False
-                db.add(o)
+            _deactivate_siblings(db, wf)
     db.add(wf)
+    audit_log.record(db, admin, "workflow.update", "workflow", wf.id, before=before, after=snapshot(wf))
     db.commit()
-    db.refresh(wf)
-    return _workflow_out(db, wf)
+    invalidate_workflows()
+    return _workflow_out(_load_workflow(db, wf.id))
 
 
 @router.post("/{workflow_id}/nodes", response_model=WorkflowNodeOut, status_code=201)
@@ -128,7 +186,7 @@ def add_node(
     workflow_id: int,
     body: WorkflowNodeCreate,
     db: Session = Depends(get_db),
-    _: User = Depends(require_roles("admin")),
+    admin: User = Depends(require_roles("admin")),
 ) -> WorkflowNodeOut:
     wf = db.get(Workflow, workflow_id)
     if wf is None:
@@ -150,10 +208,55 @@ def add_node(
         step_order=body.step_order,
         position_id=body.position_id,
         name=body.name,
+        sla_hours=body.sla_hours,
+        sla_action=body.sla_action,
+    )
+    _apply_rules(
+        db,
+        node,
+        condition=body.condition,
+        extra_position_ids=body.extra_position_ids,
+        required_approvals=body.required_approvals,
     )
     db.add(node)
+    db.flush()
+    audit_log.record(db, admin, "workflow.add_node", "workflow_node", node.id, after=snapshot(node))
     db.commit()
     db.refresh(node)
+    invalidate_workflows()
+    return _node_out(node)
+
+
+@router.patch("/{workflow_id}/nodes/{node_id}", response_model=WorkflowNodeOut)
+def update_node(
+    workflow_id: int,
+    node_id: int,
+    body: WorkflowNodeUpdate,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_roles("admin")),
+) -> WorkflowNodeOut:
+    node = db.get(WorkflowNode, node_id)
+    if node is None or node.workflow_id != workflow_id:
+        raise HTTPException(status_code=404, detail="节点不存在")
+    before = snapshot(node)
+    if body.name is not None:
+        node.name = body.name
+    if body.sla_hours is not None:
+        node.sla_hours = body.sla_hours
+    if body.sla_action is not None:
+        node.sla_action = body.sla_action
+    _apply_rules(
+        db,
+        node,
+        condition=body.condition,
+        extra_position_ids=body.extra_position_ids,
+        required_approvals=body.required_approvals,
+    )
+    db.add(node)
+    audit_log.record(db, admin, "workflow.update_node", "workflow_node", node.id, before=before, after=snapshot(node))
+    db.commit()
+    db.refresh(node)
+    invalidate_workflows()
     return _node_out(node)
 
 
@@ -162,10 +265,12 @@ def delete_node(
     workflow_id: int,
     node_id: int,
     db: Session = Depends(get_db),
-    _: User = Depends(require_roles("admin")),
+    admin: User = Depends(require_roles("admin")),
 ) -> None:
     node = db.get(WorkflowNode, node_id)
     if node is None or node.workflow_id != workflow_id:
         raise HTTPException(status_code=404, detail="节点不存在")
+    audit_log.record(db, admin, "workflow.delete_node", "workflow_node", node.id, before=snapshot(node))
     db.delete(node)
     db.commit()
+    invalidate_workflows()
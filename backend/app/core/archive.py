@@ -0,0 +1,73 @@
+import time
+from datetime import timedelta
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from backend.app.core.config import settings
+from backend.app.core.jobs import PeriodicJob, register
+from backend.app.db.models import (
+    Approval,
+    ArchivedApproval,
+    ArchivedRequest,
+    ArchivedRequestPayload,
+    OARequest,
+    RequestPayload,
+    utcnow,
+)
+from backend.app.db.session import SHARD_NAMES, shard_session
+
+CLOSED_STATUSES = ("approved", "rejected")
+
+
+def _move(db: Session, source, target, where) -> None:
+    cols = [c.name for c in source.__table__.columns]
+    db.execute(
+        insert(target.__table__).from_select(
+            cols, select(*[source.__table__.c[c] for c in cols]).where(where)
+        )
+    )
+    db.execute(delete(source.__table__).where(where))
+
+
+def archive_batch(db: Session, *, older_than_days: int, batch_size: int) -> int:
+    cutoff = utcnow() - timedelta(days=older_than_days)
+    ids = db.scalars(
+        select(OARequest.id)
+        .where(OARequest.status.in_(CLOSED_STATUSES))
+        .where(OARequest.updated_at < cutoff)
+        .order_by(OARequest.id.asc())
+        .limit(batch_size)
+    ).all()
+    if not ids:
+        return 0
+    _move(db, Approval, ArchivedApproval, Approval.__table__.c.request_id.in_(ids))
+    _move(db, RequestPayload, ArchivedRequestPayload, RequestPayload.__table__.c.request_id.in_(ids))
+    _move(db, OARequest, ArchivedRequest, OARequest.__table__.c.id.in_(ids))
+    db.commit()
+    return len(ids)
+
+
+def run_archiver(
+    older_than_days: int | None = None, batch_size: int | None = None, max_batches: int = 1000
+) -> int:
+    older_than_days = settings.archive_after_days if older_than_days is None else older_than_days
+    batch_size = batch_size or settings.archive_batch_size
+    if older_than_days <= 0:
+        return 0
+    moved = 0
+    for shard in SHARD_NAMES:
+        for _ in range(max_batches):
+            # One short transaction per batch so writers are never locked out for long.
+            with shard_session(shard) as db:
+                n = archive_batch(db, older_than_days=older_than_days, batch_size=batch_size)
+            moved += n
+            if n < batch_size:
+                break
+            time.sleep(settings.archive_pause_seconds)
+    return moved
+
+
+archive_job = register(
+    PeriodicJob("archiver", settings.archive_interval_seconds, lambda: run_archiver())
+)
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import re
+import shutil
+import sys
+from mimetypes import guess_type
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from backend.app.core.compression import accepted_encodings, available_encodings, compress
+from backend.app.core.config import settings
+
+FINGERPRINTED = ("js", "css")
+PRECOMPRESSED = ("js", "css", "html", "svg", "json")
+ENCODING_SUFFIX = {"br": ".br", "gzip": ".gz"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_fingerprint_re = re.compile(r"\.[0-9a-f]{12}\.[a-z0-9]+$")
+
+
+def _suffix(path: Path) -> str:
+    return path.suffix.lstrip(".").lower()
+
+
+def source_digest(src: Path) -> str:
+    h = hashlib.sha256()
+    for p in sorted(q for q in src.rglob("*") if q.is_file()):
+        h.update(p.relative_to(src).as_posix().encode("utf-8"))
+        h.update(p.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def default_build_dir(src: Path) -> Path:
+    # Keyed by source content: unchanged sources reuse the previous build. Kept in
+    # a directory of the app's own, never a shared temp dir: a build found there
+    # is served as is, so whoever can write it controls the frontend.
+    return Path(settings.static_cache_dir) / source_digest(src)
+
+
+def ensure_assets(src: Path, out: Path) -> Path:
+    if (out / "index.html").exists():
+        return out
+    # Build next to the target and rename, so concurrent workers never see a half-built tree.
+    tmp = out.with_name(f"{out.name}.tmp{os.getpid()}")
+    build_assets(src, tmp)
+    try:
+        if out.exists():
+            shutil.rmtree(out)
+        tmp.rename(out)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+
+def build_assets(src: Path, out: Path) -> Path:
+    # Copies src into out with content-hashed names for js/css, rewrites references
+    # to them (index.html, ES module imports), and writes .gz/.br siblings.
+    if out.exists():
+        shutil.rmtree(out)
+    out.mkdir(parents=True)
+
+    files = [p for p in src.rglob("*") if p.is_file()]
+    texts = {p: p.read_text("utf-8") for p in files if _suffix(p) in PRECOMPRESSED}
+    renamed: dict[str, str] = {}
+
+    def rewrite(text: str) -> str:
+        for old, new in renamed.items():
+            text = re.sub(r'(["\'(/]|\./)' + re.escape(old) + r'(?=["\')?#])', lambda m: m.group(1) + new, text)
+        return text
+
+    # Leaves first: an asset is hashed only after the assets it references,
+    # so its hash covers their new names.
+    pending = [p for p in files if _suffix(p) in FINGERPRINTED]
+    while pending:
+        ready = [
+            p
+            for p in pending
+            if not any(q.name in texts[p] for q in pending if q is not p)
+        ] or pending[:1]
+        for p in ready:
+            content = rewrite(texts[p]).encode("utf-8")
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            rel = p.relative_to(src)
+            hashed = rel.with_name(f"{p.stem}.{digest}{p.suffix}")
+            (out / hashed).parent.mkdir(parents=True, exist_ok=True)
+            (out / hashed).write_bytes(content)
+            renamed[rel.as_posix()] = hashed.as_posix()
+            pending.remove(p)
+
+    for p in files:
+        rel = p.relative_to(src)
+        if _suffix(p) in FINGERPRINTED:
+            continue
+        (out / rel).parent.mkdir(parents=True, exist_ok=True)
+        if p in texts:
+            (out / rel).write_bytes(rewrite(texts[p]).encode("utf-8"))
+        else:
+            shutil.copy2(p, out / rel)
+
+    for p in list(out.rglob("*")):
+        if p.is_file() and _suffix(p) in PRECOMPRESSED:
+            data = p.read_bytes()
+            for enc in available_encodings():
+                packed = compress(data, enc)
+                if len(packed) < len(data):
+                    p.with_name(p.name + ENCODING_SUFFIX[enc]).write_bytes(packed)
+    return out
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def file_response(
+        self,
+        full_path: os.PathLike | str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        path = str(full_path)
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+
+        response: Response | None = None
+        for enc in available_encodings():
+            variant = path + ENCODING_SUFFIX[enc]
+            if enc in accepted and os.path.isfile(variant):
+                response = FileResponse(
+                    variant,
+                    status_code=status_code,
+                    media_type=guess_type(path)[0] or "text/plain",
+                    headers={"Content-Encoding": enc},
+                )
+                break
+        if response is None:
+            response = FileResponse(path, status_code=status_code, stat_result=stat_result)
+
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = (
+            IMMUTABLE if _fingerprint_re.search(path) else "no-cache"
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    # python -m backend.app.core.assets <frontend_dir> <out_dir>
+    print(build_assets(Path(sys.argv[1]), Path(sys.argv[2])))
@@ -0,0 +1,104 @@
+import threading
+from collections import Counter
+from typing import Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend.app.core.config import AssignmentStrategy, settings
+from backend.app.core.shards import each_shard
+from backend.app.db.models import RequestInbox, User
+
+
+def _open_by_assignee(db: Session) -> list:
+    # Inbox rows exist only for pending requests, one per position still to sign.
+    return db.execute(
+        select(RequestInbox.assignee_user_id, func.count())
+        .where(RequestInbox.assignee_user_id.is_not(None))
+        .group_by(RequestInbox.assignee_user_id)
+    ).all()
+
+
+class AssigneeIndex:
+    # position -> active user ids, plus per-user open (pending, assigned) counts.
+    # Loaded once and kept current in memory; user edits invalidate it.
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_position: dict[int, list[int]] | None = None
+        self._open: Counter[int] = Counter()
+        self._cursor: dict[int, int] = {}
+        self._sticky: dict[tuple[int, int], int] = {}
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._by_position = None
+
+    def _load(self, db: Session) -> dict[int, list[int]]:
+        by_position: dict[int, list[int]] = {}
+        for user_id, position_id in db.execute(
+            select(User.id, User.position_id)
+            .where(User.is_active.is_(True))
+            .where(User.position_id.is_not(None))
+            .order_by(User.id.asc())
+        ):
+            by_position.setdefault(position_id, []).append(user_id)
+        open_counts: Counter[int] = Counter()
+        for rows in each_shard(db, _open_by_assignee):
+            open_counts.update(dict(rows))
+        with self._lock:
+            self._by_position = by_position
+            self._open = open_counts
+        return by_position
+
+    def candidates(self, db: Session, position_id: int) -> list[int]:
+        with self._lock:
+            by_position = self._by_position
+        if by_position is None:
+            by_position = self._load(db)
+        return by_position.get(position_id, [])
+
+    def pick(
+        self,
+        db: Session,
+        *,
+        position_id: int,
+        requester_id: int | None = None,
+        exclude_user_id: int | None = None,
+        strategy: AssignmentStrategy | None = None,
+    ) -> int | None:
+        users = [u for u in self.candidates(db, position_id) if u != exclude_user_id]
+        if not users:
+            return None
+        strategy = strategy or settings.assignment_strategy
+        with self._lock:
+            if strategy == "least_pending":
+                return min(users, key=lambda u: (self._open[u], u))
+            if strategy == "sticky" and requester_id is not None:
+                key = (requester_id, position_id)
+                chosen = self._sticky.get(key)
+                if chosen not in users:
+                    chosen = self._next_round_robin(position_id, users)
+                    self._sticky[key] = chosen
+                return chosen
+            if strategy in ("round_robin", "sticky"):
+                return self._next_round_robin(position_id, users)
+            return users[0]
+
+    def _next_round_robin(self, position_id: int, users: list[int]) -> int:
+        i = self._cursor.get(position_id, -1) + 1
+        self._cursor[position_id] = i
+        return users[i % len(users)]
+
+    def reassigned(self, *, old_user_ids: Iterable[int], new_user_ids: Iterable[int]) -> None:
+        # Call after the transition committed so the counts track durable state only.
+        # Every assignee of a countersign node counts, not just the first.
+        with self._lock:
+            for u in old_user_ids:
+                if self._open[u] > 0:
+                    self._open[u] -= 1
+            for u in new_user_ids:
+                self._open[u] += 1
+
+
+assignees = AssigneeIndex()
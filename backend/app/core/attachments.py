@@ -0,0 +1,64 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator
+
+import anyio
+
+from backend.app.core.config import settings
+
+
+class TooLarge(Exception):
+    pass
+
+
+def blob_path(sha256: str) -> Path:
+    return Path(settings.attachments_dir) / sha256[:2] / sha256
+
+
+def remove_blob(sha256: str) -> None:
+    try:
+        os.unlink(blob_path(sha256))
+    except FileNotFoundError:
+        pass
+
+
+async def store_stream(chunks: AsyncIterator[bytes], limit: int) -> tuple[str, int, bool]:
+    # Writes the upload chunk by chunk to a temp file while hashing it, then
+    # renames it into place under its digest. Nothing larger than one chunk is
+    # held in memory, and a blob that already exists is simply kept. The flag
+    # says whether this call created the blob.
+    root = Path(settings.attachments_dir)
+    tmp_dir = root / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with anyio.wrap_file(os.fdopen(fd, "wb")) as f:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > limit:
+                    raise TooLarge()
+                digest.update(chunk)
+                await f.write(chunk)
+            await f.flush()
+            await anyio.to_thread.run_sync(os.fsync, f.wrapped.fileno())
+        sha256 = digest.hexdigest()
+        final = blob_path(sha256)
+        created = not final.exists()
+        if not created:
+            os.unlink(tmp)
+        else:
+            final.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, final)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    return sha256, size, created
@@ -0,0 +1,121 @@
+import json
+import threading
+from collections import deque
+from typing import Any
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from backend.app.core.config import settings
+from backend.app.core.jobs import PeriodicJob, register
+from backend.app.db.models import AuditEntry, User, utcnow
+from backend.app.db.session import AuditSessionLocal, SessionLocal
+
+SECRET_COLUMNS = {"password_hash"}
+
+
+def snapshot(obj: Any) -> dict[str, Any]:
+    return {
+        c.key: getattr(obj, c.key)
+        for c in obj.__table__.columns
+        if c.key not in SECRET_COLUMNS
+    }
+
+
+def _dump(value: dict[str, Any] | None) -> str | None:
+    if value is None:
+        return None
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class AuditLog:
+    # Entries are serialized when recorded and attached to the caller's session;
+    # they join the in-memory buffer only if that session commits. The flush job
+    # then writes each accumulated batch with one INSERT and one commit, so a
+    # mutation pays for an append rather than a write.
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer: deque[dict[str, Any]] = deque()
+
+    def record(
+        self,
+        db: Session,
+        actor: User | None,
+        action: str,
+        entity_type: str,
+        entity_id: int | None,
+        *,
+        before: dict[str, Any] | None = None,
+        after: dict[str, Any] | None = None,
+    ) -> None:
+        db.info.setdefault("audit", []).append(
+            {
+                "at": utcnow(),
+                "actor_user_id": actor.id if actor is not None else None,
+                "actor_username": actor.username if actor is not None else "",
+                "action": action,
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "before_json": _dump(before),
+                "after_json": _dump(after),
+            }
+        )
+
+    def _append(self, entries: list[dict[str, Any]]) -> None:
+        with self._lock:
+            self._buffer.extend(entries)
+            pending = len(self._buffer)
+        if pending >= settings.audit_buffer_size:
+            # The writer is falling behind: make the caller help rather than drop entries.
+            self.flush_all()
+        elif pending >= settings.audit_batch_size:
+            flusher.wake()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def _flush_batch(self) -> int:
+        with self._lock:
+            batch = [
+                self._buffer.popleft()
+                for _ in range(min(len(self._buffer), settings.audit_batch_size))
+            ]
+        if not batch:
+            return 0
+        try:
+            with AuditSessionLocal() as db:
+                db.execute(insert(AuditEntry), batch)
+                db.commit()
+        except Exception:
+            with self._lock:
+                self._buffer.extendleft(reversed(batch))
+            raise
+        return len(batch)
+
+    def flush_all(self) -> int:
+        written = 0
+        with self._flush_lock:
+            while n := self._flush_batch():
+                written += n
+        return written
+
+
+audit_log = AuditLog()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_on_commit(session: Session) -> None:
+    entries = session.info.pop("audit", None)
+    if entries:
+        audit_log._append(entries)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop("audit", None)
+
+
+flusher = register(PeriodicJob("audit", settings.audit_flush_seconds, audit_log.flush_all))
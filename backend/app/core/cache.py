@@ -0,0 +1,43 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class LocalCache:
+    # Small in-process LRU. clear() bumps a generation so a value computed from
+    # pre-invalidation data is never stored after the invalidation.
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self._lock = threading.Lock()
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._max_entries = max_entries
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def get_or_set(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+            generation = self._generation
+        value = fn()
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = value
+                self._data.move_to_end(key)
+                while len(self._data) > self._max_entries:
+                    self._data.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
@@ -1,5 +1,9 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+AssignmentStrategy = Literal["lowest_id", "round_robin", "least_pending", "sticky"]
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="OA_", case_sensitive=False)
@@ -7,10 +11,97 @@ class Settings(BaseSettings):
     secret_key: str = "dev-secret-change-me"
     access_token_expire_minutes: int = 60 * 8
     db_url: str = "sqlite:///./oa.db"
+    db_read_url: str = ""
+    db_read_sticky_seconds: float = 5.0
+    db_read_sync_seconds: float = 0.0
+    # Sharded mode: "name=sqlite:///./oa_a.db,..." plus "department_id=name,...".
+    # Departments not listed stay on db_url, which also holds all shared data.
+    shards: str = ""
+    shard_departments: str = ""
     cors_origins: str = "http://127.0.0.1:8000,http://localhost:8000"
+    gzip_min_size: int = 1024
+    static_fingerprint: bool = True
+    static_build_dir: str = ""
+    static_cache_dir: str = "./static_build"  # where startup builds go when static_build_dir is unset
+
+    payload_compress_min_bytes: int = 256
+
+    attachments_dir: str = "./attachments"
+    attachment_max_bytes: int = 20 * 1024 * 1024  # per file
+    attachment_quota_bytes: int = 50 * 1024 * 1024  # per request, all files together
+    attachment_max_files: int = 20  # per request
+
+    write_queue: bool = False  # coalesce request/approval writes on one writer thread
+    write_batch_size: int = 128
+
+    idempotency_ttl_seconds: int = 24 * 3600
+    idempotency_purge_seconds: float = 600.0
+
+    audit_db_url: str = ""  # empty: audit table lives in the main database
+    audit_flush_seconds: float = 1.0
+    audit_batch_size: int = 500
+    audit_buffer_size: int = 50000
+
+    login_user_per_minute: float = 5.0
+    login_user_burst: int = 5
+    login_ip_per_minute: float = 30.0
+    login_ip_burst: int = 20
+    login_max_concurrent: int = 4  # concurrent password verifications; more get 429
+    login_lockout_after: int = 5  # consecutive failures before lockout
+    login_lockout_seconds: float = 30.0  # doubles with each further failure
+    login_lockout_max_seconds: float = 900.0
+    login_throttle_entries: int = 10000
+    trusted_proxies: str = ""  # comma-separated peer IPs whose X-Forwarded-For is believed
+
+    slow_query_ms: float = 200.0  # 0 disables statement timing
+    slow_query_fingerprints: int = 500
+
+    profile_sample_rate: float = 0.0  # fraction of requests to profile; 0 = only on X-OA-Profile
+    profile_slow_ms: float = 200.0  # sampled profiles faster than this are discarded
+    profile_interval_ms: float = 5.0
+    profile_dir: str = "./profiles"
+    profile_keep: int = 200
+    profile_max_concurrent: int = 4
+
+    sse_heartbeat_seconds: int = 15
+    sse_history_size: int = 1000
+
+    assignment_strategy: AssignmentStrategy = "least_pending"
+
+    archive_after_days: int = 0  # 0 disables archiving
+    archive_batch_size: int = 500
+    archive_interval_seconds: float = 3600.0
+    archive_pause_seconds: float = 0.05
+
+    sla_scan_seconds: float = 60.0  # 0 disables SLA escalation
+    sla_batch_size: int = 100
+    sla_max_batches: int = 20
+
+    notify_sink: str = "log"  # log / smtp / webhook / none
+    notify_poll_seconds: float = 2.0
+    notify_batch_size: int = 100
+    notify_max_attempts: int = 8
+    notify_backoff_seconds: float = 5.0
+    notify_smtp_host: str = "127.0.0.1"
+    notify_smtp_port: int = 1025
+    notify_mail_from: str = "oa@localhost"
+    notify_mail_domain: str = "localhost"
+    notify_webhook_url: str = ""
+    notify_timeout_seconds: float = 10.0
 
     def cors_origin_list(self) -> list[str]:
         return [o.strip() for o in self.cors_origins.split(",") if o.strip()]
 
+    def trusted_proxy_list(self) -> list[str]:
+        return [p.strip() for p in self.trusted_proxies.split(",") if p.strip()]
+
+    def shard_urls(self) -> dict[str, str]:
+        pairs = (item.split("=", 1) for item in self.shards.split(",") if "=" in item)
+        return {name.strip(): url.strip() for name, url in pairs}
+
+    def shard_department_map(self) -> dict[int, str]:
+        pairs = (item.split("=", 1) for item in self.shard_departments.split(",") if "=" in item)
+        return {int(dept): name.strip() for dept, name in pairs}
+
 
 settings = Settings()
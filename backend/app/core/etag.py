@@ -0,0 +1,61 @@
+import hashlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class ETagMiddleware:
+    # Weak ETags for complete GET JSON responses; a matching If-None-Match gets a
+    # bodiless 304. Must sit inside CompressionMiddleware so the tag is computed
+    # on the identity body.
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        if_none_match = Headers(scope=scope).get("if-none-match", "")
+        start: Message | None = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                # e.g. http.response.pathsend: the body never passes through here.
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+
+            pending, start = start, None
+            headers = MutableHeaders(raw=pending["headers"])
+            body = message.get("body", b"")
+            if (
+                pending["status"] != 200
+                or message.get("more_body", False)
+                or "etag" in headers
+                or not headers.get("content-type", "").startswith("application/json")
+            ):
+                await send(pending)
+                await send(message)
+                return
+
+            etag = 'W/"%s"' % hashlib.sha1(body).hexdigest()[:20]
+            headers["ETag"] = etag
+            headers.setdefault("Cache-Control", "private, no-cache")
+            if etag in [t.strip() for t in if_none_match.split(",")]:
+                del headers["Content-Length"]
+                if "content-type" in headers:
+                    del headers["Content-Type"]
+                await send({**pending, "status": 304, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send(pending)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
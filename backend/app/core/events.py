@@ -0,0 +1,116 @@
+import asyncio
+import itertools
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from backend.app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    data: dict[str, Any]
+    creator_user_id: int | None = None
+    position_ids: tuple[int, ...] = ()
+
+
+@dataclass(eq=False)
+class Subscription:
+    user_id: int
+    position_id: int | None
+    is_admin: bool
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=256))
+    overflowed: bool = False
+
+    def wants(self, event: Event) -> bool:
+        if event.creator_user_id == self.user_id:
+            return True
+        if self.is_admin and event.position_ids:
+            return True
+        return self.position_id is not None and self.position_id in event.position_ids
+
+    def _offer(self, event: Event) -> None:
+        if self.queue.full():
+            # Slow consumer: let the client resync instead of buffering without bound.
+            self.overflowed = True
+            return
+        self.queue.put_nowait(event)
+
+
+class EventBus:
+    def __init__(self, history_size: int = 1000) -> None:
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history: deque[Event] = deque(maxlen=history_size)
+        self._subscribers: set[Subscription] = set()
+
+    @property
+    def last_id(self) -> int:
+        with self._lock:
+            return self._history[-1].id if self._history else 0
+
+    def publish(
+        self,
+        type: str,
+        data: dict[str, Any],
+        *,
+        creator_user_id: int | None = None,
+        position_ids: tuple[int, ...] | list[int] = (),
+    ) -> Event:
+        with self._lock:
+            event = Event(
+                id=next(self._ids),
+                type=type,
+                data=data,
+                creator_user_id=creator_user_id,
+                position_ids=tuple(p for p in position_ids if p is not None),
+            )
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            if not sub.wants(event):
+                continue
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, event)
+            except RuntimeError:
+                # Event loop already closed; the stream is gone.
+                self.unsubscribe(sub)
+        return event
+
+    def subscribe(
+        self, *, user_id: int, position_id: int | None, is_admin: bool
+    ) -> Subscription:
+        sub = Subscription(
+            user_id=user_id,
+            position_id=position_id,
+            is_admin=is_admin,
+            loop=asyncio.get_running_loop(),
+        )
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def replay(self, sub: Subscription, after_id: int) -> list[Event] | None:
+        # None means the gap is no longer buffered and the client must refetch.
+        with self._lock:
+            history = list(self._history)
+        if after_id <= 0:
+            return []
+        newest = history[-1].id if history else 0
+        if after_id > newest:
+            # Id from a previous process: the client cannot be caught up incrementally.
+            return None
+        if history and after_id < history[0].id - 1:
+            return None
+        return [e for e in history if e.id > after_id and sub.wants(e)]
+
+
+bus = EventBus(history_size=settings.sse_history_size)
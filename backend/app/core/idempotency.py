@@ -0,0 +1,82 @@
+import hashlib
+import logging
+from datetime import timedelta
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from backend.app.core.config import settings
+from backend.app.core.jobs import PeriodicJob, register
+from backend.app.db.models import IdempotencyRecord, utcnow
+from backend.app.db.session import SHARD_NAMES, shard_session
+
+logger = logging.getLogger("oa.idempotency")
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class Idempotency:
+    # Usage: replay() before doing anything, remember() inside the write unit so
+    # the stored response commits or rolls back with the work itself, and replay()
+    # again if the write hit IntegrityError (a concurrent retry won the insert).
+    # Without a key every method is a no-op.
+
+    def __init__(self, user_id: int, key: str | None, scope: str, body: BaseModel) -> None:
+        self.user_id = user_id
+        self.key = key or None
+        self.fingerprint = hashlib.sha256(f"{scope}\n{body.model_dump_json()}".encode("utf-8")).hexdigest()
+
+    def replay(self, db: Session) -> Response | None:
+        if self.key is None:
+            return None
+        row = db.get(IdempotencyRecord, (self.user_id, self.key))
+        if row is None or row.expires_at <= utcnow():
+            return None
+        if row.fingerprint != self.fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key 已用于其他请求")
+        return Response(
+            content=row.body,
+            status_code=row.status_code,
+            media_type="application/json",
+            headers={REPLAYED_HEADER: "true"},
+        )
+
+    def remember(self, db: Session, out: BaseModel, status_code: int) -> None:
+        if self.key is None:
+            return
+        now = utcnow()
+        # An expired record may still be waiting for the purge job.
+        db.execute(
+            delete(IdempotencyRecord)
+            .where(IdempotencyRecord.user_id == self.user_id)
+            .where(IdempotencyRecord.key == self.key)
+            .where(IdempotencyRecord.expires_at <= now)
+        )
+        db.add(
+            IdempotencyRecord(
+                user_id=self.user_id,
+                key=self.key,
+                fingerprint=self.fingerprint,
+                status_code=status_code,
+                body=out.model_dump_json(),
+                expires_at=now + timedelta(seconds=settings.idempotency_ttl_seconds),
+            )
+        )
+        db.flush()
+
+
+def purge_expired() -> int:
+    n = 0
+    for shard in SHARD_NAMES:
+        with shard_session(shard) as db:
+            n += db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= utcnow())).rowcount
+            db.commit()
+    if n:
+        logger.info("purged %d expired idempotency keys", n)
+    return n
+
+
+purger = register(PeriodicJob("idempotency", settings.idempotency_purge_seconds, purge_expired))
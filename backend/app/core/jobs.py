@@ -0,0 +1,59 @@
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger("oa.jobs")
+
+
+class PeriodicJob:
+    def __init__(self, name: str, interval: float, fn: Callable[[], None]) -> None:
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"oa-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.fn()
+            except Exception:
+                logger.exception("job %s failed", self.name)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+_jobs: list[PeriodicJob] = []
+
+
+def register(job: PeriodicJob) -> PeriodicJob:
+    _jobs.append(job)
+    return job
+
+
+def start_all() -> None:
+    for job in _jobs:
+        job.start()
+
+
+def stop_all() -> None:
+    for job in _jobs:
+        job.stop()
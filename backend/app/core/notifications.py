@@ -0,0 +1,207 @@
+import json
+import logging
+import smtplib
+import urllib.request
+from dataclasses import dataclass
+from datetime import timedelta
+from email.message import EmailMessage
+from typing import Any, Protocol
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from backend.app.core.config import settings
+from backend.app.core.jobs import PeriodicJob, register
+from backend.app.db.models import NotificationOutbox, OARequest, User, utcnow
+from backend.app.db.session import SHARD_NAMES, shard_session
+
+logger = logging.getLogger("oa.notifications")
+
+KIND_SUBJECT = {
+    "approval.assigned": "待审批：{title}",
+    "request.advanced": "申请已进入下一节点：{title}",
+    "request.overdue": "审批已超时：{title}",
+    "request.approved": "申请已通过：{title}",
+    "request.rejected": "申请已驳回：{title}",
+}
+
+# A claimed batch is invisible to other workers for this long; a crashed worker's
+# rows simply become due again afterwards.
+CLAIM_LEASE_SECONDS = 120
+
+
+@dataclass
+class Recipient:
+    user_id: int
+    username: str
+    full_name: str
+
+
+class NotificationSink(Protocol):
+    def deliver(self, recipient: Recipient, items: list[dict[str, Any]]) -> None: ...
+
+
+def _subject(item: dict[str, Any]) -> str:
+    template = KIND_SUBJECT.get(item.get("kind", ""), "{title}")
+    return template.format(title=item.get("title", ""))
+
+
+class LogSink:
+    def deliver(self, recipient: Recipient, items: list[dict[str, Any]]) -> None:
+        for item in items:
+            logger.info("notify %s: %s", recipient.username, _subject(item))
+
+
+class SmtpSink:
+    def deliver(self, recipient: Recipient, items: list[dict[str, Any]]) -> None:
+        msg = EmailMessage()
+        msg["From"] = settings.notify_mail_from
+        msg["To"] = f"{recipient.username}@{settings.notify_mail_domain}"
+        if len(items) == 1:
+            msg["Subject"] = _subject(items[0])
+        else:
+            msg["Subject"] = f"OA 通知（{len(items)} 条）"
+        msg.set_content("\n".join(f"- {_subject(i)} (#{i.get('request_id')})" for i in items))
+        with smtplib.SMTP(
+            settings.notify_smtp_host,
+            settings.notify_smtp_port,
+            timeout=settings.notify_timeout_seconds,
+        ) as smtp:
+            smtp.send_message(msg)
+
+
+class WebhookSink:
+    def deliver(self, recipient: Recipient, items: list[dict[str, Any]]) -> None:
+        body = json.dumps(
+            {
+                "recipient": {"user_id": recipient.user_id, "username": recipient.username},
+                "notifications": [{**i, "subject": _subject(i)} for i in items],
+            },
+            ensure_ascii=False,
+            default=str,
+        ).encode("utf-8")
+        req = urllib.request.Request(
+            settings.notify_webhook_url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=settings.notify_timeout_seconds) as resp:
+            resp.read()
+
+
+def make_sink(name: str) -> NotificationSink | None:
+    if name == "log":
+        return LogSink()
+    if name == "smtp":
+        return SmtpSink()
+    if name == "webhook" and settings.notify_webhook_url:
+        return WebhookSink()
+    return None
+
+
+def enqueue_notification(
+    db: Session, *, kind: str, recipient_user_id: int | None, req: OARequest, dedupe: str = ""
+) -> None:
+    # Written with the caller's state change and committed by the caller, so a
+    # notification exists if and only if the transition does.
+    if recipient_user_id is None:
+        return
+    db.add(
+        NotificationOutbox(
+            kind=kind,
+            recipient_user_id=recipient_user_id,
+            request_id=req.id,
+            dedupe_key=f"{kind}:{req.id}:{recipient_user_id}:{dedupe}",
+            payload_json=json.dumps(
+                {"title": req.title, "type": req.type, "status": req.status},
+                ensure_ascii=False,
+            ),
+        )
+    )
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(settings.notify_backoff_seconds * (2 ** (attempts - 1)), 3600))
+
+
+def deliver_due(sink: NotificationSink | None = None, shard: str | None = None) -> int:
+    sink = sink or make_sink(settings.notify_sink)
+    if sink is None:
+        return 0
+
+    now = utcnow()
+    with shard_session(shard) as db:
+        ids = db.scalars(
+            select(NotificationOutbox.id)
+            .where(NotificationOutbox.status == "pending")
+            .where(NotificationOutbox.next_attempt_at <= now)
+            .order_by(NotificationOutbox.id.asc())
+            .limit(settings.notify_batch_size)
+        ).all()
+        if not ids:
+            return 0
+        claimed = db.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(ids))
+            .where(NotificationOutbox.status == "pending")
+            .where(NotificationOutbox.next_attempt_at <= now)
+            .values(next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS))
+        )
+        db.commit()
+        if claimed.rowcount == 0:
+            return 0
+
+        rows = db.execute(
+            select(NotificationOutbox, User)
+            .join(User, NotificationOutbox.recipient_user_id == User.id)
+            .where(NotificationOutbox.id.in_(ids))
+            .where(NotificationOutbox.next_attempt_at > now)
+            .order_by(NotificationOutbox.id.asc())
+        ).all()
+
+        # One message per recipient; identical notifications collapse into one item.
+        by_recipient: dict[int, tuple[Recipient, dict[str, dict[str, Any]], list[NotificationOutbox]]] = {}
+        for n, u in rows:
+            recipient, items, members = by_recipient.setdefault(
+                u.id, (Recipient(user_id=u.id, username=u.username, full_name=u.full_name), {}, [])
+            )
+            members.append(n)
+            if n.dedupe_key in items:
+                continue
+            try:
+                payload = json.loads(n.payload_json or "{}")
+            except Exception:
+                payload = {}
+            items[n.dedupe_key] = {**payload, "kind": n.kind, "request_id": n.request_id}
+
+        for recipient, items, members in by_recipient.values():
+            try:
+                sink.deliver(recipient, list(items.values()))
+            except Exception as e:
+                logger.warning("notify %s failed: %s", recipient.username, e)
+                for n in members:
+                    n.attempts += 1
+                    n.last_error = str(e)[:500]
+                    if n.attempts >= settings.notify_max_attempts:
+                        n.status = "failed"
+                    else:
+                        n.next_attempt_at = utcnow() + _backoff(n.attempts)
+            else:
+                delivered_at = utcnow()
+                for n in members:
+                    n.status = "delivered"
+                    n.delivered_at = delivered_at
+        # Delivery is at-least-once: a crash before this commit re-sends the batch after the lease.
+        db.commit()
+        return len(rows)
+
+
+def _run_until_drained() -> None:
+    # Each shard keeps its own outbox, next to the requests it is about.
+    for shard in SHARD_NAMES:
+        while deliver_due(shard=shard) >= settings.notify_batch_size:
+            pass
+
+
+worker = register(PeriodicJob("notifications", settings.notify_poll_seconds, _run_until_drained))
@@ -0,0 +1,39 @@
+import json
+import zlib
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from backend.app.core.config import settings
+from backend.app.db.models import ArchivedRequest, ArchivedRequestPayload, OARequest, RequestPayload
+
+
+def encode_payload(data: dict[str, Any]) -> tuple[str, bytes]:
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(raw) >= settings.payload_compress_min_bytes:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return "zlib", packed
+    return "json", raw
+
+
+def decode_payload(encoding: str, body: bytes) -> dict[str, Any]:
+    raw = zlib.decompress(body) if encoding == "zlib" else body
+    try:
+        data = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_payload(db: Session, request_id: int, data: dict[str, Any] | None) -> None:
+    if not data:
+        return
+    encoding, body = encode_payload(data)
+    db.add(RequestPayload(request_id=request_id, encoding=encoding, body=body))
+
+
+def load_payload(db: Session, req: OARequest | ArchivedRequest) -> dict[str, Any]:
+    model = ArchivedRequestPayload if isinstance(req, ArchivedRequest) else RequestPayload
+    row = db.get(model, req.id)
+    return decode_payload(row.encoding, row.body) if row is not None else {}
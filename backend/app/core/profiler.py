@@ -0,0 +1,262 @@
+import functools
+import inspect
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+import anyio
+from fastapi.routing import APIRoute
+from sqlalchemy import select
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.app.core.config import settings
+from backend.app.core.security import decode_token
+from backend.app.db.models import User
+from backend.app.db.session import SessionLocal
+
+logger = logging.getLogger("oa.profiler")
+
+PROFILE_HEADER = "x-oa-profile"
+
+_current: ContextVar["Profile | None"] = ContextVar("oa_profile", default=None)
+
+
+class Profile:
+    def __init__(self, method: str, path: str, reason: str) -> None:
+        self.method = method
+        self.path = path
+        self.reason = reason  # "sampled" / "header"
+        self.started = time.perf_counter()
+        self.threads: Counter[int] = Counter()
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+
+
+def _collapse(frame: Any) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        # co_qualname is 3.11+.
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    # One thread, alive only while some request is being profiled. Every tick
+    # it reads the current frame of each thread a profiled endpoint is running
+    # on and counts the collapsed stack. Requests that are not profiled are
+    # never looked at.
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._active: set[Profile] = set()
+        self._thread: threading.Thread | None = None
+
+    def begin(self, profile: Profile) -> bool:
+        with self._lock:
+            if len(self._active) >= settings.profile_max_concurrent:
+                return False
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="oa-profiler", daemon=True)
+                self._thread.start()
+        return True
+
+    def end(self, profile: Profile) -> None:
+        with self._lock:
+            self._active.discard(profile)
+
+    def attach(self, profile: Profile, tid: int) -> None:
+        with self._lock:
+            profile.threads[tid] += 1
+
+    def detach(self, profile: Profile, tid: int) -> None:
+        with self._lock:
+            profile.threads[tid] -= 1
+            if not profile.threads[tid]:
+                del profile.threads[tid]
+
+    def _run(self) -> None:
+        interval = settings.profile_interval_ms / 1000.0
+        while True:
+            time.sleep(interval)
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                for p in self._active:
+                    for tid in p.threads:
+                        frame = frames.get(tid)
+                        if frame is not None:
+                            p.stacks[_collapse(frame)] += 1
+                            p.samples += 1
+            del frames
+
+
+sampler = Sampler()
+
+
+def _profiled(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        tid = threading.get_ident()
+        sampler.attach(profile, tid)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sampler.detach(profile, tid)
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    # Sync endpoints run on threadpool workers the middleware cannot see; the
+    # wrapper tells the sampler which worker is serving a profiled request (the
+    # context variable travels into the worker with the call). Async endpoints
+    # share the event loop thread and are not sampled.
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any) -> None:
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _admin_token(headers: Headers) -> bool:
+    # Same rule as require_roles("admin"): the role claim alone is not trusted, the
+    # account must still exist, be active and be an admin.
+    auth = headers.get("authorization", "")
+    if not auth.lower().startswith("bearer "):
+        return False
+    try:
+        username = decode_token(auth[7:]).get("sub")
+    except Exception:
+        return False
+    if not username:
+        return False
+    with SessionLocal() as db:
+        user = db.scalar(select(User).where(User.username == username))
+        return user is not None and user.is_active and user.role == "admin"
+
+
+async def _want(scope: Scope) -> str | None:
+    headers = Headers(scope=scope)
+    if PROFILE_HEADER in headers:
+        return "header" if await anyio.to_thread.run_sync(_admin_token, headers) else None
+    rate = settings.profile_sample_rate
+    if rate > 0 and random.random() < rate:
+        return "sampled"
+    return None
+
+
+_SAFE = re.compile(r"[^A-Za-z0-9]+")
+
+
+def _write(profile: Profile, status: int, duration_ms: float) -> None:
+    root = Path(settings.profile_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    now = datetime.utcnow()
+    name = f"{now:%Y%m%dT%H%M%S%f}-{_SAFE.sub('_', profile.path).strip('_')[:60] or 'root'}"
+    folded = "".join(f"{stack} {n}\n" for stack, n in profile.stacks.most_common())
+    (root / f"{name}.folded").write_text(folded, encoding="utf-8")
+    meta = {
+        "id": name,
+        "method": profile.method,
+        "path": profile.path,
+        "status": status,
+        "duration_ms": round(duration_ms, 1),
+        "samples": profile.samples,
+        "reason": profile.reason,
+        "created_at": now.isoformat(),
+    }
+    (root / f"{name}.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    _prune(root)
+
+
+def _prune(root: Path) -> None:
+    metas = sorted(root.glob("*.json"))
+    for old in metas[: max(0, len(metas) - settings.profile_keep)]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".folded").unlink(missing_ok=True)
+
+
+def list_profiles(limit: int) -> list[dict[str, Any]]:
+    root = Path(settings.profile_dir)
+    if not root.is_dir():
+        return []
+    out = []
+    for meta in sorted(root.glob("*.json"), reverse=True)[:limit]:
+        try:
+            out.append(json.loads(meta.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def profile_path(profile_id: str) -> Path | None:
+    if not re.fullmatch(r"[A-Za-z0-9_\-]+", profile_id):
+        return None
+    path = Path(settings.profile_dir) / f"{profile_id}.folded"
+    return path if path.is_file() else None
+
+
+class ProfilerMiddleware:
+    # Profiles OA_PROFILE_SAMPLE_RATE of requests, plus any request from an
+    # admin carrying the X-OA-Profile header. Sampled profiles are kept only if
+    # the request took at least OA_PROFILE_SLOW_MS; header profiles always are.
+    # An unprofiled request costs a header lookup and at most one random().
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        reason = await _want(scope) if scope["type"] == "http" else None
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+        profile = Profile(scope["method"], scope["path"], reason)
+        if not sampler.begin(profile):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        streaming = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # An event stream stays open as long as the client does: give the
+                # slot back now and keep no profile for it.
+                content_type = Headers(raw=message.get("headers", [])).get("content-type", "")
+                if content_type.startswith("text/event-stream"):
+                    streaming = True
+                    sampler.end(profile)
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            sampler.end(profile)
+            duration_ms = (time.perf_counter() - profile.started) * 1000
+            if not streaming and (reason == "header" or duration_ms >= settings.profile_slow_ms):
+                try:
+                    await anyio.to_thread.run_sync(_write, profile, status, duration_ms)
+                except OSError:
+                    logger.exception("could not write profile for %s", profile.path)
@@ -0,0 +1,316 @@
+import hashlib
+import json
+import operator
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.app.core.assignment import assignees
+from backend.app.core.cache import LocalCache
+from backend.app.db.models import (
+    Position,
+    ProcessType,
+    RequestInbox,
+    Workflow,
+    WorkflowNode,
+    WorkflowSnapshot,
+)
+from backend.app.db.session import SessionLocal
+
+Predicate = Callable[[float | None, dict[str, Any]], bool]
+
+OPS: dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "in": lambda a, b: a in b,
+    "not_in": lambda a, b: a not in b,
+}
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _always(amount: float | None, data: dict[str, Any]) -> bool:
+    return True
+
+
+def _clause(raw: Any) -> tuple[Predicate, bool]:
+    if not isinstance(raw, dict):
+        raise RuleError("条件格式错误")
+    name, op, value = raw.get("field"), raw.get("op"), raw.get("value")
+    compare = OPS.get(op)
+    if compare is None:
+        raise RuleError(f"不支持的条件运算：{op}")
+    if op in ("in", "not_in") and not isinstance(value, list):
+        raise RuleError("in / not_in 的值必须是列表")
+    if name == "amount":
+        get = lambda amount, data: amount  # noqa: E731
+        uses_data = False
+    elif isinstance(name, str) and name.startswith("data.") and len(name) > 5:
+        key = name[5:]
+        get = lambda amount, data: data.get(key)  # noqa: E731
+        uses_data = True
+    else:
+        raise RuleError(f"不支持的条件字段：{name}")
+    numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    def test(amount: float | None, data: dict[str, Any]) -> bool:
+        actual = get(amount, data)
+        if actual is None:
+            return op in ("!=", "not_in")
+        if numeric and isinstance(actual, str):
+            # Form inputs arrive as strings; compare them as numbers when the rule does.
+            try:
+                actual = float(actual)
+            except ValueError:
+                return False
+        try:
+            return bool(compare(actual, value))
+        except TypeError:
+            return False
+
+    return test, uses_data
+
+
+def compile_condition(raw: Any) -> tuple[Predicate, bool]:
+    # Returns the predicate and whether it reads form data.
+    if not raw:
+        return _always, False
+    if not isinstance(raw, list):
+        raise RuleError("条件必须是列表")
+    clauses = [_clause(c) for c in raw]
+    tests = [t for t, _ in clauses]
+
+    def predicate(amount: float | None, data: dict[str, Any]) -> bool:
+        return all(t(amount, data) for t in tests)
+
+    return predicate, any(uses for _, uses in clauses)
+
+
+def parse_json_list(raw: str | None) -> list:
+    try:
+        value = json.loads(raw or "[]")
+    except Exception:
+        return []
+    return value if isinstance(value, list) else []
+
+
+@dataclass(frozen=True)
+class CompiledNode:
+    id: int
+    step_order: int
+    name: str
+    position_ids: tuple[int, ...]
+    position_name: str
+    required: int
+    conditional: bool
+    uses_data: bool
+    applies: Predicate = field(compare=False)
+    sla_hours: int = 0
+    sla_action: str = ""
+
+
+@dataclass
+class CompiledWorkflow:
+    id: int
+    nodes: tuple[CompiledNode, ...]
+    name: str = ""
+    snapshot_id: int | None = None
+    needs_data: bool = field(init=False, default=False)
+    # Decision table: for each entry point (index -1 = start), the nodes that can
+    # come next, cut off after the first unconditional one. Routing walks this
+    # short list; an unconditional workflow's list always has one entry.
+    _index: dict[int, int] = field(default_factory=dict)
+    _table: dict[int, tuple[CompiledNode, ...]] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.needs_data = any(n.uses_data for n in self.nodes)
+        self._index = {n.id: i for i, n in enumerate(self.nodes)}
+        for i in range(-1, len(self.nodes)):
+            candidates = []
+            for n in self.nodes[i + 1 :]:
+                candidates.append(n)
+                if not n.conditional:
+                    break
+            self._table[i] = tuple(candidates)
+
+    def node(self, node_id: int | None) -> CompiledNode | None:
+        i = self._index.get(node_id) if node_id is not None else None
+        return self.nodes[i] if i is not None else None
+
+    def _route(self, i: int, amount: float | None, data: dict[str, Any]) -> CompiledNode | None:
+        for n in self._table[i]:
+            if n.applies(amount, data):
+                return n
+        return None
+
+    def first(self, amount: float | None, data: dict[str, Any]) -> CompiledNode | None:
+        return self._route(-1, amount, data)
+
+    def after(self, node_id: int, amount: float | None, data: dict[str, Any]) -> CompiledNode | None:
+        return self._route(self._index[node_id], amount, data)
+
+
+def node_spec(n: WorkflowNode, position_name: str, process: ProcessType | None) -> dict[str, Any]:
+    positions = [n.position_id] + [
+        p for p in parse_json_list(n.extra_position_ids_json) if p != n.position_id
+    ]
+    return {
+        "id": n.id,
+        "step_order": n.step_order,
+        "name": n.name,
+        "position_ids": positions,
+        "position_name": position_name,
+        "condition": parse_json_list(n.condition_json),
+        "required": max(1, min(n.required_approvals or 1, len(positions))),
+        # The node's own SLA, else the process type's.
+        "sla_hours": n.sla_hours or (process.sla_hours if process else 0),
+        "sla_action": n.sla_action or (process.sla_action if process else "") or "notify",
+    }
+
+
+def compile_node(spec: dict[str, Any]) -> CompiledNode:
+    applies, uses_data = compile_condition(spec["condition"])
+    return CompiledNode(
+        id=spec["id"],
+        step_order=spec["step_order"],
+        name=spec["name"],
+        position_ids=tuple(spec["position_ids"]),
+        position_name=spec["position_name"],
+        required=spec["required"],
+        conditional=bool(spec["condition"]),
+        uses_data=uses_data,
+        applies=applies,
+        sla_hours=spec.get("sla_hours", 0),
+        sla_action=spec.get("sla_action", ""),
+    )
+
+
+def _compile(snapshot_id: int, body: dict[str, Any]) -> CompiledWorkflow:
+    return CompiledWorkflow(
+        id=body["workflow_id"],
+        name=body["name"],
+        snapshot_id=snapshot_id,
+        nodes=tuple(compile_node(n) for n in body["nodes"]),
+    )
+
+
+# Requests are pinned at creation to an immutable snapshot of their workflow's
+# route; deciding and the detail view read only the snapshot, so editing or
+# deleting nodes never changes a request already in flight. Snapshots are keyed
+# by content digest: every request created against the same route shares one row.
+_current = LocalCache(max_entries=256)  # workflow id -> route of its latest snapshot
+_pinned = LocalCache(max_entries=1024)  # snapshot id -> route; immutable, never cleared
+
+
+def _snapshot_workflow(workflow_id: int) -> CompiledWorkflow:
+    # Own short transaction, committed apart from the request being created: the
+    # cached id must never point at a row a rolled-back create took with it.
+    with SessionLocal() as db:
+        wf = db.get(Workflow, workflow_id)
+        process = (
+            db.scalar(select(ProcessType).where(ProcessType.code == wf.request_type)) if wf else None
+        )
+        rows = db.execute(
+            select(WorkflowNode, Position.name)
+            .join(Position, WorkflowNode.position_id == Position.id)
+            .where(WorkflowNode.workflow_id == workflow_id)
+            .order_by(WorkflowNode.step_order.asc())
+        ).all()
+        body = {
+            "workflow_id": workflow_id,
+            "name": wf.name if wf else "",
+            "nodes": [node_spec(n, pname, process) for n, pname in rows],
+        }
+        raw = json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        snapshot_id = db.scalar(select(WorkflowSnapshot.id).where(WorkflowSnapshot.digest == digest))
+        if snapshot_id is None:
+            version = db.scalar(
+                select(func.coalesce(func.max(WorkflowSnapshot.version), 0)).where(
+                    WorkflowSnapshot.workflow_id == workflow_id
+                )
+            )
+            row = WorkflowSnapshot(workflow_id=workflow_id, version=version + 1, digest=digest, body=raw)
+            db.add(row)
+            try:
+                db.commit()
+                snapshot_id = row.id
+            except IntegrityError:
+                # Another worker stored the same route (or took the version) first.
+                db.rollback()
+                snapshot_id = db.scalar(select(WorkflowSnapshot.id).where(WorkflowSnapshot.digest == digest))
+                if snapshot_id is None:
+                    raise
+    return _compile(snapshot_id, body)
+
+
+def current_route(workflow_id: int, db: Session | None = None) -> CompiledWorkflow:
+    route = _current.get(workflow_id)
+    if route is not None:
+        return route
+    if db is not None:
+        # Taking a snapshot needs a connection of its own. Hand the caller's back
+        # first: requests that each hold one while waiting for a second can drain
+        # the pool. Expunged objects stay readable, as in run_write().
+        db.expunge_all()
+        db.rollback()
+    return _current.get_or_set(workflow_id, lambda: _snapshot_workflow(workflow_id))
+
+
+def pinned_route(db: Session, snapshot_id: int | None) -> CompiledWorkflow | None:
+    if snapshot_id is None:
+        return None
+
+    def load() -> CompiledWorkflow | None:
+        raw = db.scalar(select(WorkflowSnapshot.body).where(WorkflowSnapshot.id == snapshot_id))
+        return _compile(snapshot_id, json.loads(raw)) if raw is not None else None
+
+    return _pinned.get_or_set(snapshot_id, load)
+
+
+def invalidate_routing() -> None:
+    _current.clear()
+
+
+def assign(
+    db: Session, node: CompiledNode, *, requester_id: int, exclude_user_id: int | None = None
+) -> dict[int, int]:
+    # One assignee per signing position, in node order; positions without active
+    # staff are left out.
+    picked = {
+        p: assignees.pick(db, position_id=p, requester_id=requester_id, exclude_user_id=exclude_user_id)
+        for p in node.position_ids
+    }
+    return {p: u for p, u in picked.items() if u is not None}
+
+
+def open_inbox(db: Session, request_id: int, node: CompiledNode, picked: dict[int, int]) -> None:
+    db.execute(
+        insert(RequestInbox),
+        [
+            {"request_id": request_id, "position_id": p, "assignee_user_id": picked.get(p)}
+            for p in node.position_ids
+        ],
+    )
+
+
+def close_inbox(db: Session, request_id: int, position_id: int | None = None) -> list[int]:
+    # Removes the request's inbox rows (or one position's) and returns who they
+    # were assigned to, for assignees.reassigned().
+    where = [RequestInbox.request_id == request_id]
+    if position_id is not None:
+        where.append(RequestInbox.position_id == position_id)
+    released = db.scalars(
+        select(RequestInbox.assignee_user_id).where(*where).where(RequestInbox.assignee_user_id.is_not(None))
+    ).all()
+    db.execute(delete(RequestInbox).where(*where))
+    return list(released)
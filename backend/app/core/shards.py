@@ -0,0 +1,104 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from backend.app.core.config import settings
+from backend.app.db.base import Base
+from backend.app.db.session import MAIN_SHARD, SHARD_ID_SPAN, SHARD_NAMES, shard_session
+
+T = TypeVar("T")
+
+# Tables that follow the request: stored in the creator's shard. Everything else
+# (users, departments, positions, process types, workflows and their snapshots,
+# announcements) is shared and lives in the main database only.
+SHARDED_TABLES = (
+    "oa_requests",
+    "approvals",
+    "request_payloads",
+    "request_inbox",
+    "attachments",
+    "notification_outbox",
+    "idempotency_keys",
+    "job_watermarks",
+    "oa_requests_archive",
+    "approvals_archive",
+    "request_payloads_archive",
+)
+
+_departments = settings.shard_department_map()
+for _dept, _name in _departments.items():
+    if _name not in SHARD_NAMES:
+        raise RuntimeError(f"OA_SHARD_DEPARTMENTS: department {_dept} maps to unknown shard {_name!r}")
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def sharded() -> bool:
+    return len(SHARD_NAMES) > 1
+
+
+def shard_of_department(department_id: int | None) -> str:
+    return _departments.get(department_id, MAIN_SHARD) if department_id is not None else MAIN_SHARD
+
+
+def shard_of_request(request_id: int) -> str:
+    i = request_id // SHARD_ID_SPAN
+    return SHARD_NAMES[i] if 0 <= i < len(SHARD_NAMES) else MAIN_SHARD
+
+
+def request_session(request_id: int) -> Session:
+    return shard_session(shard_of_request(request_id))
+
+
+def each_shard(db: Session, fn: Callable[[Session], T]) -> list[T]:
+    # Unsharded: fn on the caller's session. Sharded: fn on every shard, in
+    # parallel, each on its own short-lived session; results in shard order.
+    if not sharded():
+        return [fn(db)]
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=len(SHARD_NAMES), thread_name_prefix="oa-shard")
+        pool = _pool
+
+    def run(name: str) -> T:
+        with shard_session(name) as s:
+            return fn(s)
+
+    return list(pool.map(run, SHARD_NAMES))
+
+
+def close_shards() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def init_shards() -> None:
+    # Plain connections without the main database attached: create_all must see
+    # only the shard's own tables. The AUTOINCREMENT sequence starts each shard
+    # at the bottom of its id range.
+    tables = [Base.metadata.tables[t] for t in SHARDED_TABLES]
+    urls = settings.shard_urls()
+    for i, name in enumerate(SHARD_NAMES):
+        if name == MAIN_SHARD:
+            continue
+        ddl_engine = create_engine(urls[name])
+        try:
+            Base.metadata.create_all(bind=ddl_engine, tables=tables)
+            with ddl_engine.begin() as conn:
+                conn.execute(
+                    text(
+                        "INSERT INTO sqlite_sequence (name, seq) SELECT 'oa_requests', :base "
+                        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'oa_requests')"
+                    ),
+                    {"base": i * SHARD_ID_SPAN},
+                )
+        finally:
+            ddl_engine.dispose()
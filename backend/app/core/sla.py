@@ -0,0 +1,317 @@
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from backend.app.core.assignment import assignees
+from backend.app.core.audit import audit_log, snapshot
+from backend.app.core.config import settings
+from backend.app.core.events import bus
+from backend.app.core.jobs import PeriodicJob, register
+from backend.app.core.notifications import enqueue_notification
+from backend.app.core.notifications import worker as notification_worker
+from backend.app.core.payloads import load_payload
+from backend.app.core.routing import CompiledNode, assign, close_inbox, open_inbox, pinned_route
+from backend.app.core.writer import run_write
+from backend.app.db.models import Approval, JobWatermark, OARequest, RequestInbox, utcnow
+from backend.app.db.session import SHARD_NAMES, shard_session
+
+logger = logging.getLogger("oa.sla")
+
+ACTIONS = ("notify", "reassign", "auto_advance")
+WATERMARK = "sla"
+
+
+def due_for(node: CompiledNode | None, now: datetime | None = None) -> datetime | None:
+    if node is None or not node.sla_hours:
+        return None
+    return (now or utcnow()) + timedelta(hours=node.sla_hours)
+
+
+@dataclass
+class Escalation:
+    request_id: int
+    action: str
+    status: str
+    current_node_id: int | None
+    creator_user_id: int
+    released: list[int]
+    assigned: list[int]
+    position_ids: list[int]
+
+
+@dataclass
+class SlaStats:
+    runs: int = 0
+    scanned: int = 0
+    escalated: Counter[str] = field(default_factory=Counter)
+    skipped: int = 0
+    last_run_at: datetime | None = None
+    last_run_ms: float = 0.0
+    last_run_scanned: int = 0
+
+
+class SlaMetrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats = SlaStats()
+
+    def record_run(self, *, scanned: int, done: list[Escalation], elapsed_ms: float) -> None:
+        with self._lock:
+            s = self._stats
+            s.runs += 1
+            s.scanned += scanned
+            s.escalated.update(e.action for e in done)
+            # Lost to a concurrent decision, or the node has no SLA any more.
+            s.skipped += scanned - len(done)
+            s.last_run_at = utcnow()
+            s.last_run_ms = elapsed_ms
+            s.last_run_scanned = scanned
+
+    def snapshot(self) -> SlaStats:
+        with self._lock:
+            return SlaStats(**{**self._stats.__dict__, "escalated": Counter(self._stats.escalated)})
+
+
+metrics = SlaMetrics()
+
+
+def _after_deadline(position_at: datetime | None, position_id: int):
+    # Keyset position: strictly after the last (due_at, id) already handled.
+    if position_at is None:
+        return OARequest.due_at.is_not(None)
+    return or_(
+        OARequest.due_at > position_at,
+        and_(OARequest.due_at == position_at, OARequest.id > position_id),
+    )
+
+
+def _swap(db: Session, r: OARequest, node_id: int, **values) -> bool:
+    # Same compare-and-swap as decide(): a concurrent decision wins and the
+    # escalation is dropped.
+    swapped = db.execute(
+        update(OARequest)
+        .where(OARequest.id == r.id)
+        .where(OARequest.version == r.version)
+        .where(OARequest.status == "pending")
+        .where(OARequest.current_node_id == node_id)
+        .values(version=OARequest.version + 1, updated_at=utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    if swapped.rowcount != 1:
+        return False
+    db.refresh(r)
+    return True
+
+
+def _result(
+    r: OARequest, action: str, released: list[int], assigned: list[int], position_ids: list[int]
+) -> Escalation:
+    return Escalation(
+        request_id=r.id,
+        action=action,
+        status=r.status,
+        current_node_id=r.current_node_id,
+        creator_user_id=r.created_by_user_id,
+        released=released,
+        assigned=assigned,
+        position_ids=position_ids,
+    )
+
+
+def _escalate(db: Session, r: OARequest, now: datetime) -> Escalation | None:
+    route = pinned_route(db, r.workflow_snapshot_id)
+    node = route.node(r.current_node_id) if route is not None else None
+    if node is None or not node.sla_hours:
+        return None
+    old_approver_id = r.approver_user_id
+    before = snapshot(r)
+    action = node.sla_action if node.sla_action in ACTIONS else "notify"
+    position_ids = list(node.position_ids)
+
+    if action == "reassign":
+        waiting = db.execute(
+            select(RequestInbox.position_id, RequestInbox.assignee_user_id)
+            .where(RequestInbox.request_id == r.id)
+            .order_by(RequestInbox.position_id.asc())
+        ).all()
+        new_approver_id = position_id = released_id = None
+        for p, assignee in waiting:
+            new_approver_id = assignees.pick(
+                db,
+                position_id=p,
+                requester_id=r.created_by_user_id,
+                exclude_user_id=assignee if assignee is not None else old_approver_id,
+            )
+            if new_approver_id is not None:
+                position_id, released_id = p, assignee
+                break
+        if new_approver_id is None:
+            # Nobody else holds the position: the best we can do is a reminder.
+            action = "notify"
+        else:
+            # The new assignee gets a fresh SLA period.
+            if not _swap(db, r, node.id, approver_user_id=new_approver_id, due_at=due_for(node, now)):
+                return None
+            db.execute(
+                update(RequestInbox)
+                .where(RequestInbox.request_id == r.id)
+                .where(RequestInbox.position_id == position_id)
+                .values(assignee_user_id=new_approver_id)
+            )
+            enqueue_notification(
+                db,
+                kind="approval.assigned",
+                recipient_user_id=new_approver_id,
+                req=r,
+                dedupe=f"{node.id}:sla:{r.version}",
+            )
+            audit_log.record(db, None, "request.sla_reassign", "request", r.id, before=before, after=snapshot(r))
+            released = [released_id] if released_id is not None else []
+            return _result(r, action, released, [new_approver_id], position_ids)
+
+    if action == "notify":
+        # Does not touch the request, so it never races a decision. One reminder
+        # per deadline: the watermark moves past it.
+        enqueue_notification(
+            db,
+            kind="request.overdue",
+            recipient_user_id=old_approver_id,
+            req=r,
+            dedupe=f"{node.id}:{r.due_at:%Y%m%d%H%M%S}",
+        )
+        return _result(r, action, [], [], [])
+
+    # auto_advance: the whole node passes, countersign or not.
+    data = load_payload(db, r) if route.needs_data else {}
+    next_node = route.after(node.id, r.amount, data)
+    picked = assign(db, next_node, requester_id=r.created_by_user_id) if next_node else {}
+    new_approver_ids = list(picked.values())
+    new_approver_id = new_approver_ids[0] if new_approver_ids else None
+    if not _swap(
+        db,
+        r,
+        node.id,
+        status="pending" if next_node else "approved",
+        current_node_id=next_node.id if next_node else None,
+        approver_user_id=new_approver_id,
+        due_at=due_for(next_node, now),
+    ):
+        return None
+    released = close_inbox(db, r.id)
+    if next_node is not None:
+        open_inbox(db, r.id, next_node, picked)
+        position_ids += list(next_node.position_ids)
+    db.add(
+        Approval(
+            request_id=r.id,
+            workflow_node_id=node.id,
+            approver_user_id=None,
+            position_id=None,
+            decision="approved",
+            comment="超时自动通过",
+        )
+    )
+    if next_node is None:
+        enqueue_notification(db, kind="request.approved", recipient_user_id=r.created_by_user_id, req=r)
+    else:
+        enqueue_notification(
+            db, kind="request.advanced", recipient_user_id=r.created_by_user_id, req=r, dedupe=str(next_node.id)
+        )
+        for uid in new_approver_ids:
+            enqueue_notification(db, kind="approval.assigned", recipient_user_id=uid, req=r, dedupe=str(next_node.id))
+    audit_log.record(db, None, "request.sla_auto_advance", "request", r.id, before=before, after=snapshot(r))
+    return _result(r, action, released, new_approver_ids, position_ids)
+
+
+def escalate_batch(db: Session, *, batch_size: int) -> tuple[int, list[Escalation]]:
+    def unit(db: Session) -> tuple[int, list[Escalation]]:
+        mark = db.get(JobWatermark, WATERMARK)
+        if mark is None:
+            mark = JobWatermark(name=WATERMARK)
+            db.add(mark)
+        now = utcnow()
+        rows = db.scalars(
+            select(OARequest)
+            .where(OARequest.status == "pending")
+            .where(OARequest.due_at <= now)
+            .where(_after_deadline(mark.position_at, mark.position_id or 0))
+            .order_by(OARequest.due_at.asc(), OARequest.id.asc())
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return 0, []
+        # Rows are handled at most once per deadline; an escalation that loses to
+        # a concurrent decision is simply dropped, the decision set a new due_at.
+        mark.position_at, mark.position_id = rows[-1].due_at, rows[-1].id
+        done = [e for e in (_escalate(db, r, now) for r in rows) if e is not None]
+        return len(rows), done
+
+    return run_write(db, unit)
+
+
+def _publish(done: list[Escalation]) -> None:
+    for e in done:
+        if e.released or e.assigned:
+            assignees.reassigned(old_user_ids=e.released, new_user_ids=e.assigned)
+        if e.action != "notify":
+            bus.publish(
+                "request.updated",
+                {"request_id": e.request_id, "status": e.status, "current_node_id": e.current_node_id},
+                creator_user_id=e.creator_user_id,
+                position_ids=e.position_ids,
+            )
+    if done:
+        notification_worker.wake()
+
+
+def run_escalations(batch_size: int | None = None, max_batches: int | None = None) -> int:
+    batch_size = batch_size or settings.sla_batch_size
+    max_batches = max_batches or settings.sla_max_batches
+    started = time.perf_counter()
+    scanned = 0
+    escalated: list[Escalation] = []
+    # Each shard has its own watermark, kept next to its requests.
+    for shard in SHARD_NAMES:
+        for _ in range(max_batches):
+            # One short transaction per batch so writers are never locked out for long.
+            with shard_session(shard) as db:
+                n, done = escalate_batch(db, batch_size=batch_size)
+            _publish(done)
+            scanned += n
+            escalated += done
+            if n < batch_size:
+                break
+    metrics.record_run(
+        scanned=scanned,
+        done=escalated,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+    )
+    if escalated:
+        logger.info("escalated %d of %d overdue requests", len(escalated), scanned)
+    return len(escalated)
+
+
+def backlog(db: Session) -> tuple[int, datetime | None, datetime | None]:
+    # Overdue requests the scheduler has not reached yet, and the oldest deadline among them.
+    mark = db.get(JobWatermark, WATERMARK)
+    position_at = mark.position_at if mark else None
+    count, oldest = db.execute(
+        select(func.count(), func.min(OARequest.due_at))
+        .where(OARequest.status == "pending")
+        .where(OARequest.due_at <= utcnow())
+        .where(_after_deadline(position_at, mark.position_id if mark else 0))
+    ).one()
+    return count, oldest, position_at
+
+
+sla_job = (
+    register(PeriodicJob("sla", settings.sla_scan_seconds, lambda: run_escalations()))
+    if settings.sla_scan_seconds > 0
+    else None
+)
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from backend.app.core.config import settings
+
+logger = logging.getLogger("oa.slowquery")
+
+# The ASGI scope of the request being served. The router fills in the matched
+# route later, so reading it at query time gives the route template.
+_scope: ContextVar[Scope | None] = ContextVar("oa_query_scope", default=None)
+
+_SPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES = re.compile(r"VALUES\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+", re.I)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalize(sql: str) -> str:
+    # Same query, same text: literals become ?, and IN lists / multi-row VALUES
+    # of any length collapse so they do not split one statement into many.
+    sql = _SPACE.sub(" ", sql).strip()
+    sql = _LITERAL.sub("?", sql)
+    sql = _VALUES.sub(r"VALUES \1, ...", sql)
+    return _IN_LIST.sub("(?, ...)", sql)
+
+
+def _type_name(value: Any) -> str:
+    return "null" if value is None else type(value).__name__
+
+
+def param_shape(params: Any, executemany: bool) -> str:
+    # Types only: values can hold personal data and never reach the log.
+    if executemany:
+        rows = list(params or ())
+        return f"{len(rows)} x {param_shape(rows[0], False)}" if rows else "0 x ()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {_type_name(v)}" for k, v in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        return "(" + ", ".join(_type_name(v) for v in params) + ")"
+    return _type_name(params)
+
+
+def current_route() -> str:
+    scope = _scope.get()
+    if scope is None:
+        return f"[{threading.current_thread().name}]"
+    route = scope.get("route")
+    return f"{scope.get('method', '')} {getattr(route, 'path', None) or scope.get('path', '')}"
+
+
+@dataclass
+class SlowStatement:
+    fingerprint: str
+    sql: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    last_ms: float = 0.0
+    last_at: datetime | None = None
+    param_shape: str = ""
+    plan: list[str] = field(default_factory=list)
+    routes: Counter[str] = field(default_factory=Counter)
+
+
+class SlowQueryLog:
+    # Aggregates statements slower than OA_SLOW_QUERY_MS by fingerprint. The
+    # table is bounded; when full, the statement with the least total time goes.
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: dict[str, SlowStatement] = {}
+
+    def needs_plan(self, sql: str) -> tuple[str, str, bool]:
+        text = normalize(sql)
+        fp = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            s = self._stats.get(fp)
+            # Plans can change as tables grow: capture again every 100 sightings.
+            return fp, text, s is None or s.count % 100 == 0
+
+    def record(
+        self,
+        fp: str,
+        text: str,
+        *,
+        elapsed_ms: float,
+        shape: str,
+        route: str,
+        plan: list[str] | None,
+    ) -> None:
+        with self._lock:
+            s = self._stats.get(fp)
+            if s is None:
+                if len(self._stats) >= settings.slow_query_fingerprints:
+                    del self._stats[min(self._stats.values(), key=lambda x: x.total_ms).fingerprint]
+                s = self._stats[fp] = SlowStatement(fingerprint=fp, sql=text)
+            s.count += 1
+            s.total_ms += elapsed_ms
+            s.max_ms = max(s.max_ms, elapsed_ms)
+            s.last_ms = elapsed_ms
+            s.last_at = datetime.utcnow()
+            s.param_shape = shape
+            s.routes[route] += 1
+            if plan is not None:
+                s.plan = plan
+        logger.warning(
+            "slow query %.1fms [%s] route=%s params=%s sql=%s plan=%s",
+            elapsed_ms,
+            fp,
+            route,
+            shape,
+            text,
+            " | ".join(plan) if plan else "-",
+        )
+
+    def top(self, limit: int, order: str = "total") -> list[SlowStatement]:
+        key = {
+            "total": lambda s: s.total_ms,
+            "max": lambda s: s.max_ms,
+            "count": lambda s: s.count,
+        }[order]
+        with self._lock:
+            items = sorted(self._stats.values(), key=key, reverse=True)[:limit]
+            return [
+                SlowStatement(**{**s.__dict__, "plan": list(s.plan), "routes": Counter(s.routes)})
+                for s in items
+            ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+slow_queries = SlowQueryLog()
+
+
+class QueryContextMiddleware:
+    # Makes the current request visible to the slow-query hook.
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or settings.slow_query_ms <= 0:
+            await self.app(scope, receive, send)
+            return
+        token = _scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _scope.reset(token)
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from backend.app.core.config import settings
+
+
+class Throttled(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(retry_after)
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+@dataclass
+class _Entry:
+    tokens: float
+    stamp: float
+    failures: int = 0
+    locked_until: float = 0.0
+
+
+class BucketTable:
+    # key -> token bucket plus failure/lockout state. Bounded LRU: entries that
+    # are idle long enough to have refilled carry no information and are dropped
+    # first, then the least recently used entry that is not locked out. A live
+    # lockout is never dropped, so spraying throwaway keys cannot reset one; if
+    # lockouts alone fill the table it may grow to twice max_entries, and past
+    # that new keys are refused until the first lockout ends.
+
+    def __init__(self, *, rate_per_minute: float, burst: int, max_entries: int) -> None:
+        self._rate = rate_per_minute / 60.0
+        self._burst = float(burst)
+        self._max = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _entry(self, key: str, now: float) -> _Entry:
+        e = self._entries.get(key)
+        if e is None:
+            self._evict(now)
+            if len(self._entries) >= 2 * self._max:
+                raise Throttled(min(x.locked_until for x in self._entries.values()) - now)
+            e = _Entry(tokens=self._burst, stamp=now)
+            self._entries[key] = e
+        else:
+            e.tokens = min(self._burst, e.tokens + (now - e.stamp) * self._rate)
+            e.stamp = now
+            self._entries.move_to_end(key)
+        return e
+
+    def _evict(self, now: float) -> None:
+        full_after = self._burst / self._rate if self._rate > 0 else 0.0
+        while self._entries:
+            key, oldest = next(iter(self._entries.items()))
+            if now - oldest.stamp < full_after or oldest.locked_until > now:
+                break
+            del self._entries[key]
+        if len(self._entries) < self._max:
+            return
+        for key, e in self._entries.items():
+            if e.locked_until <= now:
+                del self._entries[key]
+                return
+
+    def take(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            e = self._entry(key, now)
+            if e.locked_until > now:
+                raise Throttled(e.locked_until - now)
+            if e.tokens < 1:
+                raise Throttled((1 - e.tokens) / self._rate if self._rate > 0 else 60)
+            e.tokens -= 1
+
+    def failed(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            try:
+                e = self._entry(key, now)
+            except Throttled:
+                return
+            e.failures += 1
+            over = e.failures - settings.login_lockout_after
+            if over >= 0:
+                delay = settings.login_lockout_seconds * (2**over)
+                e.locked_until = now + min(delay, settings.login_lockout_max_seconds)
+
+    def succeeded(self, key: str) -> None:
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None:
+                e.failures = 0
+                e.locked_until = 0.0
+
+
+class LoginThrottle:
+    def __init__(self) -> None:
+        self.users = BucketTable(
+            rate_per_minute=settings.login_user_per_minute,
+            burst=settings.login_user_burst,
+            max_entries=settings.login_throttle_entries,
+        )
+        self.ips = BucketTable(
+            rate_per_minute=settings.login_ip_per_minute,
+            burst=settings.login_ip_burst,
+            max_entries=settings.login_throttle_entries,
+        )
+        self._slots = threading.BoundedSemaphore(max(1, settings.login_max_concurrent))
+
+    def admit(self, *, username: str, ip: str) -> None:
+        self.ips.take(ip)
+        self.users.take(username.lower())
+
+    @contextmanager
+    def verifying(self):
+        # Never queue for a slot: a waiting request still holds a worker thread,
+        # so under a burst the cheapest thing to do is refuse immediately.
+        if not self._slots.acquire(blocking=False):
+            raise Throttled(1)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def failed(self, *, username: str) -> None:
+        self.users.failed(username.lower())
+
+    def succeeded(self, *, username: str) -> None:
+        self.users.succeeded(username.lower())
+
+
+login_throttle = LoginThrottle()
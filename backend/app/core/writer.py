@@ -0,0 +1,143 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from backend.app.core.config import settings
+from backend.app.core.jobs import register
+from backend.app.db.session import shard_session
+
+logger = logging.getLogger("oa.writer")
+
+T = TypeVar("T")
+
+# A unit runs inside a transaction it does not own: it may read, add and flush,
+# and raise to abort itself, but it must not commit or roll back. Whatever it
+# returns must not depend on the session staying open.
+WriteUnit = Callable[[Session], T]
+
+
+class WriteQueue:
+    # One thread owns all coalesced writes. It takes whatever units are queued,
+    # runs each inside its own SAVEPOINT of a shared transaction and commits once,
+    # so N concurrent writers cost one SQLite write lock and one fsync instead of
+    # N lock round-trips with busy-wait retries.
+
+    name = "writer"
+
+    def __init__(self) -> None:
+        self._queue: queue.Queue[tuple[WriteUnit, Future, str | None] | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if not settings.write_queue or self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="oa-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, fn: WriteUnit[T], shard: str | None = None) -> "Future[T]":
+        fut: Future = Future()
+        self._queue.put((fn, fut, shard))
+        return fut
+
+    def _take_batch(self) -> tuple[list[tuple[WriteUnit, Future, str | None]], bool]:
+        item = self._queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        while len(batch) < settings.write_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = self._take_batch()
+            # Sharded mode: one transaction per database the batch touches.
+            by_shard: dict[str | None, list[tuple[WriteUnit, Future]]] = {}
+            for fn, fut, shard in batch:
+                by_shard.setdefault(shard, []).append((fn, fut))
+            for shard, units in by_shard.items():
+                self._apply(units, shard)
+
+    def _apply(self, batch: list[tuple[WriteUnit, Future]], shard: str | None = None) -> None:
+        results: list[tuple[Future, object, BaseException | None]] = []
+        try:
+            with shard_session(shard) as db:
+                if db.get_bind().dialect.name == "sqlite":
+                    # pysqlite only opens a transaction before DML, which would make
+                    # the first SAVEPOINT the outermost one and its RELEASE a commit.
+                    db.execute(text("BEGIN IMMEDIATE"))
+                for fn, fut in batch:
+                    if not fut.set_running_or_notify_cancel():
+                        continue
+                    audit_mark = len(db.info.get("audit", ()))
+                    savepoint = db.begin_nested()
+                    try:
+                        result = fn(db)
+                        savepoint.commit()
+                    except BaseException as e:
+                        savepoint.rollback()
+                        # Audit entries recorded by the failed unit leave with it.
+                        if "audit" in db.info:
+                            del db.info["audit"][audit_mark:]
+                        results.append((fut, None, e))
+                    else:
+                        results.append((fut, result, None))
+                db.commit()
+        except Exception as e:
+            logger.exception("write batch of %d failed", len(batch))
+            for fut, _, err in results:
+                fut.set_exception(err or e)
+            for _, fut in batch[len(results) :]:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for fut, result, err in results:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(result)
+
+
+write_queue = register(WriteQueue())
+
+
+def run_write(db: Session, fn: WriteUnit[T]) -> T:
+    # Applies fn and commits. With OA_WRITE_QUEUE the writer thread runs it in a
+    # shared batch transaction; otherwise it runs directly on the caller's session.
+    if write_queue.running:
+        # Hand the caller's connection back before blocking: requests parked on the
+        # queue must not hold the pool the writer itself needs. Expunging first keeps
+        # already-loaded objects (the current user) readable instead of expired.
+        db.expunge_all()
+        db.rollback()
+        return write_queue.submit(fn, db.info.get("shard")).result()
+    try:
+        result = fn(db)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return result
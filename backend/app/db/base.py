@@ -3,3 +3,8 @@ from sqlalchemy.orm import DeclarativeBase
 
 class Base(DeclarativeBase):
     pass
+
+
+class AuditBase(DeclarativeBase):
+    # Kept apart from Base so the audit table can live in its own database.
+    pass
@@ -3,13 +3,16 @@ import json
 from sqlalchemy import select
 
 from backend.app.core.security import hash_password
-from backend.app.db.base import Base
+from backend.app.core.shards import init_shards
+from backend.app.db.base import AuditBase, Base
 from backend.app.db.models import Position, ProcessType, User, Workflow, WorkflowNode
-from backend.app.db.session import SessionLocal, engine
+from backend.app.db.session import SessionLocal, audit_engine, engine
 
 
 def init_db() -> None:
     Base.metadata.create_all(bind=engine)
+    AuditBase.metadata.create_all(bind=audit_engine)
+    init_shards()
 
     with SessionLocal() as db:
         def ensure_position(*, name: str, description: str = "") -> Position:
@@ -131,6 +134,7 @@ def init_db() -> None:
             request_type: str,
             is_active: bool,
             nodes: list[tuple[int, int, str]],
+            rules: dict[int, dict] | None = None,
         ) -> None:
             wf = db.scalar(select(Workflow).where(Workflow.name == name))
             if wf is not None:
@@ -146,6 +150,7 @@ def init_db() -> None:
                         step_order=step_order,
                         position_id=position_id,
                         name=node_name,
+                        **(rules or {}).get(step_order, {}),
                     )
                 )
 
@@ -380,6 +385,19 @@ def init_db() -> None:
                 (3, ceo_pos.id, "总经理审批"),
             ],
         )
+        ensure_workflow(
+            name="报销-主管-财务-大额总经理",
+            request_type="reimburse",
+            is_active=False,
+            nodes=[
+                (1, manager_pos.id, "主管审批"),
+                (2, finance_pos.id, "财务审批"),
+                (3, ceo_pos.id, "总经理审批（5000 元及以上）"),
+            ],
+            rules={
+                3: {"condition_json": json.dumps([{"field": "amount", "op": ">=", "value": 5000}])},
+            },
+        )
 
         ensure_workflow(
             name="出差-主管-总经理",
@@ -435,6 +453,15 @@ def init_db() -> None:
                 (3, ceo_pos.id, "总经理审批"),
             ],
         )
+        ensure_workflow(
+            name="合同-法务财务会签-总经理",
+            request_type="contract",
+            is_active=False,
+            nodes=[(1, legal_pos.id, "法务、财务会签"), (2, ceo_pos.id, "总经理审批")],
+            rules={
+                1: {"extra_position_ids_json": json.dumps([finance_pos.id]), "required_approvals": 2},
+            },
+        )
         ensure_workflow(
             name="预算-主管-财务-总经理",
             request_type="budget",
@@ -2,10 +2,24 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Integer, String, Text, UniqueConstraint
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Table,
+    Text,
+    UniqueConstraint,
+    func,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from backend.app.db.base import Base
+from backend.app.db.base import AuditBase, Base
 
 
 def utcnow() -> datetime:
@@ -42,7 +56,7 @@ class User(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
 
     department_id: Mapped[int | None] = mapped_column(
-        Integer, ForeignKey("departments.id"), nullable=True
+        Integer, ForeignKey("departments.id"), nullable=True, index=True
     )
     department: Mapped[Department | None] = relationship(back_populates="users")
 
@@ -76,6 +90,9 @@ class ProcessType(Base):
     schema_json: Mapped[str] = mapped_column(Text, default="[]")
     requires_amount: Mapped[bool] = mapped_column(Boolean, default=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, index=True)
+    # Default SLA for every node of this type; 0 means none. See core/sla.py.
+    sla_hours: Mapped[int] = mapped_column(Integer, default=0)
+    sla_action: Mapped[str] = mapped_column(String(20), default="notify")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
 
 
@@ -89,7 +106,9 @@ class Workflow(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
 
     nodes: Mapped[list["WorkflowNode"]] = relationship(
-        back_populates="workflow", cascade="all, delete-orphan"
+        back_populates="workflow",
+        cascade="all, delete-orphan",
+        order_by="WorkflowNode.step_order",
     )
 
 
@@ -102,26 +121,72 @@ class WorkflowNode(Base):
     step_order: Mapped[int] = mapped_column(Integer, index=True)
     name: Mapped[str] = mapped_column(String(200), default="")
     position_id: Mapped[int] = mapped_column(Integer, ForeignKey("positions.id"))
+    # JSON list of {"field", "op", "value"} clauses, all of which must hold for the
+    # node to apply; empty means always. Fields: "amount" or "data.<form key>".
+    condition_json: Mapped[str] = mapped_column(Text, default="")
+    # Countersign: positions signing alongside position_id, and how many of all
+    # of them must approve before the request moves on.
+    extra_position_ids_json: Mapped[str] = mapped_column(Text, default="[]")
+    required_approvals: Mapped[int] = mapped_column(Integer, default=1)
+    # Overrides the process type's SLA when set (0 / "" inherit).
+    sla_hours: Mapped[int] = mapped_column(Integer, default=0)
+    sla_action: Mapped[str] = mapped_column(String(20), default="")
 
     workflow: Mapped[Workflow] = relationship(back_populates="nodes")
     position: Mapped[Position] = relationship()
 
 
+class WorkflowSnapshot(Base):
+    # Immutable copy of a workflow's route (nodes, positions, rules) that requests
+    # are pinned to at creation. Never updated or deleted; one row per distinct route.
+    __tablename__ = "workflow_snapshots"
+    __table_args__ = (UniqueConstraint("workflow_id", "version"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    workflow_id: Mapped[int] = mapped_column(Integer, ForeignKey("workflows.id"))
+    version: Mapped[int] = mapped_column(Integer)
+    digest: Mapped[str] = mapped_column(String(64), unique=True)
+    body: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+
+
 class OARequest(Base):
     __tablename__ = "oa_requests"
+    __table_args__ = (
+        Index("ix_oa_requests_status_updated", "status", "updated_at"),
+        # SLA scan: overdue pending requests in deadline order.
+        Index("ix_oa_requests_status_due", "status", "due_at"),
+        # List filters: one index per supported leading filter, ending in the sort/tie column.
+        Index("ix_oa_requests_creator_status", "created_by_user_id", "status", "id"),
+        # Covers the my-requests badge: counts by status and type for one creator.
+        Index("ix_oa_requests_creator_status_type", "created_by_user_id", "status", "type"),
+        Index("ix_oa_requests_creator_type", "created_by_user_id", "type", "id"),
+        Index("ix_oa_requests_creator_created", "created_by_user_id", "created_at"),
+        Index("ix_oa_requests_status_type_created", "status", "type", "created_at"),
+        Index("ix_oa_requests_type_created", "type", "created_at"),
+        Index("ix_oa_requests_created", "created_at"),
+        Index("ix_oa_requests_amount", "amount"),
+        # Ids are never reused: archived rows keep theirs, and in sharded mode each
+        # shard's sequence starts at its own range.
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    type: Mapped[str] = mapped_column(String(50), index=True)
+    type: Mapped[str] = mapped_column(String(50))
     title: Mapped[str] = mapped_column(String(200), index=True)
     content: Mapped[str] = mapped_column(Text, default="")
     amount: Mapped[float | None] = mapped_column(Float, nullable=True)
-    data_json: Mapped[str] = mapped_column(Text, default="{}")
 
-    status: Mapped[str] = mapped_column(String(20), default="pending", index=True)
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    # Bumped on every state transition; decide() updates conditionally on it.
+    version: Mapped[int] = mapped_column(Integer, default=1)
 
     workflow_id: Mapped[int | None] = mapped_column(
         Integer, ForeignKey("workflows.id"), nullable=True
     )
+    workflow_snapshot_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("workflow_snapshots.id"), nullable=True
+    )
     current_node_id: Mapped[int | None] = mapped_column(
         Integer, ForeignKey("workflow_nodes.id"), nullable=True
     )
@@ -130,6 +195,8 @@ class OARequest(Base):
     approver_user_id: Mapped[int | None] = mapped_column(
         Integer, ForeignKey("users.id"), nullable=True
     )
+    # When the current node's SLA runs out; null if it has none or the request is closed.
+    due_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, onupdate=utcnow)
@@ -146,17 +213,161 @@ class OARequest(Base):
 
 class Approval(Base):
     __tablename__ = "approvals"
+    # Archived approvals keep their ids; a reused id would collide in approvals_archive.
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     request_id: Mapped[int] = mapped_column(Integer, ForeignKey("oa_requests.id"))
     workflow_node_id: Mapped[int | None] = mapped_column(
         Integer, ForeignKey("workflow_nodes.id"), nullable=True
     )
-    approver_user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
+    # Null when the SLA scheduler advanced the node on timeout.
+    approver_user_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("users.id"), nullable=True)
+    position_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
     decision: Mapped[str] = mapped_column(String(20))
     comment: Mapped[str] = mapped_column(Text, default="")
     decided_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
 
     request: Mapped[OARequest] = relationship(back_populates="approvals")
-    approver: Mapped[User] = relationship()
+    approver: Mapped[User | None] = relationship()
     workflow_node: Mapped[WorkflowNode | None] = relationship()
+
+
+class RequestPayload(Base):
+    # Form data lives off the hot table: list and inbox scans never read it, and
+    # larger payloads are stored zlib-compressed (see core/payloads.py).
+    __tablename__ = "request_payloads"
+
+    request_id: Mapped[int] = mapped_column(Integer, ForeignKey("oa_requests.id"), primary_key=True)
+    encoding: Mapped[str] = mapped_column(String(8), default="json")
+    body: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+class RequestInbox(Base):
+    # One row per position that still has to act on a pending request's current
+    # node; removed as each position signs and replaced when the node changes.
+    __tablename__ = "request_inbox"
+    __table_args__ = (Index("ix_request_inbox_position", "position_id", "request_id"),)
+
+    request_id: Mapped[int] = mapped_column(Integer, ForeignKey("oa_requests.id"), primary_key=True)
+    position_id: Mapped[int] = mapped_column(Integer, ForeignKey("positions.id"), primary_key=True)
+    # Who the position's share of the work was assigned to; the open counts that
+    # drive least_pending are rebuilt from this column.
+    assignee_user_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("users.id"), nullable=True)
+
+
+class Attachment(Base):
+    # File metadata only: the bytes live on disk under their SHA-256 (see
+    # core/attachments.py), so the same receipt uploaded twice is stored once.
+    # request_id has no foreign key because attachments stay put when their
+    # request moves to the archive.
+    __tablename__ = "attachments"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    request_id: Mapped[int] = mapped_column(Integer, index=True)
+    sha256: Mapped[str] = mapped_column(String(64), index=True)
+    filename: Mapped[str] = mapped_column(String(255))
+    content_type: Mapped[str] = mapped_column(String(100), default="application/octet-stream")
+    size: Mapped[int] = mapped_column(Integer)
+    uploaded_by_user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+
+
+class JobWatermark(Base):
+    # How far a background scan has got, so a restart resumes instead of rescanning.
+    __tablename__ = "job_watermarks"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    position_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    position_id: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow, onupdate=utcnow)
+
+
+class IdempotencyRecord(Base):
+    # Stored response for an Idempotency-Key; a retry with the same key replays
+    # it. Clustered on (user_id, key) so a lookup is one primary-key read.
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires", "expires_at"),
+        {"sqlite_with_rowid": False},
+    )
+
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    # SHA-256 of the endpoint and request body: the same key may not be reused
+    # for a different request.
+    fingerprint: Mapped[str] = mapped_column(String(64))
+    status_code: Mapped[int] = mapped_column(Integer)
+    body: Mapped[str] = mapped_column(Text)
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+    __table_args__ = (Index("ix_notification_outbox_due", "status", "next_attempt_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50))
+    recipient_user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
+    request_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    dedupe_key: Mapped[str] = mapped_column(String(200), index=True)
+    payload_json: Mapped[str] = mapped_column(Text, default="{}")
+
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+    last_error: Mapped[str] = mapped_column(Text, default="")
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utcnow)
+    delivered_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+def _archive_table(source: Table, name: str, *indexed: str) -> Table:
+    # Same columns as the hot table (minus foreign keys), so rows move with a
+    # plain INSERT ... SELECT and new hot columns are archived automatically.
+    columns = [
+        Column(
+            c.name,
+            c.type,
+            primary_key=c.primary_key,
+            nullable=c.nullable,
+            index=c.name in indexed,
+        )
+        for c in source.columns
+    ]
+    columns.append(Column("archived_at", DateTime, server_default=func.current_timestamp()))
+    return Table(name, Base.metadata, *columns)
+
+
+class ArchivedRequest(Base):
+    __table__ = _archive_table(
+        OARequest.__table__, "oa_requests_archive", "created_by_user_id", "updated_at"
+    )
+
+
+class ArchivedApproval(Base):
+    __table__ = _archive_table(Approval.__table__, "approvals_archive", "request_id")
+
+
+class ArchivedRequestPayload(Base):
+    __table__ = _archive_table(RequestPayload.__table__, "request_payloads_archive")
+
+
+class AuditEntry(AuditBase):
+    __tablename__ = "audit_log"
+    __table_args__ = (
+        Index("ix_audit_log_entity", "entity_type", "entity_id", "id"),
+        Index("ix_audit_log_actor", "actor_user_id", "id"),
+        Index("ix_audit_log_action", "action", "id"),
+        Index("ix_audit_log_at", "at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    actor_user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    actor_username: Mapped[str] = mapped_column(String(64), nullable=False, default="")
+    action: Mapped[str] = mapped_column(String(64), nullable=False)
+    entity_type: Mapped[str] = mapped_column(String(32), nullable=False)
+    entity_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    before_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    after_json: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+
+from backend.app.core.config import settings
+from backend.app.core.jobs import PeriodicJob, register
+from backend.app.db.session import engine, read_engine
+
+_lock = threading.Lock()
+_synced_at_ms: int | None = None
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def replica_enabled() -> bool:
+    return read_engine is not engine
+
+
+def replica_position() -> int | None:
+    # Primary time (ms) up to which the replica is known to contain every write;
+    # None when replication is external and we can only assume a lag bound.
+    with _lock:
+        return _synced_at_ms
+
+
+def replica_ready() -> bool:
+    # With the built-in sync job the replica is unusable until its first copy lands.
+    return settings.db_read_sync_seconds <= 0 or replica_position() is not None
+
+
+def replica_covers(last_write_ms: int) -> bool:
+    position = replica_position()
+    if position is not None:
+        return last_write_ms < position
+    if not replica_ready():
+        return False
+    return now_ms() - last_write_ms > settings.db_read_sticky_seconds * 1000
+
+
+def _sqlite_path(url: str) -> str | None:
+    u = make_url(url)
+    if u.get_backend_name() != "sqlite" or not u.database or u.database == ":memory:":
+        return None
+    return u.database
+
+
+def sync_replica() -> None:
+    global _synced_at_ms
+    src_path = _sqlite_path(settings.db_url)
+    dst_path = _sqlite_path(settings.db_read_url)
+    if src_path is None or dst_path is None:
+        return
+    started = now_ms()
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path, timeout=30)
+    try:
+        # Online backup: consistent snapshot of the primary, copied in place so
+        # pooled replica connections see it without reconnecting.
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    with _lock:
+        _synced_at_ms = started
+
+
+def _sync_if_configured() -> None:
+    if replica_enabled() and settings.db_read_sync_seconds > 0:
+        sync_replica()
+
+
+sync_job = register(
+    PeriodicJob("replica-sync", max(settings.db_read_sync_seconds, 1.0), _sync_if_configured)
+)
@@ -1,11 +1,113 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.orm import Session, sessionmaker
 
 from backend.app.core.config import settings
+from backend.app.core.slowlog import current_route, param_shape, slow_queries
+
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def _explain(conn, cursor, statement: str, parameters, executemany: bool) -> list[str] | None:
+    if conn.dialect.name != "sqlite" or not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    # A second cursor on the same connection: the statement's own may still hold rows.
+    plan_cursor = cursor.connection.cursor()
+    try:
+        plan_cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[-1] for row in plan_cursor.fetchall()]
+    except Exception as e:
+        return [f"(plan unavailable: {e})"]
+    finally:
+        plan_cursor.close()
+
+
+def _time_queries(engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
 
-connect_args = {}
-if settings.db_url.startswith("sqlite:"):
-    connect_args = {"check_same_thread": False}
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+        if elapsed_ms < settings.slow_query_ms:
+            return
+        fp, text, want_plan = slow_queries.needs_plan(statement)
+        slow_queries.record(
+            fp,
+            text,
+            elapsed_ms=elapsed_ms,
+            shape=param_shape(parameters, executemany),
+            route=current_route(),
+            plan=_explain(conn, cursor, statement, parameters, executemany) if want_plan else None,
+        )
 
-engine = create_engine(settings.db_url, connect_args=connect_args, future=True)
+    @event.listens_for(engine, "handle_error")
+    def _failed(ctx):
+        started = ctx.connection.info.get("query_started") if ctx.connection is not None else None
+        if started:
+            started.pop()
+
+
+def _make_engine(url: str):
+    kwargs = {}
+    if url.startswith("sqlite:"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if make_url(url).database not in (None, "", ":memory:"):
+            # No cap on a file database: a request holds its connection from
+            # authentication on, and with a capped pool every threadpool worker can
+            # end up waiting for one while the holders wait for a worker.
+            kwargs["max_overflow"] = -1
+    engine = create_engine(url, future=True, **kwargs)
+    if settings.slow_query_ms > 0:
+        _time_queries(engine)
+    return engine
+
+
+engine = _make_engine(settings.db_url)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+# Optional read replica for read-only routes; falls back to the primary.
+read_engine = _make_engine(settings.db_read_url) if settings.db_read_url else engine
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False, future=True)
+
+# Audit log; a separate SQLite file keeps its writes off the main database's lock.
+audit_engine = _make_engine(settings.audit_db_url) if settings.audit_db_url else engine
+AuditSessionLocal = sessionmaker(bind=audit_engine, autoflush=False, autocommit=False, future=True)
+
+# Sharded mode (OA_SHARDS): each shard is a SQLite file holding the request-family
+# tables, with the main database attached. Unqualified names resolve to the shard
+# first and the main database second, so one connection sees the shard's requests
+# and the shared users, positions and workflows, joins included.
+MAIN_SHARD = "main"
+# Request ids are allocated per shard in disjoint ranges, so an id names its shard.
+SHARD_ID_SPAN = 10**12
+
+
+def _make_shard_engine(url: str):
+    if not (url.startswith("sqlite:") and settings.db_url.startswith("sqlite:")):
+        raise RuntimeError("OA_SHARDS requires SQLite for OA_DB_URL and every shard")
+    shard_engine = _make_engine(url)
+    main_path = engine.url.database
+
+    @event.listens_for(shard_engine, "connect")
+    def _attach_main(dbapi_conn, _):
+        dbapi_conn.execute("ATTACH DATABASE ? AS oa_main", (main_path,))
+
+    return shard_engine
+
+
+shard_engines = {
+    MAIN_SHARD: engine,
+    **{name: _make_shard_engine(url) for name, url in settings.shard_urls().items() if name != MAIN_SHARD},
+}
+# Position in this list is the shard's id range; append new shards at the end.
+SHARD_NAMES = list(shard_engines)
+
+
+def shard_session(name: str | None = None) -> Session:
+    name = name if name in shard_engines else MAIN_SHARD
+    return SessionLocal(bind=shard_engines[name], info={"shard": name})
@@ -1,33 +1,55 @@
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from backend.app.api.deps import LAST_WRITE_COOKIE, LAST_WRITE_HEADER
 from backend.app.api.routers import (
+    admin,
     announcements,
     approvals,
+    attachments,
     auth,
+    bootstrap,
     depts,
+    events,
     positions,
     process_types,
     requests,
     users,
     workflows,
 )
+from backend.app.core import jobs
+from backend.app.core.assets import PrecompressedStaticFiles, default_build_dir, ensure_assets
+from backend.app.core.audit import audit_log
+from backend.app.core.compression import CompressionMiddleware
 from backend.app.core.config import settings
+from backend.app.core.etag import ETagMiddleware
+from backend.app.core.profiler import ProfilerMiddleware
+from backend.app.core.shards import close_shards
+from backend.app.core.slowlog import QueryContextMiddleware
 from backend.app.db.init_db import init_db
+from backend.app.db.replica import now_ms, replica_enabled
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     init_db()
+    jobs.start_all()
     yield
+    jobs.stop_all()
+    audit_log.flush_all()
+    close_shards()
 
 
 app = FastAPI(title="OA MVP", lifespan=lifespan)
 
+app.add_middleware(QueryContextMiddleware)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(ETagMiddleware)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.gzip_min_size)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origin_list(),
@@ -36,6 +58,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def track_last_write(request: Request, call_next):
+    response = await call_next(request)
+    if (
+        replica_enabled()
+        and request.method not in ("GET", "HEAD", "OPTIONS")
+        and response.status_code < 400
+    ):
+        position = str(now_ms())
+        response.headers[LAST_WRITE_HEADER] = position
+        response.set_cookie(
+            LAST_WRITE_COOKIE, position, max_age=300, httponly=True, samesite="lax"
+        )
+    return response
+
+
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(depts.router)
@@ -44,7 +83,11 @@ app.include_router(process_types.router)
 app.include_router(workflows.router)
 app.include_router(announcements.router)
 app.include_router(requests.router)
+app.include_router(attachments.router)
 app.include_router(approvals.router)
+app.include_router(events.router)
+app.include_router(admin.router)
+app.include_router(bootstrap.router)
 
 
 @app.get("/api/health")
@@ -55,4 +98,11 @@ def health():
 root_dir = Path(__file__).resolve().parents[2]
 frontend_dir = root_dir / "frontend"
 if frontend_dir.exists():
-    app.mount("/", StaticFiles(directory=str(frontend_dir), html=True), name="frontend")
+    if settings.static_fingerprint:
+        static_dir = ensure_assets(
+            frontend_dir,
+            Path(settings.static_build_dir) if settings.static_build_dir else default_build_dir(frontend_dir),
+        )
+        app.mount("/", PrecompressedStaticFiles(directory=str(static_dir), html=True), name="frontend")
+    else:
+        app.mount("/", StaticFiles(directory=str(frontend_dir), html=True), name="frontend")
@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel
+
+
+class ArchiveResult(BaseModel):
+    older_than_days: int
+    archived: int
+
+
+class AuditEntryOut(BaseModel):
+    id: int
+    at: datetime
+    actor_user_id: int | None
+    actor_username: str
+    action: str
+    entity_type: str
+    entity_id: int | None
+    before: dict[str, Any] | None
+    after: dict[str, Any] | None
+
+
+class AuditPage(BaseModel):
+    items: list[AuditEntryOut]
+    next_before_id: int | None
+
+
+class ProfileOut(BaseModel):
+    id: str
+    method: str
+    path: str
+    status: int
+    duration_ms: float
+    samples: int
+    reason: str
+    created_at: datetime
+
+
+class SlowQueryOut(BaseModel):
+    fingerprint: str
+    sql: str
+    count: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+    last_ms: float
+    last_at: datetime | None
+    param_shape: str
+    plan: list[str]
+    routes: dict[str, int]
+
+
+class SlaStatusOut(BaseModel):
+    enabled: bool
+    runs: int
+    scanned: int
+    escalated: dict[str, int]
+    skipped: int
+    last_run_at: datetime | None
+    last_run_ms: float
+    # Overdue requests handled per second in the last run.
+    last_run_rate: float
+    watermark_at: datetime | None
+    backlog: int
+    # How long the oldest overdue request still waiting for the scheduler has been overdue.
+    lag_seconds: float
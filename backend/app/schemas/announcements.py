@@ -14,3 +14,19 @@ class AnnouncementOut(BaseModel):
     content: str
     created_by_user_id: int
     created_at: datetime
+
+
+class AnnouncementSummary(BaseModel):
+    id: int
+    title: str
+    excerpt: str
+    truncated: bool
+    created_by_user_id: int
+    created_at: datetime
+
+
+class AnnouncementPage(BaseModel):
+    items: list[AnnouncementSummary]
+    total: int
+    page: int
+    page_size: int
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+from backend.app.schemas.announcements import AnnouncementPage
+from backend.app.schemas.auth import UserMe
+from backend.app.schemas.process_types import ProcessTypeOut
+
+
+class BootstrapOut(BaseModel):
+    me: UserMe
+    process_types: list[ProcessTypeOut]
+    announcements: AnnouncementPage
+    pending_count: int
+    my_request_counts: dict[str, int]
@@ -19,6 +19,8 @@ class ProcessTypeOut(BaseModel):
     requires_amount: bool
     is_active: bool
     fields: list[ProcessField] = []
+    sla_hours: int = 0
+    sla_action: str = "notify"
 
 
 class ProcessTypeCreate(BaseModel):
@@ -28,6 +30,8 @@ class ProcessTypeCreate(BaseModel):
     requires_amount: bool = False
     is_active: bool = True
     fields: list[ProcessField] = []
+    sla_hours: int = Field(default=0, ge=0, le=8760)
+    sla_action: str = Field(default="notify", pattern="^(notify|reassign|auto_advance)$")
 
 
 class ProcessTypeUpdate(BaseModel):
@@ -36,6 +40,8 @@ class ProcessTypeUpdate(BaseModel):
     requires_amount: bool | None = None
     is_active: bool | None = None
     fields: list[ProcessField] | None = None
+    sla_hours: int | None = Field(default=None, ge=0, le=8760)
+    sla_action: str | None = Field(default=None, pattern="^(notify|reassign|auto_advance)$")
 
 
 class ProcessData(BaseModel):
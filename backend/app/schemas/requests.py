@@ -27,6 +27,34 @@ class RequestOut(BaseModel):
     updated_at: datetime
 
 
+class RequestPage(BaseModel):
+    items: list[RequestOut]
+    total: int
+    page: int
+    page_size: int
+
+
+class CountSummary(BaseModel):
+    total: int
+    by_status: dict[str, int]
+    by_type: dict[str, int]
+
+
+class RequestFilters(BaseModel):
+    status: str | None = Field(default=None, pattern="^(pending|approved|rejected)$")
+    type: str | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    amount_min: float | None = None
+    amount_max: float | None = None
+    created_by_user_id: int | None = None
+    department_id: int | None = None
+    include_archived: bool = False
+    sort: str = Field(default="-id", pattern="^-?(id|created_at|updated_at|amount)$")
+    page: int = Field(default=1, ge=1)
+    page_size: int = Field(default=20, ge=1, le=200)
+
+
 class ApprovalDecision(BaseModel):
     decision: str = Field(pattern="^(approved|rejected)$")
     comment: str = ""
@@ -38,7 +66,7 @@ class RequestNodeStatus(BaseModel):
     node_name: str
     position_id: int
     position_name: str
-    status: str = Field(pattern="^(approved|rejected|pending|not_started)$")
+    status: str = Field(pattern="^(approved|rejected|pending|not_started|skipped)$")
     decided_by_user_id: int | None = None
     decided_by_username: str | None = None
     decided_at: datetime | None = None
@@ -52,13 +80,25 @@ class ApprovalHistoryItem(BaseModel):
     node_name: str | None
     position_id: int | None
     position_name: str | None
-    approver_user_id: int
-    approver_username: str
+    # None when the node was passed automatically on SLA timeout.
+    approver_user_id: int | None
+    approver_username: str | None
     decision: str
     comment: str
     decided_at: datetime
 
 
+class AttachmentOut(BaseModel):
+    id: int
+    request_id: int
+    filename: str
+    content_type: str
+    size: int
+    uploaded_by_user_id: int
+    uploaded_by_username: str
+    created_at: datetime
+
+
 class RequestDetail(BaseModel):
     request: RequestOut
     process_name: str | None = None
@@ -66,3 +106,4 @@ class RequestDetail(BaseModel):
     workflow_name: str | None = None
     nodes: list[RequestNodeStatus] = []
     history: list[ApprovalHistoryItem] = []
+    attachments: list[AttachmentOut] = []
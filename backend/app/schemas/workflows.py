@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Any
 
 from pydantic import BaseModel, Field
 
@@ -14,10 +15,30 @@ class WorkflowUpdate(BaseModel):
     is_active: bool | None = None
 
 
+class NodeCondition(BaseModel):
+    field: str = Field(pattern=r"^(amount|data\.[A-Za-z0-9_]+)$")
+    op: str = Field(pattern="^(==|!=|>|>=|<|<=|in|not_in)$")
+    value: Any
+
+
 class WorkflowNodeCreate(BaseModel):
     step_order: int = Field(ge=1, le=100)
     position_id: int
     name: str = Field(default="", max_length=200)
+    condition: list[NodeCondition] = []
+    extra_position_ids: list[int] = []
+    required_approvals: int = Field(default=1, ge=1, le=20)
+    sla_hours: int = Field(default=0, ge=0, le=8760)
+    sla_action: str = Field(default="", pattern="^(|notify|reassign|auto_advance)$")
+
+
+class WorkflowNodeUpdate(BaseModel):
+    name: str | None = Field(default=None, max_length=200)
+    condition: list[NodeCondition] | None = None
+    extra_position_ids: list[int] | None = None
+    required_approvals: int | None = Field(default=None, ge=1, le=20)
+    sla_hours: int | None = Field(default=None, ge=0, le=8760)
+    sla_action: str | None = Field(default=None, pattern="^(|notify|reassign|auto_advance)$")
 
 
 class WorkflowNodeOut(BaseModel):
@@ -26,6 +47,11 @@ class WorkflowNodeOut(BaseModel):
     step_order: int
     position_id: int
     name: str
+    condition: list[NodeCondition] = []
+    extra_position_ids: list[int] = []
+    required_approvals: int = 1
+    sla_hours: int = 0
+    sla_action: str = ""
 
 
 class WorkflowOut(BaseModel):
@@ -6,24 +6,62 @@ export function getToken() {
 
 export function setToken(token) {
   localStorage.setItem(TOKEN_KEY, token);
+  invalidate();
 }
 
 export function clearToken() {
   localStorage.removeItem(TOKEN_KEY);
+  invalidate();
 }
 
-async function request(path, { method = "GET", body, auth = true } = {}) {
+// GET cache: path -> { data, etag, at }. Stale entries are returned immediately
+// and revalidated in the background with If-None-Match (stale-while-revalidate).
+const FRESH_MS = 2000;
+const cache = new Map();
+const inflight = new Map();
+
+export function invalidate(prefixes) {
+  if (!prefixes) {
+    cache.clear();
+    return;
+  }
+  for (const key of [...cache.keys()]) {
+    if (prefixes.some((p) => key === p || key.startsWith(`${p}/`) || key.startsWith(`${p}?`))) {
+      cache.delete(key);
+    }
+  }
+}
+
+export function prime(path, data) {
+  cache.set(path, { data, etag: null, at: Date.now() });
+}
+
+function query(params = {}) {
+  const q = new URLSearchParams();
+  for (const [k, v] of Object.entries(params)) {
+    if (v !== undefined && v !== null && v !== "") q.set(k, String(v));
+  }
+  const s = q.toString();
+  return s ? `?${s}` : "";
+}
+
+async function send(path, { method = "GET", body, auth = true, etag = null, idempotencyKey = null } = {}) {
   const headers = { "Content-Type": "application/json" };
   if (auth) {
     const token = getToken();
     if (token) headers.Authorization = `Bearer ${token}`;
   }
+  if (etag) headers["If-None-Match"] = etag;
+  if (idempotencyKey) headers["Idempotency-Key"] = idempotencyKey;
 
   const res = await fetch(path, {
     method,
     headers,
     body: body ? JSON.stringify(body) : undefined,
+    // Revalidation is done here; keep the browser cache from answering for us.
+    cache: method === "GET" ? "no-store" : "default",
   });
+  if (res.status === 304) return { notModified: true, etag };
 
   const text = await res.text();
   const data = text ? JSON.parse(text) : null;
@@ -31,42 +69,178 @@ async function request(path, { method = "GET", body, auth = true } = {}) {
     const detail = data?.detail || `HTTP ${res.status}`;
     throw new Error(detail);
   }
+  return { data, etag: res.headers.get("ETag") };
+}
+
+function revalidate(path) {
+  // Identical concurrent GETs share one fetch.
+  if (inflight.has(path)) return inflight.get(path);
+  const cached = cache.get(path);
+  const p = send(path, { etag: cached?.etag })
+    .then((r) => {
+      if (r.notModified && cached) {
+        cached.at = Date.now();
+        return cached.data;
+      }
+      cache.set(path, { data: r.data, etag: r.etag, at: Date.now() });
+      return r.data;
+    })
+    .finally(() => inflight.delete(path));
+  inflight.set(path, p);
+  return p;
+}
+
+function newIdempotencyKey() {
+  if (globalThis.crypto?.randomUUID) return crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+async function sendIdempotent(path, opts) {
+  // One key per user action. A network failure may have lost only the response,
+  // so retry once with the same key; the server replays instead of repeating it.
+  const idempotencyKey = newIdempotencyKey();
+  try {
+    return await send(path, { ...opts, idempotencyKey });
+  } catch (err) {
+    if (!(err instanceof TypeError)) throw err;
+    return send(path, { ...opts, idempotencyKey });
+  }
+}
+
+async function request(path, { method = "GET", body, auth = true, invalidates = [], idempotent = false } = {}) {
+  if (method === "GET" && auth) {
+    const cached = cache.get(path);
+    if (cached) {
+      if (Date.now() - cached.at > FRESH_MS) revalidate(path).catch(() => cache.delete(path));
+      return cached.data;
+    }
+    return revalidate(path);
+  }
+
+  const r = idempotent ? await sendIdempotent(path, { method, body, auth }) : await send(path, { method, body, auth });
+  if (invalidates.length) invalidate(invalidates);
+  return r.data;
+}
+
+async function upload(path, file, invalidates = []) {
+  // The file goes up as the raw request body so the server can stream it to disk.
+  const headers = { "Content-Type": file.type || "application/octet-stream" };
+  const token = getToken();
+  if (token) headers.Authorization = `Bearer ${token}`;
+  const res = await fetch(path, { method: "POST", headers, body: file });
+  const text = await res.text();
+  const data = text ? JSON.parse(text) : null;
+  if (!res.ok) throw new Error(data?.detail || `HTTP ${res.status}`);
+  if (invalidates.length) invalidate(invalidates);
   return data;
 }
 
+async function download(path, filename) {
+  // Fetched with the Authorization header and saved from a blob URL: a token in
+  // a link would end up in history, proxy logs and Referer headers.
+  const headers = {};
+  const token = getToken();
+  if (token) headers.Authorization = `Bearer ${token}`;
+  const res = await fetch(path, { headers });
+  if (!res.ok) {
+    const text = await res.text();
+    let detail = null;
+    try {
+      detail = text ? JSON.parse(text)?.detail : null;
+    } catch {
+      detail = null;
+    }
+    throw new Error(detail || `HTTP ${res.status}`);
+  }
+  const url = URL.createObjectURL(await res.blob());
+  const a = document.createElement("a");
+  a.href = url;
+  a.download = filename;
+  document.body.appendChild(a);
+  a.click();
+  a.remove();
+  setTimeout(() => URL.revokeObjectURL(url), 60000);
+}
+
+export function openEventStream(onEvent) {
+  const token = getToken();
+  if (!token || typeof EventSource === "undefined") return null;
+  // EventSource resends Last-Event-ID on reconnect; the server replays what was missed.
+  const es = new EventSource(`/api/events/stream?token=${encodeURIComponent(token)}`);
+  for (const type of ["request.created", "request.updated", "resync"]) {
+    es.addEventListener(type, (e) => {
+      let data = null;
+      try {
+        data = e.data ? JSON.parse(e.data) : null;
+      } catch {
+        data = null;
+      }
+      onEvent(type, data);
+    });
+  }
+  return es;
+}
+
+export const INBOX_KEYS = ["/api/requests", "/api/approvals", "/api/bootstrap"];
+
 export const api = {
   login: (username, password) =>
     request("/api/auth/login", { method: "POST", body: { username, password }, auth: false }),
   me: () => request("/api/auth/me"),
-  listAnnouncements: () => request("/api/announcements"),
+  bootstrap: async () => {
+    const data = await request("/api/bootstrap");
+    // Seed the individual endpoints so the first screen renders without more round-trips.
+    prime("/api/auth/me", data.me);
+    prime("/api/process-types", data.process_types);
+    prime(`/api/announcements?page=1&page_size=${data.announcements.page_size}`, data.announcements);
+    return data;
+  },
+  listAnnouncements: (page = 1, pageSize = 10) =>
+    request(`/api/announcements?page=${page}&page_size=${pageSize}`),
+  getAnnouncement: (id) => request(`/api/announcements/${id}`),
   createAnnouncement: (title, content) =>
-    request("/api/announcements", { method: "POST", body: { title, content } }),
-  createRequest: (payload) => request("/api/requests", { method: "POST", body: payload }),
-  listMyRequests: () => request("/api/requests/mine"),
+    request("/api/announcements", { method: "POST", body: { title, content }, invalidates: ["/api/announcements"] }),
+  createRequest: (payload) =>
+    request("/api/requests", { method: "POST", body: payload, invalidates: INBOX_KEYS, idempotent: true }),
+  listMyRequests: (filters) => request(`/api/requests/mine${query(filters)}`),
+  myRequestSummary: () => request("/api/requests/mine/summary"),
+  listAllRequests: (filters) => request(`/api/requests${query(filters)}`),
   requestDetail: (id) => request(`/api/requests/${id}/detail`),
+  uploadAttachment: (id, file) =>
+    upload(`/api/requests/${id}/attachments${query({ filename: file.name })}`, file, [`/api/requests/${id}`]),
+  downloadAttachment: (id, attachmentId, filename) =>
+    download(`/api/requests/${id}/attachments/${attachmentId}`, filename),
   listPendingApprovals: () => request("/api/approvals/pending"),
+  pendingCount: () => request("/api/approvals/pending/count"),
   decide: (id, decision, comment) =>
-    request(`/api/approvals/${id}/decide`, { method: "POST", body: { decision, comment } }),
+    request(`/api/approvals/${id}/decide`, { method: "POST", body: { decision, comment }, invalidates: INBOX_KEYS, idempotent: true }),
 
   listProcessTypes: () => request("/api/process-types"),
 
   listDepts: () => request("/api/depts"),
-  createDept: (name) => request("/api/depts", { method: "POST", body: { name } }),
+  createDept: (name) => request("/api/depts", { method: "POST", body: { name }, invalidates: ["/api/depts"] }),
   listUsers: () => request("/api/users"),
-  createUser: (payload) => request("/api/users", { method: "POST", body: payload }),
-  updateUser: (id, payload) => request(`/api/users/${id}`, { method: "PATCH", body: payload }),
+  createUser: (payload) =>
+    request("/api/users", { method: "POST", body: payload, invalidates: ["/api/users"] }),
+  updateUser: (id, payload) =>
+    request(`/api/users/${id}`, { method: "PATCH", body: payload, invalidates: ["/api/users", "/api/auth/me"] }),
   setUserPassword: (id, password) =>
     request(`/api/users/${id}/password`, { method: "PUT", body: { password } }),
 
   listPositions: () => request("/api/positions"),
-  createPosition: (payload) => request("/api/positions", { method: "POST", body: payload }),
+  createPosition: (payload) =>
+    request("/api/positions", { method: "POST", body: payload, invalidates: ["/api/positions"] }),
 
   listWorkflows: (requestType) =>
     requestType ? request(`/api/workflows?request_type=${encodeURIComponent(requestType)}`) : request("/api/workflows"),
-  createWorkflow: (payload) => request("/api/workflows", { method: "POST", body: payload }),
-  updateWorkflow: (id, payload) => request(`/api/workflows/${id}`, { method: "PATCH", body: payload }),
+  createWorkflow: (payload) =>
+    request("/api/workflows", { method: "POST", body: payload, invalidates: ["/api/workflows"] }),
+  updateWorkflow: (id, payload) =>
+    request(`/api/workflows/${id}`, { method: "PATCH", body: payload, invalidates: ["/api/workflows"] }),
   addWorkflowNode: (workflowId, payload) =>
-    request(`/api/workflows/${workflowId}/nodes`, { method: "POST", body: payload }),
+    request(`/api/workflows/${workflowId}/nodes`, { method: "POST", body: payload, invalidates: ["/api/workflows"] }),
+  updateWorkflowNode: (workflowId, nodeId, payload) =>
+    request(`/api/workflows/${workflowId}/nodes/${nodeId}`, { method: "PATCH", body: payload, invalidates: ["/api/workflows"] }),
   deleteWorkflowNode: (workflowId, nodeId) =>
-    request(`/api/workflows/${workflowId}/nodes/${nodeId}`, { method: "DELETE" }),
+    request(`/api/workflows/${workflowId}/nodes/${nodeId}`, { method: "DELETE", invalidates: ["/api/workflows"] }),
 };
@@ -1,4 +1,4 @@
-import { api, clearToken, getToken, setToken } from "./api.js";
+import { INBOX_KEYS, api, clearToken, getToken, invalidate, openEventStream, setToken } from "./api.js";
 
 const appEl = document.getElementById("app");
 const userBarEl = document.getElementById("userBar");
@@ -24,6 +24,13 @@ const NODE_STATUS_LABEL = {
   pending: "待审批",
   approved: "已同意",
   rejected: "已驳回",
+  skipped: "不适用",
+};
+
+const SLA_ACTIONS = {
+  notify: "提醒",
+  reassign: "转派",
+  auto_advance: "自动通过",
 };
 
 function labelType(type) {
@@ -38,6 +45,12 @@ function labelNodeStatus(status) {
   return NODE_STATUS_LABEL[status] || status || "";
 }
 
+function formatBytes(n) {
+  if (n < 1024) return `${n} B`;
+  if (n < 1024 * 1024) return `${(n / 1024).toFixed(1)} KB`;
+  return `${(n / 1024 / 1024).toFixed(1)} MB`;
+}
+
 async function ensureProcessTypes() {
   if (PROCESS_TYPES.length) return;
   try {
@@ -53,7 +66,44 @@ async function ensureProcessTypes() {
   }
 }
 
+let bootstrappedToken = "";
+let eventStream = null;
+let eventStreamToken = "";
+let liveRefreshTimer = null;
+
+const LIVE_ROUTES = ["/dashboard", "/requests", "/approvals", "/request/"];
+
+function closeEventStream() {
+  eventStream?.close();
+  eventStream = null;
+  eventStreamToken = "";
+}
+
+function ensureEventStream() {
+  const token = getToken();
+  if (eventStream && eventStreamToken === token) return;
+  closeEventStream();
+  eventStream = openEventStream(() => {
+    invalidate(INBOX_KEYS);
+    scheduleLiveRefresh();
+  });
+  eventStreamToken = eventStream ? token : "";
+}
+
+function scheduleLiveRefresh() {
+  clearTimeout(liveRefreshTimer);
+  liveRefreshTimer = setTimeout(() => {
+    const route = (location.hash || "").replace(/^#/, "") || "/dashboard";
+    if (!LIVE_ROUTES.some((r) => route.startsWith(r))) return;
+    // Don't throw away a comment the user is typing.
+    const active = document.activeElement;
+    if (active && ["INPUT", "TEXTAREA", "SELECT"].includes(active.tagName) && active.value) return;
+    void render();
+  }, 300);
+}
+
 logoutBtn.addEventListener("click", () => {
+  closeEventStream();
   clearToken();
   location.hash = "#/login";
   render();
@@ -95,6 +145,7 @@ function nav(me) {
   }
 
   const bar = el(`<div class="toolbar"></div>`);
+  const buttons = {};
   for (const it of items) {
     const b = el(`<button class="btn btn-secondary"></button>`);
     b.textContent = it.label;
@@ -102,11 +153,31 @@ function nav(me) {
       location.hash = it.hash;
       render();
     });
+    buttons[it.hash] = b;
     bar.appendChild(b);
   }
+  fillNavBadges(buttons);
   return bar;
 }
 
+async function fillNavBadges(buttons) {
+  // Counts only: the badge endpoints never ship the lists themselves.
+  try {
+    const [pending, mine] = await Promise.all([api.pendingCount(), api.myRequestSummary()]);
+    setBadge(buttons["#/approvals"], pending.total);
+    setBadge(buttons["#/requests"], mine.by_status?.pending || 0);
+  } catch {
+    // Badges are a convenience; the pages themselves still load.
+  }
+}
+
+function setBadge(button, n) {
+  if (!button || !n) return;
+  const badge = el(`<span class="badge"></span>`);
+  badge.textContent = n > 99 ? "99+" : String(n);
+  button.appendChild(badge);
+}
+
 async function renderLogin() {
   const root = el(`
     <div>
@@ -150,38 +221,113 @@ async function renderDashboard(me) {
 
   await ensureProcessTypes();
 
+  try {
+    const boot = await api.bootstrap();
+    const mine = boot.my_request_counts || {};
+    const summary = el(`<div class="muted" style="margin-bottom: 10px;"></div>`);
+    summary.textContent = `待我审批 ${boot.pending_count} 条 · 我的申请 待审批 ${mine.pending || 0} / 已同意 ${mine.approved || 0} / 已驳回 ${mine.rejected || 0}`;
+    root.appendChild(summary);
+  } catch (err) {
+    showError(root, err);
+  }
+
   const annWrap = el(`<div><div class="section-title">公告</div><div class="list" id="annList"></div></div>`);
   root.appendChild(annWrap);
+  const listEl = annWrap.querySelector("#annList");
+  const pager = el(`<div style="margin-top: 10px; display: flex; gap: 10px; align-items: center;"></div>`);
+  annWrap.appendChild(pager);
 
-  try {
-    const anns = await api.listAnnouncements();
-    const listEl = annWrap.querySelector("#annList");
-    if (anns.length === 0) {
-      listEl.appendChild(el(`<div class="muted">暂无公告</div>`));
-    } else {
+  async function loadAnnouncements(page) {
+    try {
+      const data = await api.listAnnouncements(page);
+      const anns = data.items || [];
+      listEl.replaceChildren();
+      if (anns.length === 0) {
+        listEl.appendChild(el(`<div class="muted">暂无公告</div>`));
+      }
       for (const a of anns) {
         const item = el(`<div class="item"><div class="item-title"></div><div class="muted"></div></div>`);
         item.querySelector(".item-title").textContent = a.title;
-        item.querySelector(".muted").textContent = a.content || "";
+        const body = item.querySelector(".muted");
+        body.textContent = a.truncated ? `${a.excerpt}…` : a.excerpt || "";
+        if (a.truncated) {
+          const more = el(`<button class="btn btn-secondary" style="margin-top: 6px;">展开全文</button>`);
+          more.addEventListener("click", async () => {
+            try {
+              const full = await api.getAnnouncement(a.id);
+              body.textContent = full.content || "";
+              more.remove();
+            } catch (err) {
+              showError(item, err);
+            }
+          });
+          item.appendChild(more);
+        }
         listEl.appendChild(item);
       }
+
+      pager.replaceChildren();
+      const pages = Math.max(1, Math.ceil((data.total || 0) / data.page_size));
+      if (pages > 1) {
+        const prev = el(`<button class="btn btn-secondary">上一页</button>`);
+        const next = el(`<button class="btn btn-secondary">下一页</button>`);
+        const info = el(`<span class="muted"></span>`);
+        info.textContent = `${data.page} / ${pages}`;
+        prev.disabled = data.page <= 1;
+        next.disabled = data.page >= pages;
+        prev.addEventListener("click", () => void loadAnnouncements(data.page - 1));
+        next.addEventListener("click", () => void loadAnnouncements(data.page + 1));
+        pager.append(prev, info, next);
+      }
+    } catch (err) {
+      showError(annWrap, err);
     }
-  } catch (err) {
-    showError(annWrap, err);
   }
 
+  await loadAnnouncements(1);
+
   appEl.replaceChildren(root);
 }
 
+const MY_REQUEST_FILTERS = { status: "", type: "", page: 1 };
+
 async function renderMyRequests(me) {
   const root = el(`<div></div>`);
   root.appendChild(nav(me));
 
-  const wrap = el(`<div><div class="section-title">我的申请</div><div class="list" id="list"></div></div>`);
+  await ensureProcessTypes();
+
+  const wrap = el(`<div>
+    <div class="section-title">我的申请</div>
+    <div class="toolbar">
+      <select id="fStatus" class="input" style="max-width: 160px;"></select>
+      <select id="fType" class="input" style="max-width: 200px;"></select>
+    </div>
+    <div class="list" id="list"></div>
+    <div id="pager" style="margin-top: 10px; display: flex; gap: 10px; align-items: center;"></div>
+  </div>`);
   root.appendChild(wrap);
 
+  const statusEl = wrap.querySelector("#fStatus");
+  const typeEl = wrap.querySelector("#fType");
+  statusEl.appendChild(new Option("全部状态", ""));
+  for (const [k, v] of Object.entries(STATUS_LABEL)) statusEl.appendChild(new Option(v, k));
+  typeEl.appendChild(new Option("全部类型", ""));
+  for (const p of PROCESS_TYPES) typeEl.appendChild(new Option(p.name, p.code));
+  statusEl.value = MY_REQUEST_FILTERS.status;
+  typeEl.value = MY_REQUEST_FILTERS.type;
+  for (const sel of [statusEl, typeEl]) {
+    sel.addEventListener("change", () => {
+      MY_REQUEST_FILTERS.status = statusEl.value;
+      MY_REQUEST_FILTERS.type = typeEl.value;
+      MY_REQUEST_FILTERS.page = 1;
+      void renderMyRequests(me);
+    });
+  }
+
   try {
-    const items = await api.listMyRequests();
+    const data = await api.listMyRequests(MY_REQUEST_FILTERS);
+    const items = data.items || [];
     const listEl = wrap.querySelector("#list");
     if (items.length === 0) {
       listEl.appendChild(el(`<div class="muted">暂无申请</div>`));
@@ -205,6 +351,26 @@ async function renderMyRequests(me) {
         listEl.appendChild(item);
       }
     }
+
+    const pages = Math.max(1, Math.ceil((data.total || 0) / data.page_size));
+    if (pages > 1) {
+      const pager = wrap.querySelector("#pager");
+      const prev = el(`<button class="btn btn-secondary">上一页</button>`);
+      const next = el(`<button class="btn btn-secondary">下一页</button>`);
+      const info = el(`<span class="muted"></span>`);
+      info.textContent = `${data.page} / ${pages}（共 ${data.total} 条）`;
+      prev.disabled = data.page <= 1;
+      next.disabled = data.page >= pages;
+      prev.addEventListener("click", () => {
+        MY_REQUEST_FILTERS.page = data.page - 1;
+        void renderMyRequests(me);
+      });
+      next.addEventListener("click", () => {
+        MY_REQUEST_FILTERS.page = data.page + 1;
+        void renderMyRequests(me);
+      });
+      pager.append(prev, info, next);
+    }
   } catch (err) {
     showError(wrap, err);
   }
@@ -270,6 +436,55 @@ async function renderRequestDetail(me, requestId) {
     }
     box.appendChild(formBox);
 
+    const files = el(`<div style="margin-top:12px;"></div>`);
+    files.appendChild(el(`<div class="section-title">附件</div>`));
+    const attachments = Array.isArray(detail.attachments) ? detail.attachments : [];
+    if (!attachments.length) {
+      files.appendChild(el(`<div class="muted">（暂无附件）</div>`));
+    } else {
+      const t = el(
+        `<table class="table"><thead><tr><th>文件</th><th>大小</th><th>上传人</th><th>上传时间</th></tr></thead><tbody></tbody></table>`
+      );
+      const tbody = t.querySelector("tbody");
+      for (const a of attachments) {
+        const tr = el(`<tr><td><a href="#"></a></td><td class="mono"></td><td></td><td class="mono"></td></tr>`);
+        const link = tr.querySelector("a");
+        link.textContent = a.filename;
+        link.addEventListener("click", async (e) => {
+          e.preventDefault();
+          try {
+            await api.downloadAttachment(r.id, a.id, a.filename);
+          } catch (err) {
+            showError(box, err);
+          }
+        });
+        tr.children[1].textContent = formatBytes(a.size);
+        tr.children[2].textContent = a.uploaded_by_username;
+        tr.children[3].textContent = String(a.created_at);
+        tbody.appendChild(tr);
+      }
+      files.appendChild(t);
+    }
+    const uploadRow = el(
+      `<div style="margin-top: 10px; display: flex; gap: 10px; flex-wrap: wrap;">
+        <input class="input" type="file" style="max-width: 420px;" />
+        <button class="btn">上传附件</button>
+      </div>`
+    );
+    const fileEl = uploadRow.querySelector("input");
+    uploadRow.querySelector("button").addEventListener("click", async () => {
+      const file = fileEl.files?.[0];
+      if (!file) return;
+      try {
+        await api.uploadAttachment(r.id, file);
+        await render();
+      } catch (err) {
+        showError(box, err);
+      }
+    });
+    files.appendChild(uploadRow);
+    box.appendChild(files);
+
     const flow = el(`<div style="margin-top:12px;"></div>`);
     flow.appendChild(el(`<div class="section-title">需要哪些岗位审批 / 当前状态</div>`));
     if (!detail.nodes || detail.nodes.length === 0) {
@@ -349,7 +564,7 @@ async function renderRequestDetail(me, requestId) {
         tr.children[0].textContent = String(h.id);
         tr.children[1].textContent = h.step_order != null ? `${h.step_order}. ${h.node_name || ""}` : "";
         tr.children[2].textContent = h.position_name ? `${h.position_name} (#${h.position_id})` : "";
-        tr.children[3].textContent = h.approver_username;
+        tr.children[3].textContent = h.approver_username || "系统（超时自动通过）";
         tr.children[4].textContent = labelStatus(h.decision);
         tr.children[5].textContent = String(h.decided_at);
         tr.children[6].textContent = h.comment || "";
@@ -724,14 +939,19 @@ async function renderAdmin(me) {
           nodesWrap.appendChild(el(`<div class="muted">该审批流暂无节点（请求将无法发起）</div>`));
         } else {
           const t = el(
-            `<table class="table"><thead><tr><th>顺序</th><th>岗位</th><th>节点名</th><th>操作</th></tr></thead><tbody></tbody></table>`
+            `<table class="table"><thead><tr><th>顺序</th><th>岗位</th><th>节点名</th><th>规则</th><th>操作</th></tr></thead><tbody></tbody></table>`
           );
           const tbody = t.querySelector("tbody");
           for (const n of wf.nodes) {
-            const tr = el(`<tr><td class="mono"></td><td></td><td></td><td></td></tr>`);
+            const tr = el(`<tr><td class="mono"></td><td></td><td></td><td class="mono"></td><td></td></tr>`);
+            const nodePositions = [n.position_id, ...(n.extra_position_ids || [])];
             tr.children[0].textContent = String(n.step_order);
-            tr.children[1].textContent = `${posNameById.get(n.position_id) || "未知"} (#${n.position_id})`;
+            tr.children[1].textContent = nodePositions.map((id) => `${posNameById.get(id) || "未知"} (#${id})`).join("、");
             tr.children[2].textContent = n.name || "";
+            const rules = (n.condition || []).map((c) => `${c.field} ${c.op} ${JSON.stringify(c.value)}`);
+            if (nodePositions.length > 1) rules.push(`会签 ${n.required_approvals}/${nodePositions.length}`);
+            if (n.sla_hours) rules.push(`时限 ${n.sla_hours}h ${SLA_ACTIONS[n.sla_action] || ""}`.trim());
+            tr.children[3].textContent = rules.join("；");
             const delBtn = el(`<button class="btn btn-danger">删除</button>`);
             delBtn.addEventListener("click", async () => {
               if (!confirm("确认删除该节点？")) return;
@@ -742,7 +962,7 @@ async function renderAdmin(me) {
                 showError(flowBox, err);
               }
             });
-            tr.children[3].appendChild(delBtn);
+            tr.children[4].appendChild(delBtn);
             tbody.appendChild(tr);
           }
           nodesWrap.appendChild(t);
@@ -754,12 +974,22 @@ async function renderAdmin(me) {
             <input class="input" style="max-width:120px;" placeholder="顺序(1..)" />
             <select class="input" style="min-width:180px;"></select>
             <input class="input" style="min-width:220px;" placeholder="节点名（可选）" />
+            <input class="input" style="max-width:160px;" placeholder="金额≥（可选）" />
+            <input class="input" style="max-width:180px;" placeholder="会签岗位ID，逗号分隔" />
+            <input class="input" style="max-width:120px;" placeholder="需同意数" />
+            <input class="input" style="max-width:140px;" placeholder="时限小时（可选）" />
+            <select class="input" style="max-width:160px;">
+              <option value="">超时：按类型默认</option>
+              <option value="notify">超时：提醒</option>
+              <option value="reassign">超时：转派</option>
+              <option value="auto_advance">超时：自动通过</option>
+            </select>
             <button class="btn btn-secondary">新增节点</button>
           </div>
         `);
         const orderEl = addForm.querySelector("input");
-        const posSel = addForm.querySelector("select");
-        const nameEl = addForm.querySelectorAll("input")[1];
+        const [posSel, slaActionSel] = addForm.querySelectorAll("select");
+        const [, nameEl, minAmountEl, extraEl, requiredEl, slaHoursEl] = addForm.querySelectorAll("input");
         posSel.appendChild(el(`<option value="">选择岗位</option>`));
         for (const p of positions) {
           const o = el(`<option></option>`);
@@ -772,10 +1002,28 @@ async function renderAdmin(me) {
             const step_order = Number(orderEl.value || "0");
             const position_id = Number(posSel.value || "0");
             const name = nameEl.value.trim();
-            await api.addWorkflowNode(wf.id, { step_order, position_id, name });
-            orderEl.value = "";
+            const minAmount = minAmountEl.value.trim();
+            const condition = minAmount ? [{ field: "amount", op: ">=", value: Number(minAmount) }] : [];
+            const extra_position_ids = extraEl.value
+              .split(/[,，\s]+/)
+              .filter(Boolean)
+              .map(Number);
+            const required_approvals = Number(requiredEl.value || "1");
+            const sla_hours = Number(slaHoursEl.value || "0");
+            const sla_action = slaActionSel.value;
+            await api.addWorkflowNode(wf.id, {
+              step_order,
+              position_id,
+              name,
+              condition,
+              extra_position_ids,
+              required_approvals,
+              sla_hours,
+              sla_action,
+            });
+            for (const input of [orderEl, nameEl, minAmountEl, extraEl, requiredEl, slaHoursEl]) input.value = "";
             posSel.value = "";
-            nameEl.value = "";
+            slaActionSel.value = "";
             await refreshWorkflows();
           } catch (err) {
             showError(flowBox, err);
@@ -1084,6 +1332,10 @@ async function renderAdmin(me) {
 async function ensureMe() {
   if (!getToken()) return null;
   try {
+    if (bootstrappedToken !== getToken()) {
+      await api.bootstrap();
+      bootstrappedToken = getToken();
+    }
     return await api.me();
   } catch {
     clearToken();
@@ -1099,10 +1351,12 @@ export async function render() {
   const route = hash.replace(/^#/, "");
 
   if (!me) {
+    closeEventStream();
     if (route !== "/login") location.hash = "#/login";
     await renderLogin();
     return;
   }
+  ensureEventStream();
 
   if (!route || route === "/dashboard") return renderDashboard(me);
   if (route === "/requests") return renderMyRequests(me);
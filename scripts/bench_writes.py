@@ -0,0 +1,162 @@
+# Write throughput with and without OA_WRITE_QUEUE: concurrent clients create
+# requests for a while, then decide them, against a real uvicorn server.
+#
+#   uv run python -m scripts.bench_writes --clients 64 --seconds 10 --runs 3
+#
+# Each mode runs in its own process (the queue is configured at import) on a
+# throwaway SQLite database, so results do not depend on what oa.db holds.
+import argparse
+import http.client
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+LEAVE = json.dumps(
+    {
+        "type": "leave",
+        "title": "bench",
+        "content": "",
+        "data": {"leave_type": "事假", "start_date": "2024-01-01", "end_date": "2024-01-02"},
+    }
+).encode("utf-8")
+DECISION = json.dumps({"decision": "approved"}).encode("utf-8")
+
+
+def _phase(port: int, clients: int, seconds: float, token: str, next_call) -> dict:
+    # next_call() returns (path, body, expected status) or None when out of work.
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client() -> None:
+        nonlocal errors
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+        mine: list[float] = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            call = next_call()
+            if call is None:
+                break
+            path, body, expected = call
+            started = time.perf_counter()
+            conn.request("POST", path, body=body, headers=headers)
+            res = conn.getresponse()
+            payload = res.read()
+            mine.append(time.perf_counter() - started)
+            if res.status != expected:
+                failed += 1
+            elif path == "/api/requests":
+                created.put(json.loads(payload)["id"])
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors += failed
+
+    created: queue.Queue[int] = queue.Queue()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    ok = len(latencies) - errors
+    return {
+        "ok": ok,
+        "errors": errors,
+        "per_sec": round(ok / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0.0,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 1) if latencies else 0.0,
+        "created": [created.get() for _ in range(created.qsize())],
+    }
+
+
+def child(mode: str, clients: int, seconds: float) -> None:
+    tmp = tempfile.mkdtemp(prefix="oa-bench-")
+    os.environ["OA_DB_URL"] = f"sqlite:///{tmp}/oa.db"
+    os.environ["OA_WRITE_QUEUE"] = "1" if mode == "queue" else "0"
+    os.environ.setdefault("OA_SLA_SCAN_SECONDS", "0")
+    os.environ.setdefault("OA_NOTIFY_SINK", "none")
+
+    import uvicorn
+
+    from backend.app.core.security import create_access_token
+    from backend.app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    employee = create_access_token(subject="employee", extra={"role": "employee"})
+    approver = create_access_token(subject="approver", extra={"role": "approver"})
+
+    create = _phase(port, clients, seconds, employee, lambda: ("/api/requests", LEAVE, 201))
+    pending: queue.SimpleQueue[int] = queue.SimpleQueue()
+    for request_id in create.pop("created"):
+        pending.put(request_id)
+
+    def next_decision():
+        try:
+            return f"/api/approvals/{pending.get_nowait()}/decide", DECISION, 200
+        except queue.Empty:
+            return None
+
+    decide = _phase(port, clients, seconds, approver, next_decision)
+    decide.pop("created")
+    server.should_exit = True
+    print(json.dumps({"mode": mode, "create": create, "decide": decide}))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of each phase")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--child", choices=("direct", "queue"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.clients, args.seconds)
+        return 0
+
+    print(f"{args.clients} clients, {args.seconds:g} s per phase")
+    print(f"{'mode':<8}{'phase':<8}{'ok/s':>8}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for _ in range(args.runs):
+        for mode in ("direct", "queue"):
+            out = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "scripts.bench_writes",
+                    "--child",
+                    mode,
+                    "--clients",
+                    str(args.clients),
+                    "--seconds",
+                    str(args.seconds),
+                ],
+                capture_output=True,
+                text=True,
+            )
+            lines = out.stdout.strip().splitlines()
+            if out.returncode != 0 or not lines:
+                print(out.stderr, file=sys.stderr)
+                return 1
+            result = json.loads(lines[-1])
+            for phase in ("create", "decide"):
+                r = result[phase]
+                print(f"{mode:<8}{phase:<8}{r['per_sec']:>8}{r['errors']:>8}{r['p50_ms']:>9}{r['p99_ms']:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
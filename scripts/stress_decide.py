@@ -0,0 +1,115 @@
+# Concurrency check for POST /api/approvals/{id}/decide: many approvers of the
+# same position decide one request at the same instant. Exactly one must win,
+# every other call must get 409, and exactly one Approval row may exist.
+#
+#   uv run python -m scripts.stress_decide --approvers 64 --requests 20
+#   OA_WRITE_QUEUE=1 uv run python -m scripts.stress_decide
+#
+# Runs against a throwaway SQLite database and a real uvicorn server on a free port.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+LEAVE = {
+    "type": "leave",
+    "title": "stress",
+    "content": "",
+    "data": {"leave_type": "事假", "start_date": "2024-01-01", "end_date": "2024-01-02"},
+}
+
+
+def _post(base: str, path: str, token: str, body: dict) -> tuple[int, dict]:
+    req = urllib.request.Request(
+        base + path,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=60) as res:
+            return res.status, json.loads(res.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--approvers", type=int, default=32, help="parallel deciders per request")
+    parser.add_argument("--requests", type=int, default=10, help="requests to race on")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="oa-stress-")
+    os.environ["OA_DB_URL"] = f"sqlite:///{tmp}/oa.db"
+    os.environ.setdefault("OA_SLA_SCAN_SECONDS", "0")
+
+    import uvicorn
+    from sqlalchemy import func, select
+
+    from backend.app.core.security import create_access_token, hash_password
+    from backend.app.db.models import Approval, User
+    from backend.app.db.session import SessionLocal
+    from backend.app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+
+    with SessionLocal() as db:
+        position_id = db.scalar(select(User.position_id).where(User.username == "approver"))
+        password_hash = hash_password("stress-only")
+        for i in range(args.approvers):
+            db.add(
+                User(
+                    username=f"stress{i}",
+                    full_name="",
+                    role="approver",
+                    password_hash=password_hash,
+                    position_id=position_id,
+                    is_active=True,
+                )
+            )
+        db.commit()
+    employee = create_access_token(subject="employee", extra={"role": "employee"})
+    approvers = [create_access_token(subject=f"stress{i}", extra={"role": "approver"}) for i in range(args.approvers)]
+
+    failures = 0
+    codes: Counter[int] = Counter()
+    with ThreadPoolExecutor(args.approvers) as pool:
+        for _ in range(args.requests):
+            status, created = _post(base, "/api/requests", employee, LEAVE)
+            if status != 201:
+                print(f"create failed: {status} {created}", file=sys.stderr)
+                return 1
+            request_id = created["id"]
+            barrier = threading.Barrier(args.approvers)
+
+            def decide(token: str) -> int:
+                barrier.wait()
+                return _post(base, f"/api/approvals/{request_id}/decide", token, {"decision": "approved"})[0]
+
+            results = Counter(pool.map(decide, approvers))
+            codes.update(results)
+            with SessionLocal() as db:
+                rows = db.scalar(select(func.count()).select_from(Approval).where(Approval.request_id == request_id))
+            ok = results[200] == 1 and results[409] == args.approvers - 1 and rows == 1
+            failures += not ok
+            print(f"request {request_id}: {dict(results)} approvals={rows} {'ok' if ok else 'FAIL'}")
+
+    server.should_exit = True
+    print(f"{args.requests} requests x {args.approvers} deciders: {dict(codes)}, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())